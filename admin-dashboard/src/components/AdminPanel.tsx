@@ -17,7 +17,7 @@ import {
 import { motion, AnimatePresence } from 'framer-motion';
 import { cn } from '../lib/utils';
 import { AdminSection, NavItem } from '../types';
-import { useHealthCheck } from '../hooks/api';
+import { useHealthCheck, useLiveUpdates } from '../hooks/api';
 import { Badge } from './ui';
 import { useTheme } from '../contexts/ThemeContext';
 
@@ -34,6 +34,7 @@ const AdminPanel: React.FC = () => {
   const [activeSection, setActiveSection] = useState<AdminSection>('dashboard');
   const [sidebarOpen, setSidebarOpen] = useState(true);
   const { data: healthStatus, isLoading: healthLoading } = useHealthCheck();
+  useLiveUpdates();
   const { theme, toggleTheme } = useTheme();
 
   const navItems: NavItem[] = [
@@ -60,6 +60,7 @@ const InspectionFormDialog: React.FC<InspectionFormDialogProps> = ({
           status: item.status,
           notes: item.notes || '',
         })) : defaultInspectionItems,
+        version: inspection.version,
       });
     }
   }, [inspection]);
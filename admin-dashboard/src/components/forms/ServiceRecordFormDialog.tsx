@@ -114,6 +114,7 @@ const ServiceRecordFormDialog: React.FC<ServiceRecordFormDialogProps> = ({
           status: initialData.status || 'completed',
           technician_notes: initialData.technician_notes || '',
           service_items: initialData.service_items || [],
+          version: initialData.version,
         });
         // Set linked inspection if available
         if (initialData.linked_inspection_id) {
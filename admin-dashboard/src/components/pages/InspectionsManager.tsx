@@ -34,7 +34,11 @@ const InspectionsManager: React.FC<InspectionsManagerProps> = ({ navigateToSecti
   });
 
   // API hooks
-  const { data: inspections = [], isLoading, error } = useInspections();
+  // Condition filter and ordering are applied by the server; the search box filters the returned slice
+  const { data: inspections = [], isLoading, error } = useInspections({
+    overall_condition: filters.status !== 'all' ? filters.status : undefined,
+    sort: '-inspection_date',
+  });
   const { data: vehicles = [] } = useVehicles();
   const createInspectionMutation = useCreateInspection();
   const updateInspectionMutation = useUpdateInspection();
@@ -171,12 +175,6 @@ const InspectionsManager: React.FC<InspectionsManagerProps> = ({ navigateToSecti
       }
     }
     
-    if (filters.status && filters.status !== 'all') {
-      if (inspection.overall_status !== filters.status) {
-        return false;
-      }
-    }
-    
     return true;
   });
 
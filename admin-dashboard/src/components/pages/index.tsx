@@ -1141,7 +1141,10 @@ export const ServiceRecordsManager: React.FC<ServiceRecordsManagerProps> = ({ na
   const [viewingInspectionId, setViewingInspectionId] = useState<number | null>(null);
   const [viewingServiceRecord, setViewingServiceRecord] = useState<ServiceRecord | null>(null);
   
-  const { data: serviceRecords, isLoading, error } = useServiceRecords();
+  const { data: serviceRecords, isLoading, error } = useServiceRecords({
+    vehicle_id: selectedVehicle ?? undefined,
+    sort: '-service_date',
+  });
   const { data: vehicles } = useVehicles();
   const createRecordMutation = useCreateServiceRecord();
   const updateRecordMutation = useUpdateServiceRecord();
@@ -1161,9 +1164,7 @@ export const ServiceRecordsManager: React.FC<ServiceRecordsManagerProps> = ({ na
       (record.technician_notes && record.technician_notes.toLowerCase().includes(searchTerm.toLowerCase())) ||
       (record.vehicle?.make && `${record.vehicle.make} ${record.vehicle.model}`.toLowerCase().includes(searchTerm.toLowerCase()));
     
-    const matchesVehicle = !selectedVehicle || record.vehicle_id === selectedVehicle;
-    
-    return matchesSearch && matchesVehicle;
+    return matchesSearch;
   }) || [];
 
   const serviceRecordsPagination = usePagination({
@@ -1,4 +1,5 @@
-import { useQuery, useMutation, useQueryClient, UseQueryOptions, UseMutationOptions } from '@tanstack/react-query';
+import { useEffect, useSyncExternalStore } from 'react';
+import { useQuery, useMutation, useQueryClient, keepPreviousData, QueryClient, UseQueryOptions, UseMutationOptions } from '@tanstack/react-query';
 import {
   Client,
   ClientCode,
@@ -11,6 +12,8 @@ import {
   ClientCodeFormData,
   ServiceRecordFormData,
   InspectionReportFormData,
+  ServiceRecordFilters,
+  InspectionFilters,
 } from '../types';
 import {
   healthApi,
@@ -20,6 +23,7 @@ import {
   clientCodesApi,
   serviceRecordsApi,
   inspectionsApi,
+  eventsApi,
   apiCall,
 } from '../lib/api';
 
@@ -35,29 +39,133 @@ export const queryKeys = {
   clientCodes: ['client-codes'] as const,
   clientCode: (id: number) => ['client-codes', id] as const,
   serviceRecords: ['service-records'] as const,
+  serviceRecordLists: ['service-records', 'list'] as const,
+  serviceRecordList: (filters: ServiceRecordFilters) => ['service-records', 'list', filters] as const,
   serviceRecord: (id: number) => ['service-records', id] as const,
   serviceRecordsByVehicle: (vehicleId: number) => ['service-records', 'vehicle', vehicleId] as const,
   inspections: ['inspections'] as const,
+  inspectionLists: ['inspections', 'list'] as const,
+  inspectionList: (filters: InspectionFilters) => ['inspections', 'list', filters] as const,
   inspection: (id: number) => ['inspections', id] as const,
   inspectionsByVehicle: (vehicleId: number) => ['inspections', 'vehicle', vehicleId] as const,
 };
 
+// Live updates - connection state shared by all hooks
+let liveConnected = false;
+const liveListeners = new Set<() => void>();
+
+const setLiveConnected = (connected: boolean) => {
+  if (liveConnected !== connected) {
+    liveConnected = connected;
+    liveListeners.forEach((listener) => listener());
+  }
+};
+
+const subscribeLive = (listener: () => void) => {
+  liveListeners.add(listener);
+  return () => {
+    liveListeners.delete(listener);
+  };
+};
+
+export const useLiveConnected = () => useSyncExternalStore(subscribeLive, () => liveConnected);
+
+type ChangeEvent = {
+  type: string;
+  data: { id?: number; vehicle_id?: number; previous_vehicle_id?: number; status?: string };
+};
+
+const CHANGE_EVENT_TYPES = [
+  'client.created', 'client.updated', 'client.deactivated',
+  'vehicle.created', 'vehicle.updated', 'vehicle.deleted',
+  'client_code.created', 'client_code.bulk_created', 'client_code.updated', 'client_code.deleted',
+  'service_record.created', 'service_record.updated', 'service_record.deleted',
+  'inspection.created', 'inspection.updated', 'inspection.deleted',
+];
+
+// Refresh only the queries an event touches; status changes are patched in place
+const applyChangeEvent = (queryClient: QueryClient, { type, data }: ChangeEvent) => {
+  const [entity, action] = type.split('.');
+  const vehicleIds = [data.vehicle_id, data.previous_vehicle_id].filter((id): id is number => !!id);
+  const countsChanged = action !== 'updated';
+
+  switch (entity) {
+    case 'client':
+      queryClient.invalidateQueries({ queryKey: queryKeys.clients });
+      if (countsChanged) queryClient.invalidateQueries({ queryKey: queryKeys.dashboard });
+      break;
+    case 'vehicle':
+      queryClient.invalidateQueries({ queryKey: queryKeys.vehicles });
+      if (countsChanged) queryClient.invalidateQueries({ queryKey: queryKeys.dashboard });
+      break;
+    case 'client_code':
+      queryClient.invalidateQueries({ queryKey: queryKeys.clientCodes });
+      queryClient.invalidateQueries({ queryKey: queryKeys.dashboard });
+      break;
+    case 'service_record':
+      if (action === 'updated' && data.id && data.status) {
+        queryClient.setQueriesData<ServiceRecord[]>({ queryKey: queryKeys.serviceRecordLists }, (records) =>
+          records?.map((record) => (record.id === data.id ? { ...record, status: data.status as ServiceRecord['status'] } : record))
+        );
+      }
+      queryClient.invalidateQueries({ queryKey: queryKeys.serviceRecordLists });
+      if (data.id) queryClient.invalidateQueries({ queryKey: queryKeys.serviceRecord(data.id) });
+      vehicleIds.forEach((id) => queryClient.invalidateQueries({ queryKey: queryKeys.serviceRecordsByVehicle(id) }));
+      break;
+    case 'inspection':
+      queryClient.invalidateQueries({ queryKey: queryKeys.inspectionLists });
+      if (data.id) queryClient.invalidateQueries({ queryKey: queryKeys.inspection(data.id) });
+      vehicleIds.forEach((id) => queryClient.invalidateQueries({ queryKey: queryKeys.inspectionsByVehicle(id) }));
+      break;
+  }
+};
+
+// Subscribe to backend change events; mount once near the app root
+export const useLiveUpdates = () => {
+  const queryClient = useQueryClient();
+
+  useEffect(() => {
+    const source = new EventSource(eventsApi.streamUrl);
+    const handleChange = (event: MessageEvent) => applyChangeEvent(queryClient, JSON.parse(event.data));
+
+    source.onopen = () => {
+      setLiveConnected(true);
+      queryClient.setQueryData(queryKeys.health, { status: 'healthy', timestamp: new Date().toISOString() });
+    };
+    source.onerror = () => {
+      // EventSource reconnects on its own (resuming from Last-Event-ID); poll until it does
+      setLiveConnected(false);
+    };
+    CHANGE_EVENT_TYPES.forEach((type) => source.addEventListener(type, handleChange as EventListener));
+    source.addEventListener('resync', () => queryClient.invalidateQueries());
+
+    return () => {
+      source.close();
+      setLiveConnected(false);
+    };
+  }, [queryClient]);
+
+  return useLiveConnected();
+};
+
 // Health API hooks
 export const useHealthCheck = (options?: UseQueryOptions<{ status: string; timestamp: string }>) => {
+  const live = useLiveConnected();
   return useQuery({
     queryKey: queryKeys.health,
     queryFn: () => apiCall(healthApi.check),
-    refetchInterval: 30000, // Check health every 30 seconds
+    refetchInterval: live ? false : 30000, // Poll health every 30 seconds only while the event stream is down
     ...options,
   });
 };
 
 // Dashboard API hooks
 export const useDashboardStats = (options?: UseQueryOptions<DashboardStats>) => {
+  const live = useLiveConnected();
   return useQuery({
     queryKey: queryKeys.dashboard,
     queryFn: () => apiCall(dashboardApi.getStats),
-    refetchInterval: 60000, // Refresh stats every minute
+    refetchInterval: live ? false : 60000, // Stats are pushed while live, otherwise refresh every minute
     ...options,
   });
 };
@@ -272,10 +380,11 @@ export const useGenerateCode = (options?: UseMutationOptions<{ code: string }, E
 };
 
 // Service Records API hooks
-export const useServiceRecords = (options?: UseQueryOptions<ServiceRecord[]>) => {
+export const useServiceRecords = (filters: ServiceRecordFilters = {}, options?: UseQueryOptions<ServiceRecord[]>) => {
   return useQuery({
-    queryKey: queryKeys.serviceRecords,
-    queryFn: () => apiCall(serviceRecordsApi.getAll),
+    queryKey: queryKeys.serviceRecordList(filters),
+    queryFn: () => apiCall(() => serviceRecordsApi.getAll(filters)),
+    placeholderData: keepPreviousData, // Keep the current list on screen while a new filter loads
     ...options,
   });
 };
@@ -341,10 +450,11 @@ export const useDeleteServiceRecord = (options?: UseMutationOptions<void, Error,
 };
 
 // Inspections API hooks
-export const useInspections = (options?: UseQueryOptions<InspectionReport[]>) => {
+export const useInspections = (filters: InspectionFilters = {}, options?: UseQueryOptions<InspectionReport[]>) => {
   return useQuery({
-    queryKey: queryKeys.inspections,
-    queryFn: () => apiCall(inspectionsApi.getAll),
+    queryKey: queryKeys.inspectionList(filters),
+    queryFn: () => apiCall(() => inspectionsApi.getAll(filters)),
+    placeholderData: keepPreviousData, // Keep the current list on screen while a new filter loads
     ...options,
   });
 };
@@ -11,6 +11,8 @@ import {
   ClientCodeFormData,
   ServiceRecordFormData,
   InspectionReportFormData,
+  ServiceRecordFilters,
+  InspectionFilters,
 } from '../types';
 
 // Configure axios defaults
@@ -52,6 +54,11 @@ export const healthApi = {
     apiClient.get('/health'),
 };
 
+// Live change events (Server-Sent Events)
+export const eventsApi = {
+  streamUrl: `${API_BASE_URL}/admin/events`,
+};
+
 // Dashboard API
 export const dashboardApi = {
   getStats: (): Promise<AxiosResponse<DashboardStats>> =>
@@ -126,8 +133,8 @@ export const clientCodesApi = {
 
 // Service Records API
 export const serviceRecordsApi = {
-  getAll: (): Promise<AxiosResponse<ServiceRecord[]>> =>
-    apiClient.get('/admin/service-records'),
+  getAll: (filters: ServiceRecordFilters = {}): Promise<AxiosResponse<ServiceRecord[]>> =>
+    apiClient.get('/admin/service-records', { params: filters }),
     
   getById: (id: number): Promise<AxiosResponse<ServiceRecord>> =>
     apiClient.get(`/admin/service-records/${id}`),
@@ -147,8 +154,8 @@ export const serviceRecordsApi = {
 
 // Inspections API
 export const inspectionsApi = {
-  getAll: (): Promise<AxiosResponse<InspectionReport[]>> =>
-    apiClient.get('/admin/inspections'),
+  getAll: (filters: InspectionFilters = {}): Promise<AxiosResponse<InspectionReport[]>> =>
+    apiClient.get('/admin/inspections', { params: filters }),
     
   getById: (id: number): Promise<AxiosResponse<InspectionReport>> =>
     apiClient.get(`/admin/inspections/${id}`),
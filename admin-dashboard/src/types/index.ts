@@ -57,6 +57,7 @@ export interface ServiceRecord {
   created_at: string;
   service_items: ServiceItem[];
   linked_inspection_id?: number;
+  version?: number;
 }
 
 export interface InspectionReport {
@@ -70,6 +71,7 @@ export interface InspectionReport {
   updated_at: string;
   items?: InspectionItem[];
   linked_service_id?: number;
+  version?: number;
 }
 
 export interface InspectionItem {
@@ -143,6 +145,7 @@ export interface ServiceRecordFormData {
   technician_notes?: string;
   service_items: ServiceItemFormData[];
   linked_inspection_id?: number;
+  version?: number; // Version being edited; the server answers 409 when it changed meanwhile
 }
 
 export interface ServiceType {
@@ -159,6 +162,7 @@ export interface InspectionReportFormData {
   technician_notes?: string;
   recommendations?: string;
   items: InspectionItemFormData[];
+  version?: number; // Version being edited; the server answers 409 when it changed meanwhile
 }
 
 export interface InspectionItemFormData {
@@ -182,6 +186,31 @@ export interface FilterState {
 
 export type SortDirection = 'asc' | 'desc';
 
+// Server-side list filters; sort is a comma-separated list of keys, '-' for descending
+export interface ServiceRecordFilters {
+  vehicle_id?: number;
+  client_id?: number;
+  status?: string;
+  service_type?: string;
+  date_from?: string;
+  date_to?: string;
+  sort?: string;
+  skip?: number;
+  limit?: number;
+}
+
+export interface InspectionFilters {
+  vehicle_id?: number;
+  client_id?: number;
+  overall_condition?: string;
+  status?: string;
+  date_from?: string;
+  date_to?: string;
+  sort?: string;
+  skip?: number;
+  limit?: number;
+}
+
 export interface SortState {
   field: string;
   direction: SortDirection;
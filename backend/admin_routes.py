@@ -1,13 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from typing import Dict, List, Optional, Union
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime
+import os
+import re
 import secrets
 import string
 
-from database import get_db, generate_client_code
-from models import Client, ClientCode, Vehicle, ServiceRecord, ServiceItem, InspectionReport, InspectionItem
+from database import get_db, get_default_db, generate_client_code, generate_unique_client_codes, shard_router
+from shards import workshop_of
+from engines import engines
+from compression import static_payloads
+from coalescing import single_flight
+from responsecache import client_cache
+from profiling import profile_store
+from jobs import job_executor, job_to_dict
+from events import event_bus, publish_change
+from listing import split_values, date_range, sort_order
+import statements
+import maintenance
+from concurrency import check_version, claim_version, expected_version, stale_conflict, version_etag
+from models import Client, ClientCode, Vehicle, ServiceRecord, ServiceItem, InspectionReport, InspectionItem, Job
 
 # Create admin router
 admin_router = APIRouter(prefix="/admin", tags=["admin"])
@@ -62,6 +79,10 @@ class ClientCodeCreate(BaseModel):
     code: Optional[str] = None  # If not provided, will be auto-generated
     expires_at: Optional[datetime] = None
 
+class ClientCodeBulkCreate(BaseModel):
+    client_ids: List[int]  # One code is issued per entry
+    expires_at: Optional[datetime] = None
+
 class ClientCodeResponse(BaseModel):
     id: int
     code: str
@@ -74,19 +95,21 @@ class ClientCodeResponse(BaseModel):
     class Config:
         from_attributes = True
 
-class DashboardStats(BaseModel):
+class WorkshopCounts(BaseModel):
     total_clients: int
     active_clients: int
     total_vehicles: int
     total_codes: int
     active_codes: int
+
+class DashboardStats(WorkshopCounts):
     recent_clients: List[ClientResponse]
     recent_vehicles: List[VehicleResponse]
+    workshop: str                                # "all" when summed across workshops
+    workshops: Dict[str, WorkshopCounts] = {}    # Per-workshop counts of an aggregated dashboard
 
-# Dashboard endpoint
-@admin_router.get("/dashboard", response_model=DashboardStats)
-def get_dashboard_stats(db: Session = Depends(get_db)):
-    """Get dashboard statistics"""
+def collect_dashboard_stats(db: Session) -> DashboardStats:
+    """Dashboard statistics of the workshop a session belongs to"""
     
     # Count statistics
     total_clients = db.query(Client).count()
@@ -105,10 +128,52 @@ def get_dashboard_stats(db: Session = Depends(get_db)):
         total_vehicles=total_vehicles,
         total_codes=total_codes,
         active_codes=active_codes,
-        recent_clients=recent_clients,
-        recent_vehicles=recent_vehicles
+        recent_clients=[ClientResponse.model_validate(c) for c in recent_clients],
+        recent_vehicles=[VehicleResponse.model_validate(v) for v in recent_vehicles],
+        workshop=workshop_of(db)
+    )
+
+# Dashboard endpoint
+@admin_router.get("/dashboard", response_model=DashboardStats)
+def get_dashboard_stats(all_workshops: bool = False, db: Session = Depends(get_db)):
+    """Get dashboard statistics for the selected workshop, or summed across every workshop"""
+    if not all_workshops:
+        return collect_dashboard_stats(db)
+    
+    # Every shard is counted in parallel on its own session
+    per_workshop = shard_router.for_each(collect_dashboard_stats)
+    counts = {
+        workshop: WorkshopCounts(**stats.model_dump(include=set(WorkshopCounts.model_fields)))
+        for workshop, stats in per_workshop.items()
+    }
+    totals = {field: sum(getattr(c, field) for c in counts.values()) for field in WorkshopCounts.model_fields}
+    return DashboardStats(
+        **totals,
+        recent_clients=sorted(
+            (c for stats in per_workshop.values() for c in stats.recent_clients),
+            key=lambda c: c.created_at, reverse=True
+        )[:5],
+        recent_vehicles=sorted(
+            (v for stats in per_workshop.values() for v in stats.recent_vehicles),
+            key=lambda v: v.created_at, reverse=True
+        )[:5],
+        workshop="all",
+        workshops=counts
     )
 
+# Registered workshop databases
+@admin_router.get("/workshops")
+def get_workshops():
+    """Get the configured workshops and the database engine of each"""
+    return [
+        {
+            "name": workshop,
+            "default": workshop == shard_router.default,
+            "dialect": shard_router.engine(workshop).dialect.name
+        }
+        for workshop in shard_router.workshops()
+    ]
+
 # Client management endpoints
 @admin_router.get("/clients", response_model=List[ClientResponse])
 def get_clients(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
@@ -130,6 +195,7 @@ def create_client(client: ClientCreate, db: Session = Depends(get_db)):
     db.add(db_client)
     db.commit()
     db.refresh(db_client)
+    publish_change("client", "created", id=db_client.id, client_id=db_client.id)
     return db_client
 
 @admin_router.get("/clients/{client_id}", response_model=ClientResponse)
@@ -154,6 +220,7 @@ def update_client(client_id: int, client: ClientCreate, db: Session = Depends(ge
     
     db.commit()
     db.refresh(db_client)
+    publish_change("client", "updated", id=db_client.id, client_id=db_client.id)
     return db_client
 
 @admin_router.delete("/clients/{client_id}")
@@ -166,6 +233,7 @@ def delete_client(client_id: int, db: Session = Depends(get_db)):
     # Deactivate instead of deleting to preserve data integrity
     client.is_active = False
     db.commit()
+    publish_change("client", "deactivated", id=client_id, client_id=client_id)
     return {"message": "Client deactivated successfully"}
 
 # Vehicle management endpoints
@@ -227,6 +295,7 @@ def create_vehicle(vehicle: VehicleCreate, db: Session = Depends(get_db)):
     db.add(db_vehicle)
     db.commit()
     db.refresh(db_vehicle)
+    publish_change("vehicle", "created", id=db_vehicle.id, vehicle_id=db_vehicle.id, client_id=db_vehicle.client_id)
     return db_vehicle
 
 @admin_router.get("/vehicles/{vehicle_id}", response_model=VehicleResponse)
@@ -254,6 +323,7 @@ def update_vehicle(vehicle_id: int, vehicle: VehicleCreate, db: Session = Depend
     
     db.commit()
     db.refresh(db_vehicle)
+    publish_change("vehicle", "updated", id=db_vehicle.id, vehicle_id=db_vehicle.id, client_id=db_vehicle.client_id)
     return db_vehicle
 
 @admin_router.delete("/vehicles/{vehicle_id}")
@@ -263,8 +333,10 @@ def delete_vehicle(vehicle_id: int, db: Session = Depends(get_db)):
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     
+    client_id = vehicle.client_id
     db.delete(vehicle)
     db.commit()
+    publish_change("vehicle", "deleted", id=vehicle_id, vehicle_id=vehicle_id, client_id=client_id)
     return {"message": "Vehicle deleted successfully"}
 
 # Client code management endpoints
@@ -303,8 +375,57 @@ def create_client_code(code_request: ClientCodeCreate, db: Session = Depends(get
     db.add(db_code)
     db.commit()
     db.refresh(db_code)
+    publish_change("client_code", "created", id=db_code.id, client_id=db_code.client_id)
     return db_code
 
+# Maximum number of codes issued by one bulk request
+MAX_BULK_CODES = 1000
+
+@admin_router.post("/client-codes/bulk", response_model=List[ClientCodeResponse])
+def create_client_codes_bulk(bulk_request: ClientCodeBulkCreate, db: Session = Depends(get_db)):
+    """Issue client codes for many clients at once (e.g. a corporate fleet)"""
+    if not bulk_request.client_ids:
+        raise HTTPException(status_code=400, detail="No clients provided")
+    if len(bulk_request.client_ids) > MAX_BULK_CODES:
+        raise HTTPException(status_code=400, detail=f"Cannot issue more than {MAX_BULK_CODES} codes at once")
+    
+    # Verify all clients exist with a single query
+    requested_ids = set(bulk_request.client_ids)
+    found_ids = {
+        row[0] for row in db.query(Client.id).filter(Client.id.in_(requested_ids))
+    }
+    missing_ids = requested_ids - found_ids
+    if missing_ids:
+        raise HTTPException(status_code=404, detail=f"Clients not found: {sorted(missing_ids)}")
+    
+    codes = generate_unique_client_codes(db, len(bulk_request.client_ids))
+    
+    # Insert all codes in a single transaction with one executemany
+    now = datetime.utcnow()
+    rows = [
+        {
+            "code": code,
+            "client_id": client_id,
+            "is_active": True,
+            "expires_at": bulk_request.expires_at,
+            "created_at": now
+        }
+        for code, client_id in zip(codes, bulk_request.client_ids)
+    ]
+    try:
+        db.execute(insert(ClientCode), rows)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Load the created codes back with one query, in request order
+    created = {
+        code.code: code for code in db.query(ClientCode).filter(ClientCode.code.in_(codes))
+    }
+    publish_change("client_code", "bulk_created", count=len(codes), client_ids=sorted(requested_ids))
+    return [created[code] for code in codes]
+
 @admin_router.put("/client-codes/{code_id}/toggle")
 def toggle_client_code(code_id: int, db: Session = Depends(get_db)):
     """Toggle client code active status"""
@@ -314,6 +435,7 @@ def toggle_client_code(code_id: int, db: Session = Depends(get_db)):
     
     code.is_active = not code.is_active
     db.commit()
+    publish_change("client_code", "updated", id=code.id, client_id=code.client_id, is_active=code.is_active)
     return {"message": f"Code {'activated' if code.is_active else 'deactivated'} successfully"}
 
 @admin_router.delete("/client-codes/{code_id}")
@@ -323,8 +445,10 @@ def delete_client_code(code_id: int, db: Session = Depends(get_db)):
     if not code:
         raise HTTPException(status_code=404, detail="Client code not found")
     
+    client_id = code.client_id
     db.delete(code)
     db.commit()
+    publish_change("client_code", "deleted", id=code_id, client_id=client_id)
     return {"message": "Client code deleted successfully"}
 
 # Generate new code endpoint
@@ -359,6 +483,7 @@ class ServiceRecordCreate(BaseModel):
     technician_notes: Optional[str] = None
     service_items: List[ServiceItemCreate]
     linked_inspection_id: Optional[int] = None
+    version: Optional[int] = None  # Version the edit is based on (updates only, or If-Match)
 
 class ServiceRecordResponse(BaseModel):
     id: int
@@ -369,135 +494,196 @@ class ServiceRecordResponse(BaseModel):
     total_cost: float
     created_at: datetime
     linked_inspection_id: Optional[int] = None
+    version: int = 1
     vehicle: Optional[VehicleResponse] = None
     service_items: List[ServiceItemResponse] = []
     
     class Config:
         from_attributes = True
 
+class JobAccepted(BaseModel):
+    job_id: int
+    status: str
+
+SERVICE_RECORD_SORT_KEYS = {
+    "id": ServiceRecord.id,
+    "service_date": ServiceRecord.service_date,
+    "status": ServiceRecord.status,
+    "total_cost": ServiceRecord.total_cost,
+    "vehicle_id": ServiceRecord.vehicle_id,
+    "created_at": ServiceRecord.created_at
+}
+
 @admin_router.get("/service-records", response_model=List[ServiceRecordResponse])
-def get_service_records(vehicle_id: Optional[int] = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all service records, optionally filtered by vehicle"""
+def get_service_records(
+    vehicle_id: Optional[int] = None,
+    client_id: Optional[int] = None,
+    status: Optional[str] = Query(None, description="Comma-separated statuses, e.g. pending,in_progress"),
+    service_type: Optional[str] = Query(None, description="Records with at least one item of these service types"),
+    date_from: Optional[date] = Query(None, description="First service date to include (YYYY-MM-DD)"),
+    date_to: Optional[date] = Query(None, description="Last service date to include (YYYY-MM-DD)"),
+    order_by: list = Depends(sort_order(SERVICE_RECORD_SORT_KEYS, "id", tiebreaker=ServiceRecord.id)),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Get service records matching the filters, sorted and paged in the database"""
     query = db.query(ServiceRecord).options(
         joinedload(ServiceRecord.vehicle),
-        joinedload(ServiceRecord.service_items)
+        selectinload(ServiceRecord.service_items)
     )
     if vehicle_id:
         query = query.filter(ServiceRecord.vehicle_id == vehicle_id)
-    records = query.offset(skip).limit(limit).all()
+    if client_id:
+        query = query.filter(ServiceRecord.vehicle_id.in_(select(Vehicle.id).where(Vehicle.client_id == client_id)))
+    if status:
+        query = query.filter(ServiceRecord.status.in_(split_values(status)))
+    if service_type:
+        query = query.filter(select(ServiceItem.id).where(
+            ServiceItem.service_record_id == ServiceRecord.id,
+            ServiceItem.service_type.in_(split_values(service_type))
+        ).exists())
+    query = query.filter(*date_range(ServiceRecord.service_date, date_from, date_to))
+    records = query.order_by(*order_by).offset(skip).limit(limit).all()
     return records
 
-@admin_router.post("/service-records", response_model=ServiceRecordResponse)
-def create_service_record(record: ServiceRecordCreate, db: Session = Depends(get_db)):
+@admin_router.post("/service-records", response_model=Union[ServiceRecordResponse, JobAccepted])
+def create_service_record(
+    record: ServiceRecordCreate,
+    response: Response,
+    background: bool = False,
+    db: Session = Depends(get_db)
+):
     """Create a new service record with service items"""
+    if background:
+        # Hand the work to the job executor and return straight away
+        job = job_executor.enqueue("create_service_record", record.model_dump(mode="json"), workshop=workshop_of(db))
+        response.status_code = status.HTTP_202_ACCEPTED
+        return JobAccepted(job_id=job.id, status=job.status)
+    
     try:
-        # Verify vehicle exists
-        vehicle = db.query(Vehicle).filter(Vehicle.id == record.vehicle_id).first()
-        if not vehicle:
-            raise HTTPException(status_code=404, detail="Vehicle not found")
+        return ServiceRecordResponse.model_validate(save_service_record(db, record))
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+def save_service_record(db: Session, record: ServiceRecordCreate) -> ServiceRecord:
+    """Create a service record, its items and the linked or default inspection"""
+    # Verify vehicle exists
+    vehicle = db.query(Vehicle).filter(Vehicle.id == record.vehicle_id).first()
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    
+    # Calculate total cost
+    total_cost = sum(item.price for item in record.service_items)
+    
+    # Handle inspection linking
+    linked_inspection_id = None
+    inspection_report = None
+    
+    if record.linked_inspection_id:
+        # Link to existing inspection
+        existing_inspection = db.query(InspectionReport).filter(
+            InspectionReport.id == record.linked_inspection_id,
+            InspectionReport.vehicle_id == record.vehicle_id
+        ).first()
+        if not existing_inspection:
+            raise HTTPException(status_code=404, detail="Inspection not found or doesn't belong to this vehicle")
         
-        # Calculate total cost
-        total_cost = sum(item.price for item in record.service_items)
+        # If inspection is already linked to another service, unlink it first
+        existing_link = db.query(ServiceRecord).filter(
+            ServiceRecord.linked_inspection_id == record.linked_inspection_id
+        ).first()
+        if existing_link:
+            # Unlink from previous service
+            existing_link.linked_inspection_id = None
         
-        # Handle inspection linking
-        linked_inspection_id = None
-        inspection_report = None
+        linked_inspection_id = existing_inspection.id
+        inspection_report = existing_inspection
+    else:
+        # Check if any service item is an inspection and create new one if needed
+        has_inspection = any(item.service_type == "inspection" for item in record.service_items)
         
-        if record.linked_inspection_id:
-            # Link to existing inspection
-            existing_inspection = db.query(InspectionReport).filter(
-                InspectionReport.id == record.linked_inspection_id,
-                InspectionReport.vehicle_id == record.vehicle_id
-            ).first()
-            if not existing_inspection:
-                raise HTTPException(status_code=404, detail="Inspection not found or doesn't belong to this vehicle")
-            
-            # If inspection is already linked to another service, unlink it first
-            existing_link = db.query(ServiceRecord).filter(
-                ServiceRecord.linked_inspection_id == record.linked_inspection_id
-            ).first()
-            if existing_link:
-                # Unlink from previous service
-                existing_link.linked_inspection_id = None
+        if has_inspection:
+            # Create new inspection report
+            inspection_report = InspectionReport(
+                vehicle_id=record.vehicle_id,
+                inspection_date=record.service_date,
+                overall_condition="good",  # Default, can be updated later
+                technician_notes=record.technician_notes,
+                recommendations="Standard inspection completed as part of service.",
+                created_at=datetime.utcnow()
+            )
+            db.add(inspection_report)
+            db.flush()  # Get the inspection ID
+            linked_inspection_id = inspection_report.id
             
-            linked_inspection_id = existing_inspection.id
-            inspection_report = existing_inspection
-        else:
-            # Check if any service item is an inspection and create new one if needed
-            has_inspection = any(item.service_type == "inspection" for item in record.service_items)
+            # Create default inspection items
+            default_inspection_items = [
+                {"item_name": "Engine Oil", "status": "good", "notes": "Oil level and condition checked"},
+                {"item_name": "Tire Condition", "status": "good", "notes": "Tire wear and pressure checked"},
+                {"item_name": "Brake System", "status": "good", "notes": "Brake pads and fluid inspected"},
+                {"item_name": "Battery", "status": "good", "notes": "Battery health verified"},
+                {"item_name": "Lights", "status": "good", "notes": "All lights functioning properly"}
+            ]
             
-            if has_inspection:
-                # Create new inspection report
-                inspection_report = InspectionReport(
-                    vehicle_id=record.vehicle_id,
-                    inspection_date=record.service_date,
-                    overall_condition="good",  # Default, can be updated later
-                    technician_notes=record.technician_notes,
-                    recommendations="Standard inspection completed as part of service.",
-                    created_at=datetime.utcnow()
+            for item_data in default_inspection_items:
+                inspection_item = InspectionItem(
+                    inspection_id=inspection_report.id,
+                    item_name=item_data["item_name"],
+                    status=item_data["status"],
+                    notes=item_data["notes"]
                 )
-                db.add(inspection_report)
-                db.flush()  # Get the inspection ID
-                linked_inspection_id = inspection_report.id
-                
-                # Create default inspection items
-                default_inspection_items = [
-                    {"item_name": "Engine Oil", "status": "good", "notes": "Oil level and condition checked"},
-                    {"item_name": "Tire Condition", "status": "good", "notes": "Tire wear and pressure checked"},
-                    {"item_name": "Brake System", "status": "good", "notes": "Brake pads and fluid inspected"},
-                    {"item_name": "Battery", "status": "good", "notes": "Battery health verified"},
-                    {"item_name": "Lights", "status": "good", "notes": "All lights functioning properly"}
-                ]
-                
-                for item_data in default_inspection_items:
-                    inspection_item = InspectionItem(
-                        inspection_id=inspection_report.id,
-                        item_name=item_data["item_name"],
-                        status=item_data["status"],
-                        notes=item_data["notes"]
-                    )
-                    db.add(inspection_item)
-        
-        # Create service record
-        db_record = ServiceRecord(
-            vehicle_id=record.vehicle_id,
-            service_date=record.service_date,
-            status=record.status,
-            technician_notes=record.technician_notes,
-            total_cost=total_cost,
-            linked_inspection_id=linked_inspection_id,
+                db.add(inspection_item)
+    
+    # Create service record
+    db_record = ServiceRecord(
+        vehicle_id=record.vehicle_id,
+        service_date=record.service_date,
+        status=record.status,
+        technician_notes=record.technician_notes,
+        total_cost=total_cost,
+        linked_inspection_id=linked_inspection_id,
+        created_at=datetime.utcnow()
+    )
+    db.add(db_record)
+    db.flush()  # Get the service ID
+    
+    # Update inspection to link back to service if we created one
+    if linked_inspection_id:
+        inspection_report.linked_service_record_id = db_record.id
+    
+    # Create service items
+    service_items = []
+    for item_data in record.service_items:
+        service_item = ServiceItem(
+            service_record_id=db_record.id,
+            service_type=item_data.service_type,
+            service_name=item_data.service_name,
+            description=item_data.description,
+            price=item_data.price,
             created_at=datetime.utcnow()
         )
-        db.add(db_record)
-        db.flush()  # Get the service ID
-        
-        # Update inspection to link back to service if we created one
-        if linked_inspection_id:
-            inspection_report.linked_service_record_id = db_record.id
-        
-        # Create service items
-        service_items = []
-        for item_data in record.service_items:
-            service_item = ServiceItem(
-                service_record_id=db_record.id,
-                service_type=item_data.service_type,
-                service_name=item_data.service_name,
-                description=item_data.description,
-                price=item_data.price,
-                created_at=datetime.utcnow()
-            )
-            service_items.append(service_item)
-            db.add(service_item)
-        
-        db.commit()
-        db.refresh(db_record)
-        return db_record
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
+        service_items.append(service_item)
+        db.add(service_item)
+    
+    db.commit()
+    db.refresh(db_record)
+    
+    client_id = vehicle.client_id
+    if inspection_report is not None and not record.linked_inspection_id:
+        publish_change("inspection", "created", id=inspection_report.id, vehicle_id=record.vehicle_id, client_id=client_id)
+    publish_change("service_record", "created", id=db_record.id, vehicle_id=db_record.vehicle_id,
+                   client_id=client_id, status=db_record.status)
+    return db_record
+
+@job_executor.register("create_service_record")
+def create_service_record_job(db: Session, payload: dict):
+    db_record = save_service_record(db, ServiceRecordCreate(**payload))
+    return {"id": db_record.id}
 
 @admin_router.get("/service-records/{record_id}", response_model=ServiceRecordResponse)
-def get_service_record(record_id: int, db: Session = Depends(get_db)):
+def get_service_record(record_id: int, response: Response, db: Session = Depends(get_db)):
     """Get a specific service record"""
     record = db.query(ServiceRecord).options(
         joinedload(ServiceRecord.vehicle),
@@ -505,15 +691,18 @@ def get_service_record(record_id: int, db: Session = Depends(get_db)):
     ).filter(ServiceRecord.id == record_id).first()
     if not record:
         raise HTTPException(status_code=404, detail="Service record not found")
+    response.headers["ETag"] = version_etag(record.version)
     return record
 
 @admin_router.put("/service-records/{record_id}", response_model=ServiceRecordResponse)
-def update_service_record(record_id: int, record: ServiceRecordCreate, db: Session = Depends(get_db)):
-    """Update a service record with service items"""
+def update_service_record(record_id: int, record: ServiceRecordCreate, request: Request, response: Response,
+                          db: Session = Depends(get_db)):
+    """Update a service record with service items (409 when it changed since the version being edited)"""
     try:
         db_record = db.query(ServiceRecord).filter(ServiceRecord.id == record_id).first()
         if not db_record:
             raise HTTPException(status_code=404, detail="Service record not found")
+        check_version(db_record, expected_version(request, record.version), "Service record")
         
         # Verify vehicle exists if changing vehicle_id
         if record.vehicle_id != db_record.vehicle_id:
@@ -525,11 +714,14 @@ def update_service_record(record_id: int, record: ServiceRecordCreate, db: Sessi
         total_cost = sum(item.price for item in record.service_items)
         
         # Update service record
+        previous_vehicle_id = db_record.vehicle_id
         db_record.vehicle_id = record.vehicle_id
         db_record.service_date = record.service_date
         db_record.status = record.status
         db_record.technician_notes = record.technician_notes
         db_record.total_cost = total_cost
+        # Compare-and-swap the version before the bulk delete below touches the items
+        claim_version(db, db_record)
         
         # Delete existing service items and create new ones
         db.query(ServiceItem).filter(ServiceItem.service_record_id == record_id).delete()
@@ -548,7 +740,17 @@ def update_service_record(record_id: int, record: ServiceRecordCreate, db: Sessi
         
         db.commit()
         db.refresh(db_record)
+        publish_change("service_record", "updated", id=db_record.id, vehicle_id=db_record.vehicle_id,
+                       client_id=db_record.vehicle.client_id if db_record.vehicle else None,
+                       status=db_record.status, previous_vehicle_id=previous_vehicle_id)
+        response.headers["ETag"] = version_etag(db_record.version)
         return db_record
+    except StaleDataError:
+        # Another edit committed between our read and our write
+        raise stale_conflict(db, ServiceRecord, record_id, "Service record")
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -560,64 +762,222 @@ def delete_service_record(record_id: int, db: Session = Depends(get_db)):
     if not record:
         raise HTTPException(status_code=404, detail="Service record not found")
     
+    vehicle_id = record.vehicle_id
+    client_id = record.vehicle.client_id if record.vehicle else None
+    
     # Service items will be deleted automatically due to cascade
     db.delete(record)
     db.commit()
+    publish_change("service_record", "deleted", id=record_id, vehicle_id=vehicle_id, client_id=client_id)
     return {"message": "Service record deleted successfully"}
 
+# Live change events (Server-Sent Events)
+@admin_router.get("/events")
+async def stream_events(request: Request):
+    """Stream change events to dashboards instead of polling"""
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    return StreamingResponse(
+        event_bus.stream(request, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Database connection pools
+@admin_router.get("/db/pool")
+async def get_pool_stats():
+    """Get live connection pool usage for every registered engine"""
+    return engines.stats()
+
+class MaintenanceRequest(BaseModel):
+    tasks: Optional[List[str]] = None  # Default: MAINTENANCE_TASKS
+    full: bool = False
+
+@admin_router.get("/db/maintenance")
+def get_maintenance_status(db: Session = Depends(get_db)):
+    """Get the workshop's database file statistics and latest maintenance reports"""
+    try:
+        return maintenance.maintenance_status(workshop_of(db))
+    except maintenance.MaintenanceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@admin_router.post("/db/maintenance", response_model=JobAccepted, status_code=status.HTTP_202_ACCEPTED)
+def run_database_maintenance(request: MaintenanceRequest, db: Session = Depends(get_db)):
+    """Run maintenance (optimize, vacuum, integrity, backup) on the workshop's database as a background job"""
+    unknown = [task for task in request.tasks or [] if task not in maintenance.TASKS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown maintenance tasks: {', '.join(unknown)}")
+    try:
+        maintenance.database_path(workshop_of(db))
+    except maintenance.MaintenanceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job = job_executor.enqueue("db_maintenance", request.model_dump(), max_attempts=1, workshop=workshop_of(db))
+    return JobAccepted(job_id=job.id, status=job.status)
+
+# Request coalescing
+@admin_router.get("/coalescing")
+async def get_coalescing_stats():
+    """Get how many concurrent identical requests were coalesced, per path"""
+    return single_flight.stats()
+
+@admin_router.get("/response-cache")
+async def get_response_cache_stats():
+    """Get client response cache size, hit ratio and eviction counters"""
+    return client_cache.stats()
+
+@admin_router.delete("/response-cache")
+async def clear_response_cache():
+    """Drop every cached client response in this worker"""
+    client_cache.clear()
+    return {"message": "Response cache cleared"}
+
+# Request profiles
+@admin_router.get("/profiles")
+def get_profiles(route: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
+    """Get recent request profiles, newest first, optionally for one route (e.g. /client/cars/{car_id})"""
+    return profile_store.list(route, limit)
+
+@admin_router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """Get the metadata and most expensive frames of a profile"""
+    metadata = profile_store.metadata(profile_id)
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return metadata
+
+@admin_router.get("/profiles/{profile_id}/folded")
+def get_profile_stacks(profile_id: str):
+    """Download a profile's collapsed stacks for flamegraph.pl or speedscope"""
+    path = profile_store.folded_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=f"{profile_id}.folded")
+
+# Background jobs
+@admin_router.get("/jobs")
+def get_jobs(job_status: Optional[str] = Query(None, alias="status"), skip: int = 0, limit: int = 100, db: Session = Depends(get_default_db)):
+    """Get background jobs, most recent first"""
+    query = db.query(Job)
+    if job_status:
+        query = query.filter(Job.status == job_status)
+    jobs = query.order_by(Job.id.desc()).offset(skip).limit(limit).all()
+    return [job_to_dict(job) for job in jobs]
+
+@admin_router.get("/jobs/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_default_db)):
+    """Get the status and result of a background job"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
+
+# Month-end client statements
+class StatementRunRequest(BaseModel):
+    date_from: Optional[date] = None  # Default: the previous month
+    date_to: Optional[date] = None
+
+STATEMENT_RUN_ID = re.compile(r"^[a-z0-9-]+_\d{4}-\d{2}-\d{2}_\d{4}-\d{2}-\d{2}$")  # workshop_from_to
+
+def statement_run_directory(run_id: str) -> str:
+    if not STATEMENT_RUN_ID.match(run_id):
+        raise HTTPException(status_code=404, detail="Statement run not found")
+    return os.path.join(statements.STATEMENTS_DIR, run_id)
+
+@admin_router.post("/statements", response_model=JobAccepted, status_code=status.HTTP_202_ACCEPTED)
+def create_statement_run(request: StatementRunRequest, db: Session = Depends(get_db)):
+    """Generate statements for every active client of the workshop in a date range as a background job"""
+    default_from, default_to = statements.previous_month()
+    date_from = request.date_from or default_from
+    date_to = request.date_to or default_to
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="date_to must not be before date_from")
+    job = job_executor.enqueue("generate_statements", {
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat()
+    }, workshop=workshop_of(db))
+    return JobAccepted(job_id=job.id, status=job.status)
+
+@admin_router.get("/statements")
+def get_statement_runs():
+    """Get the generated statement runs, newest period first"""
+    return statements.list_runs()
+
+@admin_router.get("/statements/{run_id}")
+def get_statement_run(run_id: str):
+    """Get the manifest of a statement run"""
+    manifest = statements.read_manifest(statement_run_directory(run_id))
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Statement run not found")
+    return manifest
+
+@admin_router.get("/statements/{run_id}/clients/{client_id}")
+def get_client_statement(run_id: str, client_id: int):
+    """Download the statement of one client from a run"""
+    path = os.path.join(statement_run_directory(run_id), f"statement-{client_id}.json")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Statement not found")
+    return FileResponse(path, media_type="application/json", filename=f"statement-{run_id}-{client_id}.json")
+
+# Service type catalog - static, so it is served pre-compressed
+SERVICE_TYPES = {
+    "service_types": [
+        {
+            "type": "oil_change",
+            "name": "Oil Change",
+            "description": "Engine oil and filter replacement",
+            "base_price": 120.0
+        },
+        {
+            "type": "inspection",
+            "name": "Vehicle Inspection",
+            "description": "Comprehensive safety and maintenance inspection",
+            "base_price": 80.0
+        },
+        {
+            "type": "tire_rotation",
+            "name": "Tire Rotation",
+            "description": "Rotate tires for even wear",
+            "base_price": 60.0
+        },
+        {
+            "type": "brake_check",
+            "name": "Brake Inspection",
+            "description": "Check brake pads, rotors, and brake fluid",
+            "base_price": 90.0
+        },
+        {
+            "type": "battery_check",
+            "name": "Battery Test",
+            "description": "Test battery health and charging system",
+            "base_price": 50.0
+        },
+        {
+            "type": "air_filter",
+            "name": "Air Filter Replacement",
+            "description": "Replace engine and cabin air filters",
+            "base_price": 40.0
+        },
+        {
+            "type": "coolant_service",
+            "name": "Coolant Service",
+            "description": "Check and replace engine coolant",
+            "base_price": 100.0
+        },
+        {
+            "type": "transmission_service",
+            "name": "Transmission Service",
+            "description": "Transmission fluid check and replacement",
+            "base_price": 150.0
+        }
+    ]
+}
+
 # Get available service types
 @admin_router.get("/service-types")
-def get_service_types():
+def get_service_types(request: Request):
     """Get available service types"""
-    return {
-        "service_types": [
-            {
-                "type": "oil_change",
-                "name": "Oil Change",
-                "description": "Engine oil and filter replacement",
-                "base_price": 120.0
-            },
-            {
-                "type": "inspection",
-                "name": "Vehicle Inspection",
-                "description": "Comprehensive safety and maintenance inspection",
-                "base_price": 80.0
-            },
-            {
-                "type": "tire_rotation",
-                "name": "Tire Rotation",
-                "description": "Rotate tires for even wear",
-                "base_price": 60.0
-            },
-            {
-                "type": "brake_check",
-                "name": "Brake Inspection",
-                "description": "Check brake pads, rotors, and brake fluid",
-                "base_price": 90.0
-            },
-            {
-                "type": "battery_check",
-                "name": "Battery Test",
-                "description": "Test battery health and charging system",
-                "base_price": 50.0
-            },
-            {
-                "type": "air_filter",
-                "name": "Air Filter Replacement",
-                "description": "Replace engine and cabin air filters",
-                "base_price": 40.0
-            },
-            {
-                "type": "coolant_service",
-                "name": "Coolant Service",
-                "description": "Check and replace engine coolant",
-                "base_price": 100.0
-            },
-            {
-                "type": "transmission_service",
-                "name": "Transmission Service",
-                "description": "Transmission fluid check and replacement",
-                "base_price": 150.0
-            }
-        ]
-    }
+    return static_payloads.response(request, "service-types", lambda: SERVICE_TYPES)
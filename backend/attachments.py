@@ -0,0 +1,453 @@
+"""Photos and documents attached to inspection items.
+
+Uploads are multipart/form-data requests whose file parts are streamed from
+the socket straight to disk: python-multipart parses each chunk as it
+arrives, and the file data is hashed and written in ATTACHMENT_WRITE_BYTES
+blocks on the threadpool, so a request never holds more than one block of a
+file in memory. Files are stored by the SHA-256 of their content,
+    ATTACHMENTS_DIR/<workshop>/<first two hex digits>/<sha256>
+so the same photo attached twice is stored once, and a stored file never
+changes, which makes its ETag permanent.
+
+Thumbnails are rendered by the "attachment_thumbnails" background job on the
+job executor's process pool (Pillow is optional; without it no thumbnails are
+made). Downloads honour single byte ranges (Range/If-Range), so large files
+can be resumed and videos seeked.
+"""
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, Response, StreamingResponse
+from sqlalchemy.orm import Session
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+import anyio
+import hashlib
+import os
+import re
+import uuid
+
+from jobs import job_executor
+from models import InspectionAttachment
+
+# Optional streaming multipart parser (same package Starlette uses for forms)
+try:
+    import multipart
+    from multipart.multipart import parse_options_header
+except ImportError:
+    multipart = None
+    parse_options_header = None
+
+# Optional thumbnail renderer
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+# Attachment settings
+ATTACHMENTS_DIR = os.getenv("ATTACHMENTS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "attachments"))
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(50 * 1024 * 1024)))  # per file
+ATTACHMENT_MAX_FILES = int(os.getenv("ATTACHMENT_MAX_FILES", "50"))                   # per upload request
+ATTACHMENT_WRITE_BYTES = int(os.getenv("ATTACHMENT_WRITE_BYTES", str(1024 * 1024)))  # buffered before each disk write
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))                             # longest side in pixels
+
+# Downloads are read in blocks of this size
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+# Accepted content, recognized by its leading bytes rather than the client's Content-Type
+IMAGE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/heic")
+SNIFF_BYTES = 16
+
+DIGEST = re.compile(r"^[0-9a-f]{64}$")
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def sniff_type(head: bytes) -> Optional[str]:
+    """Content type of a supported file from its first bytes, None when unsupported"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        if head[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+            return "image/heic"
+        return "video/mp4"
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    return None
+
+
+def make_thumbnail(source: str, target: str, size: int) -> bool:
+    """Render a JPEG thumbnail of an image file - runs on the process pool"""
+    if Image is None or os.path.exists(target):
+        return False
+    temporary = f"{target}.{os.getpid()}.tmp"
+    try:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)  # Phone photos are often stored rotated
+            image.thumbnail((size, size))
+            image.convert("RGB").save(temporary, "JPEG", quality=80, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        return False  # Unreadable or unsupported (e.g. HEIC without a plugin) - served without a thumbnail
+    os.replace(temporary, target)
+    return True
+
+
+class UploadWriter:
+    """One file part being written to a temporary file while it is hashed"""
+
+    def __init__(self, store: "AttachmentStore", workshop: str, filename: str):
+        self.store = store
+        self.workshop = workshop
+        self.filename = filename
+        self.size = 0
+        self.content_type: Optional[str] = None
+        self.digest: Optional[str] = None
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+        self._file = None
+        self.temporary = os.path.join(store.temporary_directory(workshop), f"{uuid.uuid4().hex}.upload")
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.store.max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"{self.filename} is larger than {self.store.max_bytes} bytes"
+            )
+        self._buffer += data
+        if self.content_type is None and len(self._buffer) >= SNIFF_BYTES:
+            self._check_type()
+        if len(self._buffer) >= self.store.write_bytes:
+            await self._flush()
+
+    def _check_type(self):
+        self.content_type = sniff_type(bytes(self._buffer[:SNIFF_BYTES]))
+        if self.content_type is None:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"{self.filename} is not a supported photo, video or PDF"
+            )
+
+    def _write_block(self, block: bytes):
+        if self._file is None:
+            self._file = open(self.temporary, "wb")
+        self._file.write(block)
+        self._hash.update(block)
+
+    async def _flush(self):
+        block, self._buffer = bytes(self._buffer), bytearray()
+        await run_in_threadpool(self._write_block, block)
+
+    async def finish(self):
+        if self.content_type is None:
+            self._check_type()
+        await self._flush()
+        await run_in_threadpool(self._file.close)
+        self.digest = self._hash.hexdigest()
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+        try:
+            os.remove(self.temporary)
+        except FileNotFoundError:
+            pass
+
+
+class _PartCollector:
+    """python-multipart callbacks; collects parser events for the async side to act on"""
+
+    def __init__(self):
+        self.events: List[Tuple[str, object]] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._name = b""
+        self._value = b""
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._name.lower()] = self._value
+        self._name, self._value = b"", b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        filename = options.get(b"filename")
+        self.events.append(("part", filename.decode("utf-8", "replace") if filename is not None else None))
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        self.events.append(("data", data[start:end]))
+
+    def on_part_end(self):
+        self.events.append(("end", None))
+
+    def callbacks(self) -> dict:
+        return {name: getattr(self, name) for name in (
+            "on_part_begin", "on_header_field", "on_header_value", "on_header_end",
+            "on_headers_finished", "on_part_data", "on_part_end"
+        )}
+
+
+class AttachmentStore:
+    """Content-addressed attachment files, one tree per workshop"""
+
+    def __init__(self, directory: str = ATTACHMENTS_DIR, max_bytes: int = ATTACHMENT_MAX_BYTES,
+                 max_files: int = ATTACHMENT_MAX_FILES, write_bytes: int = ATTACHMENT_WRITE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.write_bytes = write_bytes
+
+    def path(self, workshop: str, digest: str) -> str:
+        return os.path.join(self.directory, workshop, digest[:2], digest)
+
+    def thumbnail_path(self, workshop: str, digest: str) -> str:
+        return os.path.join(self.directory, workshop, "thumbnails", digest[:2], f"{digest}.jpg")
+
+    def temporary_directory(self, workshop: str) -> str:
+        directory = os.path.join(self.directory, workshop, "tmp")
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def has_thumbnail(self, workshop: str, digest: str) -> bool:
+        return os.path.exists(self.thumbnail_path(workshop, digest))
+
+    async def receive(self, request: Request, workshop: str) -> List[UploadWriter]:
+        """Stream the file parts of a multipart request to temporary files.
+
+        Returns the finished uploads, which the caller records in the database
+        and then hands to publish() - or to discard_uploads() when that fails.
+        Form fields without a filename are ignored.
+        """
+        if multipart is None:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Uploads need python-multipart, which is not installed")
+        content_type, options = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in options:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a multipart/form-data upload")
+
+        collector = _PartCollector()
+        parser = multipart.MultipartParser(options[b"boundary"], collector.callbacks())
+        uploads: List[UploadWriter] = []
+        current: Optional[UploadWriter] = None
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                for kind, value in collector.events:
+                    if kind == "part":
+                        if value is not None:
+                            if len(uploads) >= self.max_files:
+                                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                                    detail=f"At most {self.max_files} files per upload")
+                            current = UploadWriter(self, workshop, os.path.basename(value) or "upload")
+                            uploads.append(current)
+                    elif kind == "data" and current is not None:
+                        await current.write(value)
+                    elif kind == "end" and current is not None:
+                        if current.size == 0:
+                            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                                detail=f"{current.filename} is empty")
+                        await current.finish()
+                        current = None
+                collector.events.clear()
+            parser.finalize()
+        except BaseException:
+            self.discard_uploads(uploads)
+            raise
+        if not uploads:
+            self.discard_uploads(uploads)
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No files in the upload")
+        return uploads
+
+    def publish(self, uploads: Iterable[UploadWriter]):
+        """Move committed uploads into place; content already stored is kept and the copy dropped.
+
+        Called after the database commit, so a concurrent discard_unreferenced()
+        either sees the new rows or ran before the file is put back.
+        """
+        for upload in uploads:
+            target = self.path(upload.workshop, upload.digest)
+            if os.path.exists(target):
+                os.remove(upload.temporary)
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(upload.temporary, target)
+
+    def discard_uploads(self, uploads: Iterable[UploadWriter]):
+        for upload in uploads:
+            upload.abort()
+
+    def discard_unreferenced(self, db: Session, workshop: str, digests: Iterable[str]) -> int:
+        """Remove the files (and thumbnails) of digests no attachment refers to any more"""
+        digests = set(digests)
+        if not digests:
+            return 0
+        referenced = {digest for (digest,) in db.query(InspectionAttachment.sha256).filter(
+            InspectionAttachment.sha256.in_(digests)
+        ).distinct()}
+        removed = 0
+        for digest in digests - referenced:
+            for path in (self.path(workshop, digest), self.thumbnail_path(workshop, digest)):
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def stats(self) -> dict:
+        files = 0
+        total = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if DIGEST.match(name):
+                    files += 1
+                    total += os.path.getsize(os.path.join(root, name))
+        return {"directory": self.directory, "files": files, "bytes": total}
+
+
+def attachments_by_item(db: Session, item_ids: Iterable[int]) -> Dict[int, List[InspectionAttachment]]:
+    """Attachments of several inspection items, oldest first"""
+    item_ids = list(item_ids)
+    attachments = defaultdict(list)
+    if not item_ids:
+        return attachments
+    for attachment in db.query(InspectionAttachment).filter(
+        InspectionAttachment.inspection_item_id.in_(item_ids)
+    ).order_by(InspectionAttachment.id):
+        attachments[attachment.inspection_item_id].append(attachment)
+    return attachments
+
+
+def delete_item_attachments(db: Session, item_ids: Iterable[int]) -> List[str]:
+    """Delete the attachment rows of items; returns their digests for discard_unreferenced()"""
+    item_ids = list(item_ids)
+    if not item_ids:
+        return []
+    query = db.query(InspectionAttachment).filter(InspectionAttachment.inspection_item_id.in_(item_ids))
+    digests = [digest for (digest,) in query.with_entities(InspectionAttachment.sha256)]
+    query.delete(synchronize_session=False)
+    return digests
+
+
+def attachment_to_dict(attachment: InspectionAttachment, url_prefix: str) -> dict:
+    """API representation; url_prefix is "/admin" or "/client" """
+    return {
+        "id": attachment.id,
+        "inspection_item_id": attachment.inspection_item_id,
+        "filename": attachment.filename,
+        "content_type": attachment.content_type,
+        "size": attachment.size,
+        "sha256": attachment.sha256,
+        "url": f"{url_prefix}/attachments/{attachment.id}",
+        "thumbnail_url": f"{url_prefix}/attachments/{attachment.id}/thumbnail" if attachment.content_type in IMAGE_TYPES else None,
+        "created_at": attachment.created_at.isoformat() if attachment.created_at else None
+    }
+
+
+def _byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(first, last) byte of a single-range Range header; None to send the whole file.
+
+    Raises 416 when the range lies outside the file. Multiple ranges are
+    answered with the whole file, which RFC 9110 allows.
+    """
+    match = RANGE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        first, last = max(0, size - int(last)), size - 1  # Suffix range: the last N bytes
+    else:
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first >= size or first > last:
+        raise HTTPException(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                            headers={"Content-Range": f"bytes */{size}"})
+    return first, last
+
+
+def attachment_response(request: Request, attachment: InspectionAttachment, workshop: str,
+                        thumbnail: bool = False) -> Response:
+    """Download of an attachment, or of its thumbnail - the original until the thumbnail is rendered"""
+    if thumbnail and attachment_store.has_thumbnail(workshop, attachment.sha256):
+        path = attachment_store.thumbnail_path(workshop, attachment.sha256)
+        return file_response(request, path, "image/jpeg", f'"{attachment.sha256[:32]}-t"')
+    path = attachment_store.path(workshop, attachment.sha256)
+    # A thumbnail URL answered with the original must not be cached for good
+    return file_response(request, path, attachment.content_type, f'"{attachment.sha256[:32]}"', attachment.filename,
+                         immutable=not thumbnail)
+
+
+def file_response(request: Request, path: str, media_type: str, etag: str,
+                  filename: Optional[str] = None, immutable: bool = True) -> Response:
+    """Serve a file with ETag, conditional and single byte-range support"""
+    if not os.path.exists(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=31536000, immutable" if immutable else "private, no-cache"
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    size = os.path.getsize(path)
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if request.headers.get("range") and (if_range is None or if_range == etag):
+        byte_range = _byte_range(request.headers["range"], size)
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers, filename=filename,
+                            content_disposition_type="inline")
+
+    first, last = byte_range
+
+    async def body():
+        async with await anyio.open_file(path, "rb") as f:
+            await f.seek(first)
+            remaining = last - first + 1
+            while remaining > 0:
+                chunk = await f.read(min(DOWNLOAD_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    headers.update({"Content-Range": f"bytes {first}-{last}/{size}", "Content-Length": str(last - first + 1)})
+    return StreamingResponse(body(), status_code=status.HTTP_206_PARTIAL_CONTENT, media_type=media_type, headers=headers)
+
+
+@job_executor.register("attachment_thumbnails")
+def attachment_thumbnails_job(db, payload: dict):
+    """Background job: render thumbnails of uploaded images on the process pool"""
+    workshop = payload["workshop"]
+    digests = [digest for digest in payload.get("digests", []) if DIGEST.match(digest)]
+    pending = [digest for digest in digests if not attachment_store.has_thumbnail(workshop, digest)]
+    if Image is None or not pending:
+        return {"rendered": 0, "skipped": len(digests)}
+    for digest in pending:
+        os.makedirs(os.path.dirname(attachment_store.thumbnail_path(workshop, digest)), exist_ok=True)
+    rendered = 0
+    for done, created in enumerate(job_executor.map_in_process(
+        make_thumbnail,
+        [attachment_store.path(workshop, digest) for digest in pending],
+        [attachment_store.thumbnail_path(workshop, digest) for digest in pending],
+        [THUMBNAIL_SIZE] * len(pending)
+    ), start=1):
+        rendered += created
+        job_executor.report_progress(done, len(pending))
+    return {"rendered": rendered, "skipped": len(digests) - rendered}
+
+
+# Shared attachment storage for this deployment
+attachment_store = AttachmentStore()
@@ -0,0 +1,127 @@
+from fastapi import APIRouter, HTTPException, Request, status
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import json
+import os
+
+from database import batch_session, shard_router
+from shards import UnknownWorkshop
+
+# Batch settings
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+BATCH_EXCLUDED_PATHS = {"/batch", "/admin/events"}  # recursive or never-ending responses
+
+batch_router = APIRouter(tags=["batch"])
+
+
+class SubRequest(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+
+
+class BatchRequest(BaseModel):
+    requests: List[SubRequest]
+
+
+def begin_snapshot(db: Session):
+    """Start a read transaction so every sub-request sees the same data"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        # The driver only opens a transaction before the first write, so a read snapshot is opened explicitly
+        db.execute(text("BEGIN"))
+    elif dialect == "postgresql":
+        db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"))
+
+
+async def dispatch(request: Request, sub: SubRequest, db: Session) -> dict:
+    """Run one sub-request through the application and capture its response.
+
+    A sub-request that fails with an unhandled exception gets a 500 of its own;
+    the shared session is rolled back so the remaining sub-requests can use it.
+    """
+    path, _, query = sub.path.partition("?")
+    if sub.method.upper() != "GET":
+        return {"id": sub.id, "status": status.HTTP_405_METHOD_NOT_ALLOWED, "body": {"detail": "Only GET requests can be batched"}}
+    if not path.startswith("/") or path in BATCH_EXCLUDED_PATHS:
+        return {"id": sub.id, "status": status.HTTP_400_BAD_REQUEST, "body": {"detail": f"Path cannot be batched: {sub.path}"}}
+
+    # Sub-requests share the caller's credentials
+    headers = [(name, value) for name, value in request.scope["headers"] if name in (b"authorization", b"accept-language", b"x-workshop")]
+    scope = {
+        "type": "http",
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": "GET",
+        "scheme": request.url.scheme,
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": request.scope.get("root_path", ""),
+        "query_string": query.encode(),
+        "headers": headers,
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+    }
+    if "state" in request.scope:
+        scope["state"] = request.scope["state"]
+
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    response = {"status": 500, "headers": {}, "body": bytearray()}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode().lower(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            response["body"].extend(message.get("body", b""))
+
+    try:
+        await request.app(scope, receive, send)
+    except Exception as e:
+        print(f"❌ Batch sub-request {sub.path} failed: {e!r}")
+        db.rollback()
+        begin_snapshot(db)
+        return {"id": sub.id, "status": status.HTTP_500_INTERNAL_SERVER_ERROR, "body": {"detail": "Internal Server Error"}}
+
+    body = bytes(response["body"])
+    if response["headers"].get("content-type", "").startswith("application/json"):
+        body = json.loads(body) if body else None
+    else:
+        body = body.decode("utf-8", errors="replace")
+    return {"id": sub.id, "status": response["status"], "body": body}
+
+
+@batch_router.post("/batch")
+async def run_batch(batch: BatchRequest, request: Request):
+    """Run several GET requests in one round trip, sharing one session and snapshot"""
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can contain at most {BATCH_MAX_REQUESTS} requests"
+        )
+
+    try:
+        workshop = shard_router.workshop_for(request)
+    except UnknownWorkshop as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    db = shard_router.session(workshop)
+    token = batch_session.set(db)
+    try:
+        begin_snapshot(db)
+        # Sequential on purpose - the shared session is not safe for concurrent use
+        responses = [await dispatch(request, sub, db) for sub in batch.requests]
+    finally:
+        batch_session.reset(token)
+        db.close()
+
+    return {"responses": responses}
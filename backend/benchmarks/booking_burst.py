@@ -0,0 +1,106 @@
+"""Burst benchmark for the booking engine.
+
+Fires many simultaneous booking attempts at a handful of slots from several
+processes (each with its own BookingEngine, like separate API workers) and
+threads, then checks that no slot was overbooked.
+
+Usage (from the backend directory):
+    python benchmarks/booking_burst.py --processes 4 --threads 8 --attempts 400
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def _next_slots(engine, count):
+    now = datetime.now()
+    slots = []
+    for offset in range(1, engine.window_days):
+        for slot_start in engine.slots_for_day((now + timedelta(days=offset)).date()):
+            slots.append(slot_start)
+            if len(slots) == count:
+                return slots
+    return slots
+
+
+def _worker(args):
+    worker_id, threads, attempts, slot_count = args
+    from database import SessionLocal, engine as db_engine
+    from bookings import BookingEngine, SlotUnavailable
+
+    # Don't reuse connections inherited from the parent process
+    db_engine.dispose(close=False)
+    engine = BookingEngine()
+    slots = _next_slots(engine, slot_count)
+
+    def attempt(i):
+        db = SessionLocal()
+        try:
+            engine.reserve(db, 1, slots[(worker_id + i) % len(slots)], "Oil Change")
+            return True
+        except SlotUnavailable:
+            return False
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(attempt, range(attempts)))
+    return sum(results), len(results) - sum(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--attempts", type=int, default=200, help="attempts per process")
+    parser.add_argument("--slots", type=int, default=10, help="distinct slots being fought over")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "booking_bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from database import SessionLocal, init_db
+    from models import Client, Booking
+    from bookings import WORKSHOP_BAYS
+
+    init_db()
+    db = SessionLocal()
+    db.add(Client(name="Bench Client", phone="+10000000000"))
+    db.commit()
+    db.close()
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        jobs = [(i, args.threads, args.attempts, args.slots) for i in range(args.processes)]
+        outcomes = list(pool.map(_worker, jobs))
+    elapsed = time.perf_counter() - started
+
+    booked = sum(o[0] for o in outcomes)
+    rejected = sum(o[1] for o in outcomes)
+    total = booked + rejected
+
+    db = SessionLocal()
+    rows = db.query(Booking.slot_start, Booking.bay).filter(Booking.status == "confirmed").all()
+    db.close()
+    per_slot = {}
+    for slot_start, bay in rows:
+        per_slot.setdefault(slot_start, []).append(bay)
+    overbooked = [s for s, bays in per_slot.items() if len(bays) > WORKSHOP_BAYS or len(set(bays)) != len(bays)]
+
+    print(f"attempts:      {total} ({args.processes} processes x {args.threads} threads)")
+    print(f"booked:        {booked} (capacity {args.slots} slots x {WORKSHOP_BAYS} bays)")
+    print(f"rejected:      {rejected}")
+    print(f"elapsed:       {elapsed:.2f}s ({total / elapsed:.0f} attempts/s)")
+    print(f"overbooked:    {len(overbooked)} slots")
+    return 1 if overbooked or booked != len(rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Race check for optimistic concurrency on admin edits.
+
+Two admins edit the same service record (and the same inspection) from the
+same version. The losing edit is held until the winning edit has committed,
+right before it writes anything, so its compare-and-swap is what fails. The
+check passes when the loser gets 409 and the winner's items are all still
+there.
+
+Usage (from the backend directory):
+    python benchmarks/edit_race.py
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def race(client, session_factory, model, entity_id, path, winner, loser):
+    """PUT loser, running the winning PUT just before the loser's first flush; returns both responses"""
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    # Its own event loop, so it can run while the loser's request is paused
+    winner_client = TestClient(client.app)
+    responses = {}
+    held = []
+
+    def before_flush(session, flush_context, instances):
+        if held:
+            return  # The winner's own flush, or the loser resuming
+        if any(isinstance(obj, model) and obj.id == entity_id for obj in session.dirty):
+            held.append(session)
+            responses["winner"] = winner_client.put(path, json=winner)
+
+    # Ahead of the change tracking listener, which already writes
+    event.listen(session_factory, "before_flush", before_flush, insert=True)
+    try:
+        responses["loser"] = client.put(path, json=loser)
+    finally:
+        event.remove(session_factory, "before_flush", before_flush)
+    return responses["winner"], responses["loser"]
+
+
+def check(name, winner, loser, stored, expected):
+    ok = winner.status_code == 200 and loser.status_code == 409 and stored == expected
+    print(f"{name:<16} winner {winner.status_code}  loser {loser.status_code}  "
+          f"items {stored}  {'ok' if ok else f'EXPECTED {expected}'}")
+    return ok
+
+
+def main():
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'race.db')}"
+
+    from fastapi.testclient import TestClient
+    from main import app
+    from database import SessionLocal
+    from models import ServiceRecord, ServiceItem, InspectionReport, InspectionItem
+
+    ok = True
+    with TestClient(app) as client:
+        db = SessionLocal()
+        try:
+            record = db.query(ServiceRecord).order_by(ServiceRecord.id).first()
+            inspection = db.query(InspectionReport).order_by(InspectionReport.id).first()
+            record_id, record_version, record_vehicle = record.id, record.version, record.vehicle_id
+            inspection_id, inspection_version, inspection_vehicle = inspection.id, inspection.version, inspection.vehicle_id
+        finally:
+            db.close()
+
+        def service_edit(names):
+            return {
+                "vehicle_id": record_vehicle, "service_date": "2024-01-15T10:00:00", "status": "completed",
+                "version": record_version,
+                "service_items": [{"service_type": "maintenance", "service_name": name, "price": 10.0} for name in names]
+            }
+
+        winner, loser = race(client, SessionLocal, ServiceRecord, record_id, f"/admin/service-records/{record_id}",
+                             service_edit(["Brakes", "Tyres", "Wipers"]), service_edit(["Battery"]))
+        db = SessionLocal()
+        try:
+            stored = [name for (name,) in db.query(ServiceItem.service_name).filter(
+                ServiceItem.service_record_id == record_id).order_by(ServiceItem.id)]
+        finally:
+            db.close()
+        ok &= check("service record", winner, loser, stored, ["Brakes", "Tyres", "Wipers"])
+
+        def inspection_edit(names):
+            return {
+                "vehicle_id": inspection_vehicle, "inspection_date": "2024-01-15T10:00:00", "overall_condition": "good",
+                "version": inspection_version,
+                "items": [{"item_name": name, "status": "good"} for name in names]
+            }
+
+        winner, loser = race(client, SessionLocal, InspectionReport, inspection_id, f"/admin/inspections/{inspection_id}",
+                             inspection_edit(["Brakes", "Tyres", "Wipers"]), inspection_edit(["Battery"]))
+        db = SessionLocal()
+        try:
+            stored = [name for (name,) in db.query(InspectionItem.item_name).filter(
+                InspectionItem.inspection_id == inspection_id).order_by(InspectionItem.id)]
+        finally:
+            db.close()
+        ok &= check("inspection", winner, loser, stored, ["Brakes", "Tyres", "Wipers"])
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
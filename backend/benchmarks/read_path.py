@@ -0,0 +1,117 @@
+"""ORM versus Core read-model benchmark for the client service history.
+
+Seeds a vehicle with many service records and items, then builds the
+/client/cars/{id}/history payload repeatedly with the ORM (entities plus
+selectinload) and with the cached lambda statements in readmodels.py,
+reporting rows per second for each.
+
+Usage (from the backend directory):
+    python benchmarks/read_path.py --services 500 --items 4 --rounds 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def orm_history(db, vehicle_id):
+    from sqlalchemy.orm import selectinload
+    from models import ServiceRecord
+
+    records = db.query(ServiceRecord).filter(
+        ServiceRecord.vehicle_id == vehicle_id
+    ).options(selectinload(ServiceRecord.service_items)).order_by(ServiceRecord.service_date.desc()).all()
+    return [
+        {
+            "service_id": str(record.id),
+            "date": record.service_date.isoformat(),
+            "cost": float(record.total_cost),
+            "status": record.status,
+            "service_items": [
+                {"service_name": item.service_name, "price": float(item.price)}
+                for item in record.service_items
+            ]
+        }
+        for record in records
+    ]
+
+
+def core_history(db, vehicle_id):
+    import readmodels
+
+    items_by_record = readmodels.vehicle_service_items(db, vehicle_id)
+    return [
+        {
+            "service_id": str(record.id),
+            "date": record.service_date.isoformat(),
+            "cost": float(record.total_cost),
+            "status": record.status,
+            "service_items": [
+                {"service_name": item.service_name, "price": float(item.price)}
+                for item in items_by_record[record.id]
+            ]
+        }
+        for record in readmodels.vehicle_services(db, vehicle_id)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--services", type=int, default=500)
+    parser.add_argument("--items", type=int, default=4, help="items per service record")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "read_bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from sqlalchemy import insert
+    from database import SessionLocal, init_db, engine
+    from models import Client, Vehicle, ServiceRecord, ServiceItem
+
+    init_db()
+    with engine.begin() as connection:
+        connection.execute(insert(Client.__table__).values(id=1, name="Bench Client", phone="+10000000000", is_active=True))
+        connection.execute(insert(Vehicle.__table__).values(id=1, client_id=1, make="Tesla", model="Model 3",
+                                                            year=2022, license_plate="BENCH1"))
+        start = datetime(2020, 1, 1)
+        connection.execute(insert(ServiceRecord.__table__), [
+            {"id": i, "vehicle_id": 1, "service_date": start + timedelta(days=i), "status": "completed",
+             "total_cost": 100.0, "created_at": start}
+            for i in range(1, args.services + 1)
+        ])
+        connection.execute(insert(ServiceItem.__table__), [
+            {"service_record_id": i, "service_type": "oil_change", "service_name": f"Service {j}",
+             "price": 25.0, "created_at": start}
+            for i in range(1, args.services + 1) for j in range(args.items)
+        ])
+
+    rows_per_round = args.services * (1 + args.items)
+    results = {}
+    for name, build in (("orm", orm_history), ("core", core_history)):
+        db = SessionLocal()
+        try:
+            payload = build(db, 1)  # Warm up statement caches
+            db.rollback()
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                payload = build(db, 1)
+                db.rollback()  # Fresh identity map each round, like a new request
+            elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+        results[name] = (payload, elapsed)
+        print(f"{name:>5}: {args.rounds * rows_per_round / elapsed:>10.0f} rows/s "
+              f"({elapsed / args.rounds * 1000:.1f} ms per history of {rows_per_round} rows)")
+
+    print(f"speedup: {results['orm'][1] / results['core'][1]:.2f}x")
+    return 0 if results["orm"][0] == results["core"][0] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Statement-count check for the admin listings.
+
+Seeds a fresh database at two sizes and counts the SQL statements each admin
+listing issues. A listing passes when the count does not grow with the number
+of rows (no per-row queries).
+
+Usage (from the backend directory):
+    python benchmarks/statement_counts.py --small 5 --large 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+ENDPOINTS = [
+    "/admin/inspections",
+    "/admin/services",
+    "/admin/service-records",
+    "/admin/service-records?status=completed&service_type=oil_change&sort=-service_date",
+    "/admin/inspections?overall_condition=good&status=good&sort=-inspection_date,client",
+    "/admin/vehicles",
+    "/admin/vehicles/1/inspections",
+]
+
+
+def seed(engine, rows):
+    from sqlalchemy import insert, delete
+    from models import Client, Vehicle, ServiceRecord, ServiceItem, InspectionReport, InspectionItem
+
+    start = datetime(2023, 1, 1)
+    with engine.begin() as connection:
+        for model in (InspectionItem, ServiceItem, ServiceRecord, InspectionReport, Vehicle, Client):
+            connection.execute(delete(model.__table__))
+        connection.execute(insert(Client.__table__), [
+            {"id": i, "name": f"Client {i}", "phone": f"+1000000{i:04d}", "is_active": True, "created_at": start}
+            for i in range(1, rows + 1)
+        ])
+        connection.execute(insert(Vehicle.__table__), [
+            {"id": i, "client_id": i, "make": "Tesla", "model": "Model 3", "year": 2022,
+             "license_plate": f"BENCH{i}", "created_at": start}
+            for i in range(1, rows + 1)
+        ])
+        # Every vehicle gets an inspection and a service linked to it; vehicle 1 gets one per row
+        connection.execute(insert(InspectionReport.__table__), [
+            {"id": i, "vehicle_id": 1 if i <= rows // 2 else i, "inspection_date": start + timedelta(days=i),
+             "overall_condition": "good", "created_at": start}
+            for i in range(1, rows + 1)
+        ])
+        connection.execute(insert(InspectionItem.__table__), [
+            {"inspection_id": i, "item_name": f"Item {j}", "status": "good"}
+            for i in range(1, rows + 1) for j in range(3)
+        ])
+        connection.execute(insert(ServiceRecord.__table__), [
+            {"id": i, "vehicle_id": i, "service_date": start + timedelta(days=i), "status": "completed",
+             "total_cost": 50.0, "linked_inspection_id": i if i % 2 else None, "created_at": start}
+            for i in range(1, rows + 1)
+        ])
+        connection.execute(insert(ServiceItem.__table__), [
+            {"service_record_id": i, "service_type": "oil_change", "service_name": "Oil Change",
+             "price": 25.0, "created_at": start}
+            for i in range(1, rows + 1) for j in range(2)
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--small", type=int, default=5)
+    parser.add_argument("--large", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'statements.db')}"
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    from main import app
+    from database import engine
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *params: statements.append(params[2]))
+
+    counts = {}
+    with TestClient(app) as client:
+        for rows in (args.small, args.large):
+            seed(engine, rows)
+            for path in ENDPOINTS:
+                statements.clear()
+                response = client.get(path)
+                assert response.status_code == 200, (path, response.status_code, response.text)
+                counts.setdefault(path, []).append(len(statements))
+
+    failed = False
+    print(f"{'endpoint':<84} {args.small:>6} {args.large:>6}")
+    for path, (small, large) in counts.items():
+        failed |= small != large
+        print(f"{path:<84} {small:>6} {large:>6}  {'ok' if small == large else 'GROWS WITH ROWS'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
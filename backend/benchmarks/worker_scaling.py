@@ -0,0 +1,121 @@
+"""Throughput scaling benchmark for multi-worker mode.
+
+Starts the API with 1, 2, ... N uvicorn workers on a fresh database, drives it
+with concurrent HTTP clients for a fixed time, and reports requests per second
+and the speedup over a single worker. Also checks that a booking cancelled on
+one worker frees the bay on the others (invalidation bus).
+
+Usage (from the backend directory):
+    python benchmarks/worker_scaling.py --max-workers 4 --duration 10 --path /admin/services
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(workers, port, db_path):
+    env = dict(os.environ, WEB_WORKERS=str(workers), API_PORT=str(port), DATABASE_URL=f"sqlite:///{db_path}")
+    server = subprocess.Popen([sys.executable, "main.py"], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"Server with {workers} worker(s) did not start")
+
+
+def _client(args):
+    url, threads, duration = args
+    stop_at = time.time() + duration
+
+    def loop(_):
+        done = errors = 0
+        with httpx.Client(timeout=30) as client:
+            while time.time() < stop_at:
+                try:
+                    ok = client.get(url).status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                done += ok
+                errors += not ok
+        return done, errors
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(loop, range(threads)))
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+def _check_coherence(port):
+    """Book and cancel the same slot many times; every worker must see the freed bays"""
+    base = f"http://127.0.0.1:{port}"
+    token = httpx.post(f"{base}/auth/login", json={"client_code": "DEMO123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    slot = httpx.get(f"{base}/bookings/availability", headers=headers).json()[0]
+    failures = 0
+    for _ in range(20):
+        created = httpx.post(f"{base}/bookings", headers=headers, json={
+            "date": slot["date"], "time": slot["time"], "service": "Oil Change"
+        })
+        if created.status_code != 200:
+            failures += 1
+            continue
+        httpx.delete(f"{base}/bookings/{created.json()['booking_id']}", headers=headers)
+        time.sleep(0.3)  # Allow one bus poll
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load per run")
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--threads", type=int, default=8, help="connections per load generator process")
+    parser.add_argument("--path", default="/admin/services")
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'workers':>7} {'req/s':>9} {'speedup':>8} {'errors':>7} {'stale':>6}")
+    for workers in range(1, args.max_workers + 1):
+        db_path = os.path.join(tempfile.mkdtemp(), "scaling_bench.db")
+        port = _free_port()
+        server = _start_server(workers, port, db_path)
+        try:
+            started = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=args.clients) as pool:
+                jobs = [(f"http://127.0.0.1:{port}{args.path}", args.threads, args.duration)] * args.clients
+                outcomes = list(pool.map(_client, jobs))
+            elapsed = time.perf_counter() - started
+            stale = _check_coherence(port)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+        done = sum(o[0] for o in outcomes)
+        errors = sum(o[1] for o in outcomes)
+        throughput = done / elapsed
+        baseline = baseline or throughput
+        print(f"{workers:>7} {throughput:>9.0f} {throughput / baseline:>7.2f}x {errors:>7} {stale:>6}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from datetime import datetime, date, time, timedelta
+from typing import Dict, List, Optional, Set
+import os
+import threading
+
+from models import Booking
+from events import event_bus
+from shards import workshop_of
+
+# Workshop capacity settings
+WORKSHOP_BAYS = int(os.getenv("WORKSHOP_BAYS", "3"))
+BOOKING_SLOT_TIMES = os.getenv("BOOKING_SLOT_TIMES", "09:00,10:00,11:00,14:00,15:00,16:00")
+BOOKING_CLOSED_WEEKDAYS = os.getenv("BOOKING_CLOSED_WEEKDAYS", "")  # e.g. "4" to close on Fridays (Mon=0)
+BOOKING_WINDOW_DAYS = int(os.getenv("BOOKING_WINDOW_DAYS", "14"))
+
+
+class SlotUnavailable(Exception):
+    """Raised when a requested slot cannot be booked"""
+
+
+def parse_slot_time(value: str) -> time:
+    """Parse a slot time such as '10:00 AM' or '14:00'"""
+    value = value.strip().upper()
+    for fmt in ("%I:%M %p", "%I:%M%p", "%H:%M"):
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid time: {value}")
+
+
+def format_slot_time(value: time) -> str:
+    """Format a slot time the way the mobile app displays it ('9:00 AM')"""
+    return value.strftime("%I:%M %p").lstrip("0")
+
+
+class BookingEngine:
+    """Workshop capacity model (bays x time slots) with an in-memory availability index.
+
+    The index maps each slot start within the booking window to the set of bays
+    already taken. It is loaded with one indexed range query and then kept up to
+    date as bookings are made and cancelled, so availability lookups never scan
+    the bookings table. The partial unique index on (slot_start, bay) remains the
+    source of truth: if another process takes a bay first, the insert fails, the
+    slot is reloaded and the next free bay is tried.
+    """
+
+    def __init__(self, bays: int = WORKSHOP_BAYS, slot_times: str = BOOKING_SLOT_TIMES,
+                 closed_weekdays: str = BOOKING_CLOSED_WEEKDAYS, window_days: int = BOOKING_WINDOW_DAYS):
+        self.bays = bays
+        self.slot_times = sorted(parse_slot_time(t) for t in slot_times.split(",") if t.strip())
+        self.closed_weekdays = {int(d) for d in closed_weekdays.split(",") if d.strip()}
+        self.window_days = window_days
+        self._taken: Dict[datetime, Set[int]] = {}
+        self._loaded_range = None
+        self._lock = threading.Lock()
+
+    def slots_for_day(self, day: date) -> List[datetime]:
+        """All slot start times the workshop offers on a day"""
+        if day.weekday() in self.closed_weekdays:
+            return []
+        return [datetime.combine(day, slot_time) for slot_time in self.slot_times]
+
+    def is_valid_slot(self, slot_start: datetime) -> bool:
+        return slot_start in self.slots_for_day(slot_start.date())
+
+    def _load(self, db: Session, start: datetime, end: datetime):
+        """Load taken bays for [start, end) with one indexed range query"""
+        rows = db.query(Booking.slot_start, Booking.bay).filter(
+            Booking.slot_start >= start,
+            Booking.slot_start < end,
+            Booking.status == "confirmed"
+        ).all()
+        taken: Dict[datetime, Set[int]] = {}
+        for slot_start, bay in rows:
+            taken.setdefault(slot_start, set()).add(bay)
+        return taken
+
+    def _ensure_loaded(self, db: Session, start: datetime, end: datetime):
+        # Caller holds self._lock
+        if self._loaded_range and self._loaded_range[0] <= start and end <= self._loaded_range[1]:
+            return
+        self._taken = self._load(db, start, end)
+        self._loaded_range = (start, end)
+
+    def _refresh_slot(self, db: Session, slot_start: datetime):
+        taken = self._load(db, slot_start, slot_start + timedelta(seconds=1))
+        self._taken[slot_start] = taken.get(slot_start, set())
+
+    def _window(self, today: date, days: int):
+        start = datetime.combine(today, time.min)
+        return start, start + timedelta(days=days)
+
+    def invalidate(self):
+        """Forget the index so it is reloaded from the database on next use"""
+        with self._lock:
+            self._taken = {}
+            self._loaded_range = None
+
+    def availability(self, db: Session, days: Optional[int] = None, now: Optional[datetime] = None) -> List[dict]:
+        """Free capacity for every upcoming slot in the next `days` days"""
+        now = now or datetime.now()
+        days = min(days or self.window_days, self.window_days)
+        start, end = self._window(now.date(), self.window_days)
+
+        with self._lock:
+            self._ensure_loaded(db, start, end)
+            result = []
+            for offset in range(days):
+                day = now.date() + timedelta(days=offset)
+                for slot_start in self.slots_for_day(day):
+                    if slot_start <= now:
+                        continue
+                    free_bays = self.bays - len(self._taken.get(slot_start, ()))
+                    if free_bays > 0:
+                        result.append({
+                            "date": day.isoformat(),
+                            "time": format_slot_time(slot_start.time()),
+                            "slot_start": slot_start.isoformat(),
+                            "free_bays": free_bays
+                        })
+        return result
+
+    def reserve(self, db: Session, client_id: int, slot_start: datetime, service: str,
+                vehicle_id: Optional[int] = None, now: Optional[datetime] = None) -> Booking:
+        """Book the first free bay in a slot, raising SlotUnavailable if none is left"""
+        now = now or datetime.now()
+        if not self.is_valid_slot(slot_start):
+            raise SlotUnavailable("The workshop does not offer this time slot")
+        if slot_start <= now or slot_start >= datetime.combine(now.date(), time.min) + timedelta(days=self.window_days):
+            raise SlotUnavailable(f"Bookings can only be made within the next {self.window_days} days")
+
+        with self._lock:
+            self._ensure_loaded(db, *self._window(now.date(), self.window_days))
+            taken = self._taken.setdefault(slot_start, set())
+
+            for bay in range(1, self.bays + 1):
+                if bay in taken:
+                    continue
+                booking = Booking(
+                    client_id=client_id,
+                    vehicle_id=vehicle_id,
+                    slot_start=slot_start,
+                    bay=bay,
+                    service=service,
+                    status="confirmed",
+                    created_at=datetime.utcnow()
+                )
+                db.add(booking)
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Another worker took this bay first - resync the slot and keep looking
+                    db.rollback()
+                    self._refresh_slot(db, slot_start)
+                    taken = self._taken[slot_start]
+                    continue
+                taken.add(bay)
+                db.refresh(booking)
+                return booking
+
+        raise SlotUnavailable("This time slot is fully booked")
+
+    def cancel(self, db: Session, booking: Booking):
+        """Cancel a booking and release its bay"""
+        with self._lock:
+            booking.status = "cancelled"
+            db.commit()
+            self._taken.get(booking.slot_start, set()).discard(booking.bay)
+
+
+    def on_change(self, event: dict):
+        """Event listener - reload the index when another worker booked or cancelled"""
+        if event.get("remote") and event["type"].startswith("booking."):
+            self.invalidate()
+
+
+# Engines used by the booking endpoints - one per workshop, as every branch has its own bays and database
+booking_engines: Dict[str, BookingEngine] = {}
+_booking_engines_lock = threading.Lock()
+
+
+def booking_engine_for(db: Session) -> BookingEngine:
+    """The booking engine of the workshop a session belongs to"""
+    workshop = workshop_of(db)
+    with _booking_engines_lock:
+        engine = booking_engines.get(workshop)
+        if engine is None:
+            engine = booking_engines[workshop] = BookingEngine()
+        return engine
+
+
+def _on_change(event: dict):
+    for engine in list(booking_engines.values()):
+        engine.on_change(event)
+
+
+event_bus.add_listener(_on_change)
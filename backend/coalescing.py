@@ -0,0 +1,167 @@
+from starlette.datastructures import Headers
+from typing import Dict, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import threading
+
+from events import event_bus
+
+# Request coalescing settings - exact paths of expensive, side-effect free GET endpoints
+COALESCE_PATHS = [
+    path.strip() for path in os.getenv(
+        "COALESCE_PATHS",
+        "/admin/inspections,/admin/services,/admin/service-records,/admin/vehicles,/admin/clients,/admin/dashboard"
+    ).split(",") if path.strip()
+]
+
+# Request headers that can change a response (credentials, workshop, profiling, encodings), so they are part of the coalescing key
+KEY_HEADERS = (b"authorization", b"x-workshop", b"x-profile", b"cookie", b"accept-encoding", b"accept-language")
+
+
+class FlightStats:
+    """Counters for one coalesced path"""
+
+    def __init__(self):
+        self.requests = 0
+        self.executions = 0
+        self.coalesced = 0    # requests answered with another request's response
+        self.max_waiters = 0  # most requests sharing one execution
+        self.failures = 0     # executions without a shareable response; their followers ran on their own
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / self.requests, 3) if self.requests else 0.0,
+            "max_waiters": self.max_waiters,
+            "failures": self.failures
+        }
+
+
+class _Flight:
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.waiters = 1
+        self.done = asyncio.Event()
+        self.response: Optional[Tuple[dict, list]] = None  # (start message, body messages)
+
+
+class SingleFlight:
+    """Collapses concurrent identical requests into one execution.
+
+    The first request for a key (the leader) runs the endpoint; requests with
+    the same key that arrive while it is running wait and receive a copy of its
+    response. Every published change event starts a new generation, so requests
+    arriving after a write never join a read that began before it.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._stats: Dict[str, FlightStats] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def on_change(self, event: dict):
+        """Event bus listener - called from any thread"""
+        with self._lock:
+            self._generation += 1
+
+    def stats_for(self, path: str) -> FlightStats:
+        with self._lock:
+            return self._stats.setdefault(path, FlightStats())
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            return {path: stats.to_dict() for path, stats in sorted(self._stats.items())}
+
+    def join(self, key: str) -> Tuple[_Flight, bool]:
+        """The flight for key and whether the caller leads it; runs on the event loop"""
+        with self._lock:
+            generation = self._generation
+        flight = self._flights.get(key)
+        if flight is not None and flight.generation == generation and not flight.done.is_set():
+            flight.waiters += 1
+            return flight, False
+        flight = _Flight(generation)
+        self._flights[key] = flight
+        return flight, True
+
+    def land(self, key: str, flight: _Flight, response: Optional[Tuple[dict, list]]):
+        """Publish the leader's response (None when it failed) and wake the followers"""
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        flight.response = response
+        flight.done.set()
+
+
+class CoalescingMiddleware:
+    """Single-flight layer for the GET endpoints listed in COALESCE_PATHS.
+
+    Requests are identical when method, path, query string and the KEY_HEADERS
+    (authorization scope, encodings, language) match. Followers replay the
+    leader's buffered response; if the leader fails, each follower runs the
+    endpoint itself.
+    """
+
+    def __init__(self, app, paths=None, flights: Optional[SingleFlight] = None):
+        self.app = app
+        self.paths = set(COALESCE_PATHS if paths is None else paths)
+        self.flights = flights or single_flight
+
+    def _key(self, scope) -> str:
+        headers = Headers(scope=scope)
+        parts = [scope["path"].encode(), scope.get("query_string", b"")]
+        parts += [name + b"=" + headers.get(name.decode(), "").encode() for name in KEY_HEADERS]
+        return hashlib.sha256(b"\0".join(parts)).hexdigest()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        stats = self.flights.stats_for(scope["path"])
+        stats.requests += 1
+        key = self._key(scope)
+        flight, leader = self.flights.join(key)
+
+        if not leader:
+            stats.max_waiters = max(stats.max_waiters, flight.waiters)
+            await flight.done.wait()
+            if flight.response is not None:
+                stats.coalesced += 1
+                start, bodies = flight.response
+                await send(dict(start))
+                for body in bodies:
+                    await send(dict(body))
+                return
+            await self.app(scope, receive, send)  # Leader failed - run on our own
+            return
+
+        stats.executions += 1
+        start = None
+        bodies = []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                bodies.append(message)
+            await send(message)
+
+        response = None
+        try:
+            await self.app(scope, receive, capture)
+            if start is not None and start["status"] < 500:
+                response = (start, bodies)
+        finally:
+            if response is None:
+                stats.failures += 1
+            self.flights.land(key, flight, response)
+
+
+# Shared single-flight registry for this worker process
+single_flight = SingleFlight()
+event_bus.add_listener(single_flight.on_change)
@@ -0,0 +1,265 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from typing import Callable, Dict, Optional
+import hashlib
+import json
+import os
+import threading
+import zlib
+
+# Optional codecs - brotli and zstandard are used when installed, gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compression settings
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "500"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))  # 1 (fastest) - 9 (smallest)
+
+# Content types that are already compressed or must not be buffered
+UNCOMPRESSIBLE_TYPES = ("image/", "video/", "audio/", "application/zip", "application/gzip", "application/pdf", "text/event-stream")
+
+
+def available_encodings():
+    """Encodings supported by this process, in server preference order"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str, supported=None) -> Optional[str]:
+    """Pick the best encoding from an Accept-Encoding header, or None for identity"""
+    supported = supported or available_encodings()
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[token] = quality
+
+    best = None
+    best_quality = 0.0
+    for encoding in supported:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class _Compressor:
+    """Incremental compressor with a common interface for all codecs"""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == "br":
+            # Brotli quality goes up to 11, map the shared 1-9 level onto it
+            self._obj = brotli.Compressor(quality=min(11, max(0, level + 2)))
+        elif encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._obj.process(data)
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        """Emit everything compressed so far so a streaming client can decode it"""
+        if self.encoding == "gzip":
+            return self._obj.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._obj.flush()
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def compress_bytes(data: bytes, encoding: str, level: int = COMPRESSION_LEVEL) -> bytes:
+    """Compress a complete payload in one go"""
+    compressor = _Compressor(encoding, level)
+    return compressor.compress(data) + compressor.finish()
+
+
+class CompressionMiddleware:
+    """Content-negotiated gzip/brotli/zstd compression for HTTP responses.
+
+    Small responses are passed through untouched, streaming responses are
+    compressed chunk by chunk and flushed so clients receive data as it is
+    produced, and responses that already carry a Content-Encoding (such as
+    pre-compressed cache hits) are left alone.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MINIMUM_SIZE, level: int = COMPRESSION_LEVEL):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self.app, encoding, self.minimum_size, self.level)
+        await responder(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app, encoding: str, minimum_size: int, level: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.level = level
+        self.send = None
+        self.initial_message = {}
+        self.started = False
+        self.passthrough = False
+        self.compressor = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _should_skip(self, headers: Headers) -> bool:
+        if "content-encoding" in headers or "content-range" in headers:
+            return True
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(UNCOMPRESSIBLE_TYPES)
+
+    async def send_compressed(self, message):
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            # Hold the start message until we know whether the body gets compressed
+            self.initial_message = message
+            self.passthrough = self._should_skip(Headers(raw=message["headers"]))
+            return
+
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.started:
+            self.started = True
+            if self.passthrough or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            self.compressor = _Compressor(self.encoding, self.level)
+
+            if not more_body:
+                body = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(body))
+            else:
+                # Streaming response - length is unknown up front
+                del headers["Content-Length"]
+                body = self.compressor.compress(body) + self.compressor.flush()
+
+            message["body"] = body
+            await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if more_body:
+            message["body"] = self.compressor.compress(body) + self.compressor.flush()
+        else:
+            message["body"] = self.compressor.compress(body) + self.compressor.finish()
+        await self.send(message)
+
+
+class PrecompressedCache:
+    """Cache of immutable JSON payloads kept alongside their compressed variants.
+
+    Each entry is serialized once and compressed once per encoding at the
+    highest level, so repeated requests are served straight from memory.
+    """
+
+    def __init__(self, level: int = 9):
+        self.level = level
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, key: str, build: Callable[[], object]) -> dict:
+        entry = self._entries.get(key)
+        if entry is None:
+            body = json.dumps(build(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            entry = {
+                "body": body,
+                "etag": '"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+                "encoded": {},
+            }
+            with self._lock:
+                entry = self._entries.setdefault(key, entry)
+        return entry
+
+    def response(self, request: Request, key: str, build: Callable[[], object]) -> Response:
+        """Return the cached payload for key, building it on first use"""
+        entry = self._entry(key, build)
+        headers = {"ETag": entry["etag"], "Vary": "Accept-Encoding"}
+
+        if request.headers.get("if-none-match") == entry["etag"]:
+            return Response(status_code=304, headers=headers)
+
+        body = entry["body"]
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is not None and len(body) >= COMPRESSION_MINIMUM_SIZE:
+            encoded = entry["encoded"].get(encoding)
+            if encoded is None:
+                encoded = compress_bytes(body, encoding, self.level)
+                entry["encoded"][encoding] = encoded
+            body = encoded
+            headers["Content-Encoding"] = encoding
+
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def invalidate(self, prefix: str = ""):
+        """Drop cached entries whose key starts with prefix (all entries by default)"""
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+
+# Shared cache for static catalog payloads (FAQ, service types)
+static_payloads = PrecompressedCache()
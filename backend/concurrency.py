@@ -0,0 +1,84 @@
+"""Optimistic concurrency for admin edits.
+
+Service records and inspection reports carry a version column that SQLAlchemy
+uses as the mapper's version_id_col, so every ORM update of such a row is a
+compare-and-swap:
+    UPDATE service_records SET ..., version = :old + 1 WHERE id = :id AND version = :old
+When another transaction changed the row after it was read, no row matches and
+the flush raises StaleDataError. No row is locked between read and write, so
+an edit stays one short write transaction.
+
+Editors send the version they loaded, as If-Match: "<version>" or a "version"
+field in the body. A version that is already outdated is answered with
+409 Conflict before anything is written; a change landing between our read and
+our commit is caught by the compare-and-swap and answered the same way.
+Responses carry the current version in an ETag header and a "version" field.
+
+Edits that replace child rows (service items, inspection items) call
+claim_version() before touching them, so a losing edit fails before any of its
+child-row statements run.
+"""
+from fastapi import HTTPException, Request, status
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+import os
+
+# Refuse updates that do not say which version they were based on (428 Precondition Required)
+REQUIRE_VERSION = os.getenv("REQUIRE_VERSION", "false").lower() == "true"
+
+
+def version_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def expected_version(request: Request, body_version: Optional[int] = None) -> Optional[int]:
+    """The version an update was based on: If-Match first, else the body's version field"""
+    header = request.headers.get("if-match", "").strip()
+    if header and header != "*":
+        value = header[2:] if header.startswith("W/") else header
+        try:
+            return int(value.strip('"'))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid If-Match version: {header}")
+    if body_version is not None:
+        return int(body_version)
+    if REQUIRE_VERSION:
+        raise HTTPException(
+            status_code=status.HTTP_428_PRECONDITION_REQUIRED,
+            detail="Send the version you edited (If-Match header or version field)"
+        )
+    return None
+
+
+def conflict(label: str, current: Optional[int]) -> HTTPException:
+    """409 for an edit based on an outdated version; the current version is in the ETag header"""
+    if current is None:
+        return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"{label} was deleted by someone else")
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=f"{label} was changed by someone else (now version {current}); reload it and apply your changes again",
+        headers={"ETag": version_etag(current)}
+    )
+
+
+def check_version(entity, expected: Optional[int], label: str):
+    """Raise 409 when the client edited another version than the one just loaded"""
+    if expected is not None and expected != entity.version:
+        raise conflict(label, entity.version)
+
+
+def stale_conflict(db: Session, model, entity_id: int, label: str) -> HTTPException:
+    """409 after a failed compare-and-swap; rolls back and looks up the winning version"""
+    db.rollback()
+    return conflict(label, db.query(model.version).filter(model.id == entity_id).scalar())
+
+
+def claim_version(db: Session, entity):
+    """Run the entity's compare-and-swap now; raises StaleDataError when another edit won.
+
+    updated_at is always written, so the UPDATE (and its version check) runs
+    even when only the entity's child rows change.
+    """
+    entity.updated_at = datetime.utcnow()
+    db.flush()
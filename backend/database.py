@@ -1,6 +1,11 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, Request, status
 from models import Base, Client, ClientCode, Vehicle, ServiceRecord, ServiceItem, InspectionReport, InspectionItem, FAQ
+from shards import ShardRouter, UnknownWorkshop, WORKSHOP_SHARDS, parse_shards
+from inspectiondocs import backfill_items_json
+from contextvars import ContextVar
+from typing import Optional
 import os
 from datetime import datetime
 import secrets
@@ -9,27 +14,68 @@ import string
 # Database URL - use SQLite for development
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./evmaster_workshop.db")
 
-# Create engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={
-        "check_same_thread": False,
-        "timeout": 20,
-        "isolation_level": None
-    } if "sqlite" in DATABASE_URL else {}
-)
+# One database per workshop - the default workshop uses DATABASE_URL, see shards.py.
+# Pool size, recycling and per-connection setup are configured in engines.py
+shard_router = ShardRouter(parse_shards(WORKSHOP_SHARDS, DATABASE_URL))
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Default workshop's engine and session factory (sessions also stamp sync change sequences)
+engine = shard_router.engine()
+SessionLocal = shard_router.session_factory()
+
+# Set by the /batch endpoint so all of its sub-requests share one session and snapshot
+batch_session: ContextVar[Optional[Session]] = ContextVar("batch_session", default=None)
 
 # Create tables
 def init_db():
-    """Initialize database with tables"""
-    Base.metadata.create_all(bind=engine)
-    print("✅ Database tables created successfully")
+    """Initialize the database of every workshop with tables"""
+    for workshop in shard_router.workshops():
+        shard_engine = shard_router.engine(workshop)
+        Base.metadata.create_all(bind=shard_engine)
+        upgrade_schema(shard_engine)
+        filled = backfill_items_json(shard_engine)
+        if filled:
+            print(f"🔧 Stored the items of {filled} inspection report(s) as JSON ({workshop})")
+    print(f"✅ Database tables created successfully ({len(shard_router.workshops())} workshop database(s))")
+
+def upgrade_schema(engine=engine):
+    """Add columns and indexes introduced after an existing database was created.
+    
+    Only additive changes are handled; new columns must be nullable or have a server default.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ""
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}"))
+                print(f"🔧 Added column {table.name}.{column.name}")
+    
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
-# Dependency to get database session
-def get_db():
+# Dependency to get a session on the database of the request's workshop
+def get_db(request: Request):
+    shared = batch_session.get()
+    if shared is not None:
+        yield shared  # Closed by the batch endpoint
+        return
+    try:
+        workshop = shard_router.workshop_for(request)
+    except UnknownWorkshop as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    db = shard_router.session(workshop)
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency for the deployment-wide tables (e.g. jobs), which live in the default workshop's database
+def get_default_db():
     db = SessionLocal()
     try:
         yield db
@@ -46,6 +92,26 @@ def generate_client_code(length=8):
         if code[0] not in ['0', 'O', '1', 'I']:
             return code
 
+def generate_unique_client_codes(db, count, length=8):
+    """Generate count client codes that are unique among themselves and in the database.
+    
+    Candidates are checked against client_codes.code with one IN query per round,
+    and only the colliding codes are regenerated.
+    """
+    codes = set()
+    while len(codes) < count:
+        candidates = set()
+        while len(candidates) < count - len(codes):
+            code = generate_client_code(length)
+            if code not in codes:
+                candidates.add(code)
+        
+        existing = {
+            row[0] for row in db.query(ClientCode.code).filter(ClientCode.code.in_(candidates))
+        }
+        codes.update(candidates - existing)
+    return list(codes)
+
 def create_sample_data(db):
     """Create sample data for testing"""
     
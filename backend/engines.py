@@ -0,0 +1,217 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+from typing import Dict, Optional
+import os
+import threading
+import time
+
+# Connection pool settings (per engine)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))      # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))      # seconds, -1 to keep connections forever
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Per-connection setup
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "20"))  # seconds to wait on a locked database
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "")           # e.g. WAL for multi-worker deployments
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "")             # e.g. NORMAL together with WAL
+SQLITE_AUTO_VACUUM = os.getenv("SQLITE_AUTO_VACUUM", "INCREMENTAL")  # applies to new database files, see maintenance.py
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # PostgreSQL only, 0 = no limit
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "evmaster-api")
+
+
+class PoolStats:
+    """Running counters for one connection pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.checkouts = 0
+        self.waits = 0          # checkouts that had to wait for a connection
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def acquired(self, waited: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            if waited > 0.001:
+                self.waits += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "avg_wait_ms": round(self.wait_seconds / self.waits * 1000, 3) if self.waits else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that counts callers waiting for a connection and how long they wait"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats  # Keep counting across dispose()
+        return pool
+
+    def _do_get(self):
+        stats = self.stats
+        with stats._lock:
+            stats.waiting += 1
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeout:
+            stats.acquired(time.perf_counter() - started, timed_out=True)
+            raise
+        finally:
+            with stats._lock:
+                stats.waiting -= 1
+        stats.acquired(time.perf_counter() - started)
+        return connection
+
+
+def _setup_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        if SQLITE_AUTO_VACUUM:
+            cursor.execute(f"PRAGMA auto_vacuum={SQLITE_AUTO_VACUUM}")
+        if SQLITE_JOURNAL_MODE:
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        if SQLITE_SYNCHRONOUS:
+            cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    finally:
+        cursor.close()
+
+
+def _setup_postgresql(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        if DB_STATEMENT_TIMEOUT_MS:
+            cursor.execute(f"SET statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+    finally:
+        cursor.close()
+    dbapi_connection.commit()
+
+
+class EngineRegistry:
+    """Creates the application's engines with the shared pool settings and tracks them by name.
+
+    SQLite file databases and PostgreSQL get an InstrumentedQueuePool plus
+    per-connection setup (busy timeout and pragmas, or statement timeout and
+    application name). stats() reports live pool usage for every engine.
+    """
+
+    def __init__(self):
+        self._engines: Dict[str, Engine] = {}
+        self._lock = threading.Lock()
+
+    def create(self, name: str, url: str, **overrides) -> Engine:
+        """Create (or replace) the engine registered under name"""
+        sqlite = url.startswith("sqlite")
+        in_memory = sqlite and (url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url)
+
+        options = {}
+        if sqlite:
+            # The driver's own transaction handling stays on (no isolation_level=None):
+            # it opens a transaction before the first write, so flush() + rollback()
+            # undoes the writes and commit() applies them together
+            options["connect_args"] = {
+                "check_same_thread": False,
+                "timeout": SQLITE_BUSY_TIMEOUT
+            }
+        elif url.startswith("postgresql"):
+            options["connect_args"] = {"application_name": DB_APPLICATION_NAME}
+
+        if not in_memory:
+            options.update(
+                poolclass=InstrumentedQueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=DB_POOL_PRE_PING
+            )
+        options.update(overrides)
+
+        engine = create_engine(url, **options)
+        if sqlite:
+            event.listen(engine, "connect", _setup_sqlite)
+        elif url.startswith("postgresql"):
+            event.listen(engine, "connect", _setup_postgresql)
+        stats = self._stats_of(engine)
+        if stats is not None:
+            event.listen(engine, "connect", lambda *args: stats.count("connects"))
+            event.listen(engine, "invalidate", lambda *args: stats.count("invalidations"))
+
+        with self._lock:
+            previous = self._engines.get(name)
+            self._engines[name] = engine
+        if previous is not None:
+            previous.dispose()
+        return engine
+
+    def get(self, name: str = "default") -> Engine:
+        return self._engines[name]
+
+    def names(self):
+        return list(self._engines)
+
+    @staticmethod
+    def _stats_of(engine: Engine) -> Optional[PoolStats]:
+        return getattr(engine.pool, "stats", None)
+
+    def stats(self) -> Dict[str, dict]:
+        """Live pool usage per engine"""
+        result = {}
+        for name, engine in list(self._engines.items()):
+            pool = engine.pool
+            entry = {
+                "dialect": engine.dialect.name,
+                "pool": type(pool).__name__
+            }
+            if isinstance(pool, QueuePool):
+                entry.update({
+                    "size": pool.size(),
+                    "max_overflow": pool._max_overflow,
+                    "checked_out": pool.checkedout(),
+                    "checked_in": pool.checkedin(),
+                    "overflow": max(pool.overflow(), 0),
+                })
+            stats = self._stats_of(engine)
+            if stats is not None:
+                entry.update(stats.to_dict())
+            result[name] = entry
+        return result
+
+    def dispose_all(self):
+        for engine in list(self._engines.values()):
+            engine.dispose()
+
+
+# Registry shared by the whole application - the main database is registered as "default"
+engines = EngineRegistry()
@@ -0,0 +1,137 @@
+from collections import deque
+from datetime import datetime
+from typing import Callable, List, Optional
+import asyncio
+import json
+import os
+import threading
+
+# Change event settings
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", "500"))    # events kept for reconnect replay
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "200"))        # per-connection backlog before resync
+EVENT_HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", "15"))
+
+
+class EventBus:
+    """Publishes entity change events from the write paths to live subscribers.
+
+    Write endpoints call publish_change() after they commit. Events are numbered,
+    kept in a short history so reconnecting clients can resume from Last-Event-ID,
+    and pushed to every connected Server-Sent Events stream. Publishing is
+    thread-safe, so sync endpoints and job workers can publish directly.
+
+    In-process listeners (e.g. caches) can subscribe with add_listener(). With
+    several workers, set_relay() forwards local events to the invalidation bus,
+    which publishes the other workers' events here with remote=True.
+    """
+
+    def __init__(self, history_size: int = EVENT_HISTORY_SIZE, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._listeners: List[Callable[[dict], None]] = []
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._relay: Optional[Callable[[str, dict], None]] = None
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        """Call listener(event) synchronously for every published event"""
+        self._listeners.append(listener)
+
+    def set_relay(self, relay: Optional[Callable[[str, dict], None]]):
+        """Forward every locally published event to relay(event_type, data)"""
+        self._relay = relay
+
+    def publish(self, event_type: str, data: Optional[dict] = None, remote: bool = False) -> dict:
+        with self._lock:
+            self._seq += 1
+            event = {
+                "id": self._seq,
+                "type": event_type,
+                "data": data or {},
+                "at": datetime.utcnow().isoformat(),
+                "remote": remote
+            }
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                pass  # Subscriber's event loop already closed
+
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"⚠️ Event listener failed for {event_type}: {e}")
+
+        if self._relay is not None and not remote:
+            try:
+                self._relay(event_type, event["data"])
+            except Exception as e:
+                print(f"⚠️ Failed to relay {event_type} to other workers: {e}")
+        return event
+
+    @staticmethod
+    def _deliver(queue: asyncio.Queue, event: dict):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer - drop its backlog and tell it to refetch everything
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({"id": event["id"], "type": "resync", "data": {}, "at": event["at"]})
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _subscribe(self, last_event_id: Optional[int]):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if last_event_id is None:
+                backlog = []
+            elif self._history and last_event_id < self._history[0]["id"] - 1:
+                # Missed more than we remember
+                backlog = [{"id": self._seq, "type": "resync", "data": {}, "at": datetime.utcnow().isoformat()}]
+            else:
+                backlog = [event for event in self._history if event["id"] > last_event_id]
+        return subscriber, backlog
+
+    async def stream(self, request, last_event_id: Optional[int] = None):
+        """Async generator producing the Server-Sent Events wire format"""
+        subscriber, backlog = self._subscribe(last_event_id)
+        queue = subscriber[1]
+        try:
+            yield f"retry: 3000\nevent: hello\ndata: {json.dumps({'last_event_id': self._seq})}\n\n"
+            for event in backlog:
+                yield format_sse(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"  # Heartbeat keeps proxies from closing the stream
+                    continue
+                yield format_sse(event)
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+
+def format_sse(event: dict) -> str:
+    payload = json.dumps({"type": event["type"], "data": event["data"], "at": event["at"]}, default=str)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+
+# Shared bus for the whole application
+event_bus = EventBus()
+
+
+def publish_change(entity: str, action: str, **data) -> dict:
+    """Publish '<entity>.<action>' (e.g. service_record.updated) with identifying ids"""
+    return event_bus.publish(f"{entity}.{action}", data)
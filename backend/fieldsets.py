@@ -0,0 +1,182 @@
+from fastapi import HTTPException, Query, status
+from sqlalchemy.orm import load_only, selectinload
+from typing import Any, Callable, Dict, List, Optional, Set
+
+
+class Field:
+    """An output field, the columns it reads and any relationships it needs loaded"""
+
+    def __init__(self, *columns, get: Optional[Callable[[Any], Any]] = None, needs: tuple = ()):
+        self.columns = columns
+        self.get = get or (lambda obj, key=columns[0].key: getattr(obj, key))
+        self.needs = needs  # embeds the getter reads, e.g. ("service_items",) or ("vehicle.client",)
+
+
+class Embed:
+    """A related object (or list of objects) that can be embedded in the output.
+
+    Hidden embeds are never returned; they are loaded only for fields that need them.
+    """
+
+    def __init__(self, relationship, resource: "Resource", many: bool = False, hidden: bool = False):
+        self.relationship = relationship
+        self.resource = resource
+        self.many = many
+        self.hidden = hidden
+
+
+class Resource:
+    """Declares the fields of a read endpoint's response and how they are loaded.
+
+    Used with sparse_fields(): only the columns behind the requested fields are
+    selected (load_only), only requested embeds are loaded (selectinload), and
+    only requested keys are serialized.
+    """
+
+    def __init__(self, model, fields: Dict[str, Any]):
+        self.model = model
+        self.fields = fields
+
+    def paths(self, prefix: str = "") -> Set[str]:
+        result = set()
+        for key, spec in self.fields.items():
+            if isinstance(spec, Embed) and spec.hidden:
+                continue
+            result.add(prefix + key)
+            if isinstance(spec, Embed):
+                result |= spec.resource.paths(f"{prefix}{key}.")
+        return result
+
+    def embed_paths(self, prefix: str = "") -> Set[str]:
+        result = set()
+        for key, spec in self.fields.items():
+            if isinstance(spec, Embed) and not spec.hidden:
+                result.add(prefix + key)
+                result |= spec.resource.embed_paths(f"{prefix}{key}.")
+        return result
+
+    def _required(self, selection: "FieldSelection", prefix: str = "") -> Set[str]:
+        """Embed paths that selected fields read without returning them"""
+        required = set()
+        for key, spec in self.fields.items():
+            path = prefix + key
+            if isinstance(spec, Embed):
+                if selection.embeds(path):
+                    required |= spec.resource._required(selection, f"{path}.")
+            elif selection.wants(path):
+                for need in spec.needs:
+                    parts = (prefix + need).split(".")
+                    required |= {".".join(parts[:depth]) for depth in range(1, len(parts) + 1)}
+        return required
+
+    def loader_options(self, selection: "FieldSelection", prefix: str = "", parent=None,
+                       required: Optional[Set[str]] = None) -> list:
+        """load_only/selectinload options for the selected fields and embeds"""
+        if required is None:
+            required = self._required(selection)
+
+        columns, embeds = [], []
+        for key, spec in self.fields.items():
+            path = prefix + key
+            if isinstance(spec, Embed):
+                if selection.embeds(path) or path in required:
+                    embeds.append((path, spec))
+                    # Many-to-one embeds need the foreign key on this side
+                    columns.extend(c for c in spec.relationship.property.local_columns if c.table is self.model.__table__)
+            elif selection.wants(path) or prefix[:-1] in required:
+                columns.extend(spec.columns)
+
+        attributes = [getattr(self.model, c.key) for c in columns]
+        if parent is None:
+            options = [load_only(*attributes)] if attributes else []
+        else:
+            options = [parent.load_only(*attributes)] if attributes else [parent]
+
+        for path, spec in embeds:
+            loader = parent.selectinload(spec.relationship) if parent is not None else selectinload(spec.relationship)
+            options.extend(spec.resource.loader_options(selection, f"{path}.", loader, required))
+        return options
+
+    def serialize(self, obj, selection: "FieldSelection", prefix: str = "") -> dict:
+        result = {}
+        for key, spec in self.fields.items():
+            path = prefix + key
+            if isinstance(spec, Embed):
+                if spec.hidden or not selection.embeds(path):
+                    continue
+                value = getattr(obj, spec.relationship.key)
+                if spec.many:
+                    result[key] = [spec.resource.serialize(item, selection, f"{path}.") for item in value]
+                else:
+                    result[key] = spec.resource.serialize(value, selection, f"{path}.") if value is not None else None
+            elif selection.wants(path):
+                result[key] = spec.get(obj)
+        return result
+
+
+class FieldSelection:
+    """Parsed ?fields= and ?include= for one request"""
+
+    def __init__(self, fields: Optional[Set[str]], include: Set[str], default: bool = False):
+        self.fields = fields  # None means every field
+        self.include = include
+        self.default = default  # neither parameter given - endpoints may use a faster fixed-shape path
+
+    def embeds(self, path: str) -> bool:
+        return path in self.include
+
+    def wants(self, path: str) -> bool:
+        if self.fields is None:
+            return True
+        if path in self.fields:
+            return True
+        # Fields of an embed are all returned unless some of them were picked explicitly
+        parent = path.rpartition(".")[0]
+        return bool(parent) and self.embeds(parent) and not any(f.startswith(parent + ".") for f in self.fields)
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+def sparse_fields(resource: Resource, default_include: Optional[List[str]] = None):
+    """Dependency parsing ?fields=a,b,embed.c and ?include=embed,embed.nested.
+
+    Without include the default embeds are returned (every embed unless
+    default_include says otherwise); picking an embed's field implies the embed.
+    Unknown names are rejected with 400.
+    """
+    known_paths = resource.paths()
+    embed_paths = resource.embed_paths()
+    defaults = set(embed_paths if default_include is None else default_include)
+
+    def dependency(
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,vehicle.make"),
+        include: Optional[str] = Query(None, description="Comma-separated embeds to load; empty for none")
+    ) -> FieldSelection:
+        picked = _split(fields)
+        embedded = _split(include)
+        unknown = [f for f in picked if f not in known_paths] + [e for e in embedded if e not in embed_paths]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}"
+            )
+
+        include_set = set(embedded) if include is not None else set(defaults)
+        for path in picked + list(include_set):
+            # Embedding a nested object implies its parents; a picked field implies its embed
+            parts = path.split(".")
+            for depth in range(1, len(parts) + 1):
+                candidate = ".".join(parts[:depth])
+                if candidate in embed_paths and (depth < len(parts) or path in embed_paths):
+                    include_set.add(candidate)
+        if fields is not None:
+            # An explicit field list limits the embeds to those it names
+            include_set = {e for e in include_set if include is not None or any(
+                f == e or f.startswith(e + ".") for f in picked
+            )}
+        return FieldSelection(set(picked) if fields is not None else None, include_set,
+                              default=fields is None and include is None and default_include is None)
+
+    return dependency
@@ -0,0 +1,162 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from collections import defaultdict
+from typing import Dict, List
+
+from models import Client, Vehicle, ServiceRecord, ServiceItem, InspectionReport
+from inspectiondocs import items_by_report
+
+# Visits returned per car on the home screen; the rest is paged through /client/cars/{id}/visits
+HOME_VISITS_PER_CAR = 10
+MAX_HOME_VISITS_PER_CAR = 50
+
+
+def _ranked(model, date_column, vehicle_ids: List[int], limit: int):
+    """Ids of the newest `limit` rows per vehicle, ranked with a window function"""
+    rank = func.row_number().over(
+        partition_by=model.vehicle_id,
+        order_by=(date_column.desc(), model.id.desc())
+    ).label("rank")
+    ranked = select(model.id, rank).where(model.vehicle_id.in_(vehicle_ids)).subquery()
+    return select(ranked.c.id).where(ranked.c.rank <= limit)
+
+
+def service_visit(record: ServiceRecord, item_names: List[str]) -> dict:
+    service_title = ", ".join(item_names) if item_names else "General Service"
+    return {
+        "visit_id": str(record.id),
+        "visit_type": "service",
+        "date": record.service_date.isoformat(),
+        "title": service_title,
+        "description": f"{len(item_names)} service(s) performed",
+        "status": record.status,
+        "cost": float(record.total_cost) if record.total_cost else None,
+        "technician_notes": record.technician_notes
+    }
+
+
+def inspection_visit(inspection: InspectionReport) -> dict:
+    return {
+        "visit_id": str(inspection.id),
+        "visit_type": "inspection",
+        "date": inspection.inspection_date.isoformat(),
+        "title": "Vehicle Inspection",
+        "description": f"Overall condition: {inspection.overall_condition}",
+        "status": "completed",
+        "cost": None,
+        "technician_notes": inspection.technician_notes
+    }
+
+
+def build_home_payload(db: Session, client: Client, visits_per_car: int = HOME_VISITS_PER_CAR) -> dict:
+    """Everything the app's home and car screens show, in one response.
+
+    Assembled with seven queries however many cars the client has: vehicles,
+    grouped service and inspection stats, the newest service records and
+    inspections per car (window functions), their item names, and the items of
+    each car's latest inspection.
+    """
+    vehicles = db.query(Vehicle).filter(Vehicle.client_id == client.id).order_by(Vehicle.id).all()
+    vehicle_ids = [vehicle.id for vehicle in vehicles]
+
+    service_stats: Dict[int, tuple] = {}
+    inspection_stats: Dict[int, tuple] = {}
+    services_by_car = defaultdict(list)
+    inspections_by_car = defaultdict(list)
+    item_names = defaultdict(list)
+    latest_items = defaultdict(list)
+
+    if vehicle_ids:
+        service_stats = {
+            vehicle_id: (count, last_date)
+            for vehicle_id, count, last_date in db.query(
+                ServiceRecord.vehicle_id, func.count(ServiceRecord.id), func.max(ServiceRecord.service_date)
+            ).filter(ServiceRecord.vehicle_id.in_(vehicle_ids)).group_by(ServiceRecord.vehicle_id)
+        }
+        inspection_stats = {
+            vehicle_id: (count, last_date)
+            for vehicle_id, count, last_date in db.query(
+                InspectionReport.vehicle_id, func.count(InspectionReport.id), func.max(InspectionReport.inspection_date)
+            ).filter(InspectionReport.vehicle_id.in_(vehicle_ids)).group_by(InspectionReport.vehicle_id)
+        }
+
+        # Newest services and inspections per car - enough for the first page of merged visits
+        services = db.query(ServiceRecord).filter(
+            ServiceRecord.id.in_(_ranked(ServiceRecord, ServiceRecord.service_date, vehicle_ids, visits_per_car))
+        ).all()
+        for record in services:
+            services_by_car[record.vehicle_id].append(record)
+
+        inspections = db.query(InspectionReport).filter(
+            InspectionReport.id.in_(_ranked(InspectionReport, InspectionReport.inspection_date, vehicle_ids, visits_per_car))
+        ).order_by(InspectionReport.inspection_date.desc(), InspectionReport.id.desc()).all()
+        for inspection in inspections:
+            inspections_by_car[inspection.vehicle_id].append(inspection)
+
+        if services:
+            for service_record_id, service_name in db.query(ServiceItem.service_record_id, ServiceItem.service_name).filter(
+                ServiceItem.service_record_id.in_([record.id for record in services])
+            ).order_by(ServiceItem.id):
+                item_names[service_record_id].append(service_name)
+
+        latest_ids = [car_inspections[0].id for car_inspections in inspections_by_car.values()]
+        latest_items.update(items_by_report(db, latest_ids))
+
+    cars = []
+    for vehicle in vehicles:
+        service_count, last_service_date = service_stats.get(vehicle.id, (0, None))
+        inspection_count, last_inspection_date = inspection_stats.get(vehicle.id, (0, None))
+
+        visits = [service_visit(record, item_names[record.id]) for record in services_by_car[vehicle.id]]
+        visits += [inspection_visit(inspection) for inspection in inspections_by_car[vehicle.id]]
+        visits.sort(key=lambda x: x['date'], reverse=True)
+
+        latest_inspection = None
+        if inspections_by_car[vehicle.id]:
+            inspection = inspections_by_car[vehicle.id][0]
+            latest_inspection = {
+                "inspection_id": str(inspection.id),
+                "car_id": str(inspection.vehicle_id),
+                "inspection_date": inspection.inspection_date.isoformat(),
+                "overall_condition": inspection.overall_condition,
+                "technician_notes": inspection.technician_notes,
+                "recommendations": inspection.recommendations,
+                "items": [
+                    {
+                        "item_name": item.item_name,
+                        "status": item.status,
+                        "notes": item.notes
+                    }
+                    for item in latest_items[inspection.id]
+                ]
+            }
+
+        cars.append({
+            "car_id": str(vehicle.id),
+            "make": vehicle.make,
+            "model": vehicle.model,
+            "year": vehicle.year,
+            "license_plate": vehicle.license_plate,
+            "vin": vehicle.vin,
+            "color": vehicle.color,
+            "stats": {
+                "total_services": service_count,
+                "total_inspections": inspection_count,
+                "last_service_date": last_service_date.isoformat() if last_service_date else None,
+                "last_inspection_date": last_inspection_date.isoformat() if last_inspection_date else None
+            },
+            "latest_inspection": latest_inspection,
+            "visits": visits[:visits_per_car],
+            "has_more_visits": service_count + inspection_count > visits_per_car
+        })
+
+    return {
+        "profile": {
+            "client_id": str(client.id),
+            "name": client.name,
+            "phone": client.phone,
+            "email": client.email,
+            "address": client.address
+        },
+        "cars": cars
+    }
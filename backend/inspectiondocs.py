@@ -0,0 +1,140 @@
+"""Denormalized inspection items.
+
+Every InspectionReport keeps a compact JSON copy of its InspectionItem rows
+in items_json, so reading a report with its items is a single-row fetch. The
+item rows stay the source of truth (and what item-level analytics query);
+the copy is rewritten after every flush that adds, changes or removes items
+of a report, inside the same transaction, so both always commit together.
+
+Bulk statements on inspection_items (Query.delete/update) bypass the session,
+so they must be accompanied by a change to the report, or followed by
+refresh_items_json(), to rewrite its copy.
+"""
+from sqlalchemy import bindparam, event, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from collections import defaultdict, namedtuple
+from typing import Dict, Iterable, List
+import json
+import os
+
+from models import InspectionReport, InspectionItem
+
+# Read inspection items from the JSON copy (false falls back to querying the item rows)
+INSPECTION_ITEMS_JSON = os.getenv("INSPECTION_ITEMS_JSON", "true").lower() == "true"
+ITEMS_JSON_BACKFILL_BATCH = int(os.getenv("ITEMS_JSON_BACKFILL_BATCH", "500"))  # reports per backfill statement
+
+# The same attributes readers use on InspectionItem rows
+ItemDoc = namedtuple("ItemDoc", ["id", "inspection_id", "item_name", "status", "notes"])
+
+
+def encode_items(items: Iterable) -> str:
+    """Compact JSON array of [id, item_name, status, notes] per item, in id order"""
+    return json.dumps(
+        [[item.id, item.item_name, item.status, item.notes] for item in sorted(items, key=lambda item: item.id)],
+        ensure_ascii=False, separators=(",", ":")
+    )
+
+
+def decode_items(inspection_id: int, items_json: str) -> List[ItemDoc]:
+    return [ItemDoc(item_id, inspection_id, name, status, notes) for item_id, name, status, notes in json.loads(items_json)]
+
+
+def report_items(db: Session, inspection) -> list:
+    """A report's items, from its JSON copy when present, else from the item rows"""
+    items_json = getattr(inspection, "items_json", None)
+    if INSPECTION_ITEMS_JSON and items_json is not None:
+        return decode_items(inspection.id, items_json)
+    return db.query(InspectionItem).filter(
+        InspectionItem.inspection_id == inspection.id
+    ).order_by(InspectionItem.id).all()
+
+
+def items_by_report(db: Session, inspection_ids: Iterable[int]) -> Dict[int, list]:
+    """Items of several reports by report id, one query on the reports when all have a JSON copy"""
+    inspection_ids = list(inspection_ids)
+    items = defaultdict(list)
+    if not inspection_ids:
+        return items
+    missing = inspection_ids
+    if INSPECTION_ITEMS_JSON:
+        missing = []
+        for inspection_id, items_json in db.query(InspectionReport.id, InspectionReport.items_json).filter(
+            InspectionReport.id.in_(inspection_ids)
+        ):
+            if items_json is None:
+                missing.append(inspection_id)
+            else:
+                items[inspection_id] = decode_items(inspection_id, items_json)
+    if missing:
+        for item in db.query(InspectionItem).filter(
+            InspectionItem.inspection_id.in_(missing)
+        ).order_by(InspectionItem.id):
+            items[item.inspection_id].append(item)
+    return items
+
+
+def refresh_items_json(connection, inspection_ids: Iterable[int]) -> Dict[int, str]:
+    """Rewrite the JSON copy of the given reports from their item rows; returns the new values"""
+    inspection_ids = sorted(set(inspection_ids))
+    if not inspection_ids:
+        return {}
+    items = defaultdict(list)
+    for row in connection.execute(
+        select(InspectionItem.id, InspectionItem.inspection_id, InspectionItem.item_name,
+               InspectionItem.status, InspectionItem.notes)
+        .where(InspectionItem.inspection_id.in_(inspection_ids))
+    ):
+        items[row.inspection_id].append(row)
+    values = {inspection_id: encode_items(items[inspection_id]) for inspection_id in inspection_ids}
+
+    table = InspectionReport.__table__
+    connection.execute(
+        update(table).where(table.c.id == bindparam("report_id")).values(items_json=bindparam("items_json")),
+        [{"report_id": inspection_id, "items_json": value} for inspection_id, value in values.items()]
+    )
+    return values
+
+
+def _changed_reports(session: Session) -> set:
+    """Ids of the reports whose items (or the report itself) are part of this flush"""
+    inspection_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, InspectionItem):
+            inspection_ids.add(obj.inspection_id or (obj.report.id if obj.report is not None else None))
+        elif isinstance(obj, InspectionReport) and obj not in session.deleted:
+            inspection_ids.add(obj.id)
+    inspection_ids.discard(None)
+    return inspection_ids
+
+
+def _refresh_after_flush(session: Session, flush_context):
+    inspection_ids = _changed_reports(session)
+    if not inspection_ids:
+        return
+    values = refresh_items_json(session.connection(), inspection_ids)
+    # Keep loaded reports in step without marking them dirty again
+    for inspection_id, value in values.items():
+        report = session.identity_map.get(session.identity_key(InspectionReport, inspection_id))
+        if report is not None:
+            set_committed_value(report, "items_json", value)
+
+
+def track_inspection_items(session_factory):
+    """Rewrite the items_json copy of every report whose items change in a flush"""
+    event.listen(session_factory, "after_flush", _refresh_after_flush)
+
+
+def backfill_items_json(engine, batch_size: int = ITEMS_JSON_BACKFILL_BATCH) -> int:
+    """Fill the JSON copy of reports created before it existed; returns how many were filled"""
+    filled = 0
+    while True:
+        with engine.begin() as connection:
+            inspection_ids = connection.execute(
+                select(InspectionReport.id).where(InspectionReport.items_json.is_(None))
+                .order_by(InspectionReport.id).limit(batch_size)
+            ).scalars().all()
+            if not inspection_ids:
+                return filled
+            refresh_items_json(connection, inspection_ids)
+        filled += len(inspection_ids)
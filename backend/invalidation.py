@@ -0,0 +1,196 @@
+from sqlalchemy import delete, func, insert, select
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+import json
+import os
+import queue
+import socket
+import threading
+import uuid
+
+from database import engine
+from models import InvalidationEvent
+
+# Optional Redis client - only needed when INVALIDATION_BUS is a redis:// URL
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Invalidation bus settings - multi-worker deployments default to the database table
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+INVALIDATION_BUS = os.getenv("INVALIDATION_BUS") or ("database" if WEB_WORKERS > 1 else "none")
+INVALIDATION_POLL_INTERVAL = float(os.getenv("INVALIDATION_POLL_INTERVAL", "0.2"))   # seconds
+INVALIDATION_RETENTION_SECONDS = int(os.getenv("INVALIDATION_RETENTION_SECONDS", "300"))
+INVALIDATION_REDIS_CHANNEL = os.getenv("INVALIDATION_REDIS_CHANNEL", "evmaster:changes")
+
+Deliver = Callable[[str, dict], None]
+
+
+class InvalidationBus:
+    """Relays entity change events between worker processes.
+
+    Each worker publishes the events of its own write paths and delivers the
+    events of the other workers to its local EventBus, so in-process caches
+    (listening with event_bus.add_listener) and SSE streams stay coherent no
+    matter which worker handled the write. The base class is the single-process
+    bus and relays nothing.
+    """
+
+    def __init__(self):
+        self.origin = None
+        self._deliver: Optional[Deliver] = None
+
+    def start(self, deliver: Deliver):
+        # Set here, not in __init__, so every worker process gets its own origin
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._deliver = deliver
+
+    def stop(self):
+        self._deliver = None
+
+    def publish(self, event_type: str, data: dict):
+        pass
+
+    def _receive(self, origin: str, event_type: str, data: dict):
+        if origin != self.origin and self._deliver is not None:
+            try:
+                self._deliver(event_type, data)
+            except Exception as e:
+                print(f"⚠️ Failed to deliver {event_type} from {origin}: {e}")
+
+
+class DatabaseInvalidationBus(InvalidationBus):
+    """Bus backed by the invalidation_events table - works for workers sharing one database.
+
+    A background thread writes queued events and polls for newer rows by id,
+    pruning rows older than the retention period.
+    """
+
+    def __init__(self, poll_interval: float = INVALIDATION_POLL_INTERVAL,
+                 retention_seconds: int = INVALIDATION_RETENTION_SECONDS):
+        super().__init__()
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._outbox = queue.Queue()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_id = 0
+
+    def start(self, deliver: Deliver):
+        super().start(deliver)
+        table = InvalidationEvent.__table__
+        with engine.connect() as connection:
+            self._last_id = connection.execute(select(func.max(table.c.id))).scalar() or 0
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, name="invalidation-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        super().stop()
+
+    def publish(self, event_type: str, data: dict):
+        self._outbox.put({"origin": self.origin, "event_type": event_type,
+                          "data": json.dumps(data, default=str), "created_at": datetime.utcnow()})
+        self._wake.set()
+
+    def _loop(self):
+        last_prune = datetime.utcnow()
+        while True:
+            try:
+                self._flush()
+                self._poll()
+                if datetime.utcnow() - last_prune > timedelta(seconds=self.retention_seconds):
+                    self._prune()
+                    last_prune = datetime.utcnow()
+            except Exception as e:
+                print(f"⚠️ Invalidation bus error: {e}")
+            if self._stopped.is_set():
+                return
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _flush(self):
+        rows = []
+        while True:
+            try:
+                rows.append(self._outbox.get_nowait())
+            except queue.Empty:
+                break
+        if rows:
+            with engine.begin() as connection:
+                connection.execute(insert(InvalidationEvent.__table__), rows)
+
+    def _poll(self):
+        table = InvalidationEvent.__table__
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(table.c.id, table.c.origin, table.c.event_type, table.c.data)
+                .where(table.c.id > self._last_id).order_by(table.c.id)
+            ).all()
+        for row in rows:
+            self._last_id = row.id
+            self._receive(row.origin, row.event_type, json.loads(row.data or "{}"))
+
+    def _prune(self):
+        table = InvalidationEvent.__table__
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention_seconds)
+        with engine.begin() as connection:
+            connection.execute(delete(table).where(table.c.created_at < cutoff))
+
+
+class RedisInvalidationBus(InvalidationBus):
+    """Bus backed by Redis pub/sub - for workers on several hosts"""
+
+    def __init__(self, url: str, channel: str = INVALIDATION_REDIS_CHANNEL):
+        super().__init__()
+        if redis is None:
+            raise RuntimeError("INVALIDATION_BUS is a Redis URL but the redis package is not installed")
+        self.channel = channel
+        self._client = redis.Redis.from_url(url)
+        self._pubsub = None
+        self._thread = None
+
+    def start(self, deliver: Deliver):
+        super().start(deliver)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.channel: self._on_message})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+        super().stop()
+
+    def publish(self, event_type: str, data: dict):
+        message = json.dumps({"origin": self.origin, "event_type": event_type, "data": data}, default=str)
+        self._client.publish(self.channel, message)
+
+    def _on_message(self, message):
+        payload = json.loads(message["data"])
+        self._receive(payload["origin"], payload["event_type"], payload["data"])
+
+
+def create_invalidation_bus(setting: str = INVALIDATION_BUS) -> InvalidationBus:
+    """Bus for an INVALIDATION_BUS setting: none, database or a redis:// URL"""
+    if setting.startswith(("redis://", "rediss://", "unix://")):
+        return RedisInvalidationBus(setting)
+    if setting == "database":
+        return DatabaseInvalidationBus()
+    if setting in ("", "none"):
+        return InvalidationBus()
+    raise ValueError(f"Unknown INVALIDATION_BUS setting: {setting}")
+
+
+# Shared bus for this worker process
+invalidation_bus = create_invalidation_bus()
@@ -0,0 +1,254 @@
+from sqlalchemy import func
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Dict, Iterator, Optional
+import json
+import os
+import threading
+
+from database import SessionLocal, shard_router
+from models import Job
+
+# Job executor settings - defaults follow the number of available cores
+CPU_COUNT = os.cpu_count() or 1
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(min(32, CPU_COUNT + 4))))  # threads for DB-bound jobs
+JOB_PROCESS_WORKERS = int(os.getenv("JOB_PROCESS_WORKERS", str(CPU_COUNT)))  # processes for CPU-bound steps
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "2"))  # seconds, doubled after each failed attempt
+
+# Id of the job whose handler is running in this thread (None outside handlers)
+current_job_id: ContextVar[Optional[int]] = ContextVar("current_job_id", default=None)
+
+
+class JobExecutor:
+    """In-process background job subsystem backed by the jobs table.
+
+    Handlers are registered per job type and run on a thread pool with their own
+    database session, bound to the workshop the job was enqueued for (the jobs
+    table itself lives in the default workshop's database). Every job is
+    persisted before it is scheduled, so jobs that were queued or running when
+    the server stopped are picked up again on start.
+    Failed jobs are retried with exponential backoff up to max_attempts, except
+    for client errors (HTTPException with a 4xx status) which fail immediately.
+
+    CPU-heavy work inside a handler can be sent to the shared process pool with
+    run_in_process() or, for many independent pieces, map_in_process(). Long
+    handlers can publish how far they got with report_progress().
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, process_workers: int = JOB_PROCESS_WORKERS):
+        self.workers = workers
+        self.process_workers = process_workers
+        self.handlers: Dict[str, Callable] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._timers = set()
+
+    def register(self, job_type: str):
+        """Decorator registering handler(db, payload) -> result for a job type"""
+        def decorator(func):
+            self.handlers[job_type] = func
+            return func
+        return decorator
+
+    def start(self, requeue_interrupted: bool = True):
+        """Start the worker pool and resume unfinished jobs.
+
+        With several web workers, jobs still running belong to a sibling worker,
+        so only the process that prepares the deployment requeues them.
+        """
+        with self._lock:
+            if self._pool is not None:
+                return
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job-worker")
+
+        if requeue_interrupted:
+            self.requeue_interrupted()
+        db = SessionLocal()
+        try:
+            unfinished = db.query(Job.id).filter(Job.status == "queued").all()
+        finally:
+            db.close()
+        for (job_id,) in unfinished:
+            self._submit(job_id)
+        if unfinished:
+            print(f"🔁 Resumed {len(unfinished)} background job(s)")
+
+    def requeue_interrupted(self):
+        """Queue jobs that were running when the server stopped"""
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.status == "running").update({"status": "queued"}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def stop(self, wait: bool = True):
+        """Stop accepting work and wait for running jobs"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            process_pool, self._process_pool = self._process_pool, None
+            timers, self._timers = self._timers, set()
+        for timer in timers:
+            timer.cancel()
+        if pool is not None:
+            pool.shutdown(wait=wait)
+        if process_pool is not None:
+            process_pool.shutdown(wait=wait)
+
+    def enqueue(self, job_type: str, payload: Optional[dict] = None, max_attempts: int = JOB_MAX_ATTEMPTS,
+                workshop: Optional[str] = None) -> Job:
+        """Persist a job and schedule it, returning immediately"""
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        workshop = shard_router.resolve(workshop)
+
+        db = SessionLocal()
+        try:
+            job = Job(
+                job_type=job_type,
+                payload=json.dumps(payload or {}, default=str),
+                status="queued",
+                attempts=0,
+                max_attempts=max_attempts,
+                workshop=None if workshop == shard_router.default else workshop,
+                created_at=datetime.utcnow()
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+        finally:
+            db.close()
+
+        self._submit(job.id)
+        return job
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+            return self._process_pool
+
+    def run_in_process(self, func, *args):
+        """Run a picklable, CPU-bound function on the shared process pool and wait for it"""
+        return self._get_process_pool().submit(func, *args).result()
+
+    def map_in_process(self, func, *iterables) -> Iterator:
+        """Run func over the argument lists on the shared process pool, yielding results as they complete"""
+        process_pool = self._get_process_pool()
+        futures = [process_pool.submit(func, *args) for args in zip(*iterables)]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()  # Stop queued pieces when the caller fails or gives up
+
+    def report_progress(self, done: int, total: int, message: Optional[str] = None):
+        """Record the progress of the job running in this thread (no-op outside job handlers)"""
+        job_id = current_job_id.get()
+        if job_id is None:
+            return
+        progress = json.dumps({"done": done, "total": total, "message": message})
+        db = SessionLocal()
+        try:
+            # Own session and commit, so progress is visible while the handler's transaction is open
+            db.query(Job).filter(Job.id == job_id).update({"progress": progress}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _submit(self, job_id: int):
+        if self._pool is None:
+            self.start()
+        self._pool.submit(self._run, job_id)
+
+    def _retry_later(self, job_id: int, delay: float):
+        def fire():
+            self._timers.discard(timer)
+            if self._pool is not None:
+                self._submit(job_id)
+
+        timer = threading.Timer(delay, fire)
+        timer.daemon = True
+        self._timers.add(timer)
+        timer.start()
+
+    def _run(self, job_id: int):
+        db = SessionLocal()
+        work_db = db
+        token = None
+        try:
+            # Claim atomically - several workers may try to resume the same job
+            claimed = db.query(Job).filter(Job.id == job_id, Job.status == "queued").update({
+                "status": "running",
+                "attempts": func.coalesce(Job.attempts, 0) + 1,
+                "started_at": datetime.utcnow()
+            }, synchronize_session=False)
+            db.commit()
+            if not claimed:
+                return  # Already picked up or finished
+            job = db.query(Job).filter(Job.id == job_id).first()
+
+            handler = self.handlers.get(job.job_type)
+            payload = json.loads(job.payload or "{}")
+            token = current_job_id.set(job_id)
+            try:
+                if handler is None:
+                    raise ValueError(f"No handler registered for job type: {job.job_type}")
+                if job.workshop and job.workshop != shard_router.default:
+                    work_db = shard_router.session(job.workshop)
+                result = handler(work_db, payload)
+            except Exception as e:
+                work_db.rollback()
+                db.rollback()
+                job = db.query(Job).filter(Job.id == job_id).first()
+                job.error = str(getattr(e, "detail", None) or e or e.__class__.__name__)
+                # Client errors (e.g. HTTPException 404) will fail the same way again, so don't retry them
+                retryable = getattr(e, "status_code", 500) >= 500
+                if retryable and job.attempts < job.max_attempts:
+                    job.status = "queued"
+                    db.commit()
+                    self._retry_later(job_id, JOB_RETRY_DELAY * (2 ** (job.attempts - 1)))
+                else:
+                    job.status = "failed"
+                    job.finished_at = datetime.utcnow()
+                    db.commit()
+                    print(f"❌ Job {job_id} ({job.job_type}) failed: {job.error}")
+                return
+
+            job.status = "succeeded"
+            job.result = json.dumps(result, default=str) if result is not None else None
+            job.error = None
+            job.finished_at = datetime.utcnow()
+            db.commit()
+        finally:
+            if token is not None:
+                current_job_id.reset(token)
+            if work_db is not db:
+                work_db.close()
+            db.close()
+
+
+def job_to_dict(job: Job):
+    return {
+        "id": job.id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "progress": json.loads(job.progress) if job.progress else None,
+        "workshop": job.workshop or shard_router.default,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+# Shared executor for the whole application
+job_executor = JobExecutor()
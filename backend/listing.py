@@ -0,0 +1,52 @@
+from fastapi import HTTPException, Query, status
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional
+
+
+def split_values(value: Optional[str]) -> List[str]:
+    """Comma-separated query parameter values, e.g. ?status=pending,in_progress"""
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+def date_range(column, date_from: Optional[date], date_to: Optional[date]) -> list:
+    """Conditions keeping column within [date_from, date_to], both days inclusive.
+
+    Compared as half-open datetime bounds so an index on the column can be used.
+    """
+    conditions = []
+    if date_from is not None:
+        conditions.append(column >= datetime.combine(date_from, time.min))
+    if date_to is not None:
+        conditions.append(column < datetime.combine(date_to + timedelta(days=1), time.min))
+    return conditions
+
+
+def sort_order(keys: Dict[str, Any], default: str, tiebreaker=None):
+    """Dependency parsing ?sort=key,-key into ORDER BY clauses.
+
+    Only the whitelisted keys are accepted (unknown keys are rejected with 400);
+    a leading "-" sorts descending. The tiebreaker column is appended so paging
+    with skip/limit is stable.
+    """
+
+    def dependency(
+        sort: str = Query(default, description=f"Comma-separated sort keys, '-' for descending: {', '.join(keys)}")
+    ) -> list:
+        requested = split_values(sort) or split_values(default)
+        unknown = [key for key in requested if key.lstrip("-") not in keys]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown sort keys: {', '.join(unknown)}"
+            )
+
+        clauses = [
+            keys[key[1:]].desc() if key.startswith("-") else keys[key].asc()
+            for key in requested
+        ]
+        if tiebreaker is not None:
+            last_descending = requested[-1].startswith("-")
+            clauses.append(tiebreaker.desc() if last_descending else tiebreaker.asc())
+        return clauses
+
+    return dependency
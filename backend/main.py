@@ -1,18 +1,41 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 from pydantic import BaseModel
 from typing import Optional, List
-from sqlalchemy.orm import Session
-from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, undefer
+from sqlalchemy.orm.exc import StaleDataError
+from datetime import date, datetime
 import uvicorn
 import os
 
-from database import init_db, get_db, create_sample_data, SessionLocal
-from models import ClientCode, Client, Vehicle, ServiceRecord as DBServiceRecord, ServiceItem, InspectionReport, InspectionItem, FAQ
+from database import init_db, get_db, create_sample_data, SessionLocal, shard_router
+from shards import UnknownWorkshop, issue_token, parse_token, workshop_of
+from models import ClientCode, Client, Vehicle, ServiceRecord as DBServiceRecord, ServiceItem, InspectionReport, InspectionItem, InspectionAttachment, FAQ, Booking
 from admin_routes import admin_router
+from batch import batch_router
+from compression import CompressionMiddleware, static_payloads
+from coalescing import CoalescingMiddleware
+from profiling import ProfilingMiddleware
+from usage_tracker import usage_tracker
+from jobs import job_executor
+from events import event_bus, publish_change
+from invalidation import invalidation_bus, WEB_WORKERS
+from maintenance import maintenance_scheduler
+from sync import build_sync_payload
+from listing import split_values, date_range, sort_order
+from fieldsets import Resource, Field, Embed, FieldSelection, sparse_fields
+from home import build_home_payload, service_visit, inspection_visit, HOME_VISITS_PER_CAR, MAX_HOME_VISITS_PER_CAR
+import readmodels
+from responsecache import client_cache, client_tag, vehicle_tag, record_tag, Tagged
+from inspectiondocs import report_items
+from concurrency import check_version, claim_version, expected_version, stale_conflict, version_etag
+from attachments import attachment_store, attachments_by_item, attachment_to_dict, attachment_response, delete_item_attachments, IMAGE_TYPES
+from pdfreports import inspection_document, pdf_language, pdf_cache
+from bookings import booking_engine_for, parse_slot_time, format_slot_time, SlotUnavailable
 
 app = FastAPI(
     title="EvMaster Workshop API",
@@ -29,8 +52,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include admin routes
+# Negotiated gzip/brotli/zstd compression for larger responses
+app.add_middleware(CompressionMiddleware)
+
+# Opt-in profiling of single requests (X-Profile header or PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware)
+
+# Concurrent identical reads of the expensive admin listings share one execution
+app.add_middleware(CoalescingMiddleware)
+
+# Include admin and batch routes
 app.include_router(admin_router)
+app.include_router(batch_router)
+
+# Any other write that lost a compare-and-swap against a concurrent edit (see concurrency.py)
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request: Request, exc: StaleDataError):
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": "The record was changed by someone else; reload it and try again"}
+    )
 
 # Serve static files for admin panel
 try:
@@ -43,27 +84,28 @@ security = HTTPBearer()
 # Helper function to extract client ID from token
 def get_client_id_from_token(token: str) -> Optional[int]:
     """Extract client ID from the access token."""
-    try:
-        # Token format: "token_{client_code}_{client_id}"
-        parts = token.split('_')
-        if len(parts) >= 3 and parts[0] == 'token':
-            return int(parts[-1])  # Last part is the client ID
-        return None
-    except (ValueError, IndexError):
-        return None
+    # Token format: "token_{workshop}_{client_code}_{client_id}" (or "token_{client_code}_{client_id}")
+    _, client_id = parse_token(token)
+    return client_id
 
 # Helper function to get current client from token
 async def get_current_client(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> Client:
     """Get the current authenticated client from the token."""
     token = credentials.credentials
-    client_id = get_client_id_from_token(token)
+    workshop, client_id = parse_token(token)
     
-    if not client_id:
+    # The session is routed by the token's workshop claim, see get_db
+    if not client_id or workshop != workshop_of(db):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token format"
         )
     
+    # Sub-requests of a /batch call share a session, so authenticate once per session
+    authenticated = db.info.setdefault("authenticated_clients", {})
+    if token in authenticated:
+        return authenticated[token]
+    
     client = db.query(Client).filter(Client.id == client_id).first()
     if not client or not client.is_active:
         raise HTTPException(
@@ -71,11 +113,15 @@ async def get_current_client(credentials: HTTPAuthorizationCredentials = Depends
             detail="Client not found or inactive"
         )
     
+    authenticated[token] = client
     return client
 
-# Initialize database on startup
-@app.on_event("startup")
-def startup_event():
+# Set for the worker processes of a multi-worker deployment once the parent has prepared the database
+DATABASE_PREPARED_ENV = "EVMASTER_DATABASE_PREPARED"
+API_PORT = int(os.getenv("API_PORT", "8000"))
+
+def prepare_database():
+    """Create and upgrade tables and add the sample data"""
     print("🚀 Initializing database...")
     init_db()
     
@@ -86,9 +132,34 @@ def startup_event():
     finally:
         db.close()
 
+# Initialize database on startup
+@app.on_event("startup")
+def startup_event():
+    prepared = os.getenv(DATABASE_PREPARED_ENV) == "1"
+    if not prepared:
+        prepare_database()
+    
+    usage_tracker.start()
+    job_executor.start(requeue_interrupted=not prepared)
+    maintenance_scheduler.start()
+    
+    # Share change events with the other workers so their caches stay coherent
+    invalidation_bus.start(lambda event_type, data: event_bus.publish(event_type, data, remote=True))
+    event_bus.set_relay(invalidation_bus.publish)
+
+# Flush buffered writes and finish background work on shutdown
+@app.on_event("shutdown")
+def shutdown_event():
+    event_bus.set_relay(None)
+    invalidation_bus.stop()
+    maintenance_scheduler.stop()
+    job_executor.stop()
+    usage_tracker.stop()
+
 # Pydantic models
 class ClientAuth(BaseModel):
     client_code: str
+    workshop: Optional[str] = None  # Default: every workshop is searched for the code
 
 class ClientInfo(BaseModel):
     client_id: str
@@ -132,37 +203,64 @@ async def admin_panel():
         raise HTTPException(status_code=404, detail="Admin panel not found")
 
 # Authentication endpoints
-@app.post("/auth/login")
-async def login(auth: ClientAuth, db: Session = Depends(get_db)):
-    # Find client code in database
-    client_code = db.query(ClientCode).filter(
-        ClientCode.code == auth.client_code,
+def find_client_code(db: Session, code: str):
+    """The active code and its client, in a single query"""
+    return db.query(ClientCode, Client).join(
+        Client, ClientCode.client_id == Client.id
+    ).filter(
+        ClientCode.code == code,
         ClientCode.is_active == True
     ).first()
+
+@app.post("/auth/login")
+async def login(auth: ClientAuth, db: Session = Depends(get_db)):
+    # Codes are unique per workshop only; without an explicit workshop, every workshop is searched
+    try:
+        if auth.workshop:
+            candidates = [shard_router.resolve(auth.workshop.strip().lower())]
+        else:
+            candidates = [workshop_of(db)] + [w for w in shard_router.workshops() if w != workshop_of(db)]
+    except UnknownWorkshop as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    matches = []
+    for candidate in candidates:
+        shard_db = db if candidate == workshop_of(db) else shard_router.session(candidate)
+        try:
+            row = find_client_code(shard_db, auth.client_code)
+        finally:
+            if shard_db is not db:
+                shard_db.close()
+        if row:
+            matches.append((candidate, row))
     
-    if not client_code:
+    if not matches:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid client code"
         )
+    if len(matches) > 1:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Client code exists in several workshops; send the workshop "
+                   f"({', '.join(workshop for workshop, _ in matches)})"
+        )
     
-    # Get client information
-    client = db.query(Client).filter(Client.id == client_code.client_id).first()
-    if not client or not client.is_active:
+    workshop, (client_code, client) = matches[0]
+    if not client.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Client account is inactive"
         )
     
-    # Update code usage
-    from datetime import datetime
-    client_code.used_at = datetime.utcnow()
-    db.commit()
+    # Record code usage - written to the workshop's database in batches by the usage tracker
+    usage_tracker.record(client_code.id, workshop=workshop)
     
     return {
-        "access_token": f"token_{auth.client_code}_{client.id}",
+        "access_token": issue_token(workshop, auth.client_code, client.id),
         "token_type": "bearer", 
-        "client_id": str(client.id)
+        "client_id": str(client.id),
+        "workshop": workshop
     }
 
 # Client endpoints
@@ -177,343 +275,369 @@ async def get_client_profile(current_client: Client = Depends(get_current_client
         "address": current_client.address
     }
 
+# Change event entity of each visit type, for the response cache tags
+VISIT_ENTITIES = {"service": "service_record", "inspection": "inspection"}
+
+def cached_for_client(request: Request, db: Session, current_client: Client, tags: List[str], build):
+    """Serve a client-portal read from the per-client response cache, building it on a miss"""
+    key = client_cache.key(request, workshop_of(db), current_client.id)
+    return client_cache.response(request, key, tags, build)
+
+def car_to_dict(vehicle):
+    return {
+        "car_id": str(vehicle.id),
+        "make": vehicle.make,
+        "model": vehicle.model,
+        "year": vehicle.year,
+        "license_plate": vehicle.license_plate,
+        "vin": vehicle.vin,
+        "color": vehicle.color
+    }
+
+# Client car list fields
+CAR_RESOURCE = Resource(Vehicle, {
+    "car_id": Field(Vehicle.id, get=lambda vehicle: str(vehicle.id)),
+    "make": Field(Vehicle.make),
+    "model": Field(Vehicle.model),
+    "year": Field(Vehicle.year),
+    "license_plate": Field(Vehicle.license_plate),
+    "vin": Field(Vehicle.vin),
+    "color": Field(Vehicle.color)
+})
+
 @app.get("/client/cars")
-async def get_client_cars(current_client: Client = Depends(get_current_client), db: Session = Depends(get_db)):
+async def get_client_cars(
+    request: Request,
+    selection: FieldSelection = Depends(sparse_fields(CAR_RESOURCE)),
+    current_client: Client = Depends(get_current_client),
+    db: Session = Depends(get_db)
+):
     """Get all vehicles owned by the current client."""
-    vehicles = db.query(Vehicle).filter(Vehicle.client_id == current_client.id).all()
+    def build():
+        if selection.default:
+            return [car_to_dict(vehicle) for vehicle in readmodels.client_vehicles(db, current_client.id)]
+        
+        vehicles = db.query(Vehicle).filter(
+            Vehicle.client_id == current_client.id
+        ).options(*CAR_RESOURCE.loader_options(selection)).all()
+        
+        return [CAR_RESOURCE.serialize(vehicle, selection) for vehicle in vehicles]
     
-    return [
-        {
-            "car_id": str(vehicle.id),
-            "make": vehicle.make,
-            "model": vehicle.model,
-            "year": vehicle.year,
-            "license_plate": vehicle.license_plate,
-            "vin": vehicle.vin,
-            "color": vehicle.color
-        }
-        for vehicle in vehicles
-    ]
+    return cached_for_client(request, db, current_client, [client_tag(current_client.id)], build)
 
-@app.get("/client/cars/{car_id}/history")
-async def get_car_service_history(
-    car_id: str, 
-    current_client: Client = Depends(get_current_client), 
+@app.get("/client/home")
+async def get_client_home(
+    visits: int = Query(HOME_VISITS_PER_CAR, ge=1, le=MAX_HOME_VISITS_PER_CAR),
+    current_client: Client = Depends(get_current_client),
     db: Session = Depends(get_db)
 ):
-    """Get service history for a specific vehicle owned by the current client."""
-    # First verify the vehicle belongs to the current client
-    vehicle = db.query(Vehicle).filter(
-        Vehicle.id == int(car_id),
-        Vehicle.client_id == current_client.id
-    ).first()
+    """Get profile, cars with stats, latest inspections and recent visits in one response."""
+    return build_home_payload(db, current_client, visits)
+
+@app.get("/client/sync")
+async def sync_client_data(
+    since: Optional[str] = None,
+    current_client: Client = Depends(get_current_client),
+    db: Session = Depends(get_db)
+):
+    """Get cars, services and inspections changed since the given cursor (full data set without one)."""
+    try:
+        cursor = int(since) if since else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid sync cursor"
+        )
     
+    return build_sync_payload(db, current_client.id, cursor)
+
+def get_client_vehicle_row(db: Session, current_client: Client, car_id: str):
+    """The current client's vehicle as a read-model row, 404 if it is not theirs"""
+    vehicle = readmodels.client_vehicle(db, current_client.id, int(car_id))
     if not vehicle:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Vehicle not found"
         )
-    
-    # Get service records for this vehicle with service items
-    service_records = db.query(DBServiceRecord).filter(
-        DBServiceRecord.vehicle_id == vehicle.id
-    ).order_by(DBServiceRecord.service_date.desc()).all()
-    
-    result = []
-    for record in service_records:
-        # Get service items for this record
-        service_items = db.query(ServiceItem).filter(
-            ServiceItem.service_record_id == record.id
-        ).all()
-        
-        # Create service type summary from items
-        service_types = [item.service_name for item in service_items]
-        service_type_summary = ", ".join(service_types) if service_types else "General Service"
+    return vehicle
+
+def _iso(column):
+    return lambda obj, key=column.key: getattr(obj, key).isoformat() if getattr(obj, key) else None
+
+def _service_summary(record):
+    service_types = [item.service_name for item in record.service_items]
+    return ", ".join(service_types) if service_types else "General Service"
+
+# Service history fields - the summary fields are built from the service items
+SERVICE_HISTORY_RESOURCE = Resource(DBServiceRecord, {
+    "service_id": Field(DBServiceRecord.id, get=lambda record: str(record.id)),
+    "car_id": Field(DBServiceRecord.vehicle_id, get=lambda record: str(record.vehicle_id)),
+    "date": Field(DBServiceRecord.service_date, get=lambda record: record.service_date.isoformat()),
+    "service_type": Field(get=_service_summary, needs=("service_items",)),
+    "description": Field(
+        get=lambda record: f"{len(record.service_items)} service(s): {_service_summary(record)}",
+        needs=("service_items",)
+    ),
+    "cost": Field(DBServiceRecord.total_cost, get=lambda record: float(record.total_cost)),
+    "status": Field(DBServiceRecord.status),
+    "technician_notes": Field(DBServiceRecord.technician_notes),
+    "service_items": Embed(DBServiceRecord.service_items, Resource(ServiceItem, {
+        "service_type": Field(ServiceItem.service_type),
+        "service_name": Field(ServiceItem.service_name),
+        "description": Field(ServiceItem.description),
+        "price": Field(ServiceItem.price, get=lambda item: float(item.price))
+    }), many=True)
+})
+
+@app.get("/client/cars/{car_id}/history")
+async def get_car_service_history(
+    request: Request,
+    car_id: str, 
+    selection: FieldSelection = Depends(sparse_fields(SERVICE_HISTORY_RESOURCE)),
+    current_client: Client = Depends(get_current_client), 
+    db: Session = Depends(get_db)
+):
+    """Get service history for a specific vehicle owned by the current client."""
+    def build():
+        # First verify the vehicle belongs to the current client
+        vehicle = get_client_vehicle_row(db, current_client, car_id)
         
-        result.append({
-            "service_id": str(record.id),
-            "car_id": str(record.vehicle_id),
-            "date": record.service_date.isoformat(),
-            "service_type": service_type_summary,
-            "description": f"{len(service_items)} service(s): {service_type_summary}",
-            "cost": float(record.total_cost),
-            "status": record.status,
-            "technician_notes": record.technician_notes,
-            "service_items": [
+        if selection.default:
+            # Full history - read plain rows instead of hydrating ORM objects
+            items_by_record = readmodels.vehicle_service_items(db, vehicle.id)
+            return [
                 {
-                    "service_type": item.service_type,
-                    "service_name": item.service_name,
-                    "description": item.description,
-                    "price": float(item.price)
+                    "service_id": str(record.id),
+                    "car_id": str(record.vehicle_id),
+                    "date": record.service_date.isoformat(),
+                    "service_type": readmodels.service_summary(items_by_record[record.id]),
+                    "description": f"{len(items_by_record[record.id])} service(s): {readmodels.service_summary(items_by_record[record.id])}",
+                    "cost": float(record.total_cost),
+                    "status": record.status,
+                    "technician_notes": record.technician_notes,
+                    "service_items": [
+                        {
+                            "service_type": item.service_type,
+                            "service_name": item.service_name,
+                            "description": item.description,
+                            "price": float(item.price)
+                        }
+                        for item in items_by_record[record.id]
+                    ]
                 }
-                for item in service_items
+                for record in readmodels.vehicle_services(db, vehicle.id)
             ]
-        })
+        
+        # Get service records for this vehicle, loading only the requested fields and items
+        service_records = db.query(DBServiceRecord).filter(
+            DBServiceRecord.vehicle_id == vehicle.id
+        ).options(
+            *SERVICE_HISTORY_RESOURCE.loader_options(selection)
+        ).order_by(DBServiceRecord.service_date.desc()).all()
+        
+        return [SERVICE_HISTORY_RESOURCE.serialize(record, selection) for record in service_records]
     
-    return result
+    return cached_for_client(request, db, current_client, [vehicle_tag(int(car_id))], build)
 
 @app.get("/client/cars/{car_id}/visits")
 async def get_car_visit_history(
+    request: Request,
     car_id: str,
     current_client: Client = Depends(get_current_client),
     db: Session = Depends(get_db)
 ):
     """Get complete visit history (services and inspections) for a specific vehicle."""
-    # First verify the vehicle belongs to the current client
-    vehicle = db.query(Vehicle).filter(
-        Vehicle.id == int(car_id),
-        Vehicle.client_id == current_client.id
-    ).first()
-    
-    if not vehicle:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Vehicle not found"
-        )
-    
-    visits = []
-    
-    # Get service records
-    service_records = db.query(DBServiceRecord).filter(
-        DBServiceRecord.vehicle_id == vehicle.id
-    ).all()
-    
-    for record in service_records:
-        # Get service items for this record
-        service_items = db.query(ServiceItem).filter(
-            ServiceItem.service_record_id == record.id
-        ).all()
+    def build():
+        # First verify the vehicle belongs to the current client
+        vehicle = get_client_vehicle_row(db, current_client, car_id)
+        
+        items_by_record = readmodels.vehicle_service_items(db, vehicle.id)
+        visits = [
+            service_visit(record, [item.service_name for item in items_by_record[record.id]])
+            for record in readmodels.vehicle_services(db, vehicle.id)
+        ]
+        visits += [inspection_visit(inspection) for inspection in readmodels.vehicle_inspections(db, vehicle.id)]
         
-        # Create service type summary from items
-        service_types = [item.service_name for item in service_items]
-        service_title = ", ".join(service_types) if service_types else "General Service"
+        # Sort by date (most recent first)
+        visits.sort(key=lambda x: x['date'], reverse=True)
         
-        visits.append({
-            "visit_id": str(record.id),
-            "visit_type": "service",
-            "date": record.service_date.isoformat(),
-            "title": service_title,
-            "description": f"{len(service_items)} service(s) performed",
-            "status": record.status,
-            "cost": float(record.total_cost) if record.total_cost else None,
-            "technician_notes": record.technician_notes
-        })
-    
-    # Get inspection reports
-    inspection_reports = db.query(InspectionReport).filter(
-        InspectionReport.vehicle_id == vehicle.id
-    ).all()
-    
-    for inspection in inspection_reports:
-        visits.append({
-            "visit_id": str(inspection.id),
-            "visit_type": "inspection",
-            "date": inspection.inspection_date.isoformat(),
-            "title": f"Vehicle Inspection",
-            "description": f"Overall condition: {inspection.overall_condition}",
-            "status": "completed",
-            "cost": None,
-            "technician_notes": inspection.technician_notes
-        })
-    
-    # Sort by date (most recent first)
-    visits.sort(key=lambda x: x['date'], reverse=True)
-    
-    return visits
+        return visits
+    
+    return cached_for_client(request, db, current_client, [vehicle_tag(int(car_id))], build)
 
 @app.get("/client/visits/{visit_type}/{visit_id}")
 async def get_visit_details(
+    request: Request,
     visit_type: str,
     visit_id: str,
     current_client: Client = Depends(get_current_client),
     db: Session = Depends(get_db)
 ):
     """Get detailed information about a specific visit (service or inspection)."""
-    if visit_type == "service":
-        # Get service record
-        service_record = db.query(DBServiceRecord).filter(
-            DBServiceRecord.id == int(visit_id)
-        ).first()
-        
-        if not service_record:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Service record not found"
-            )
-        
-        # Verify the vehicle belongs to the current client
-        vehicle = db.query(Vehicle).filter(
-            Vehicle.id == service_record.vehicle_id,
-            Vehicle.client_id == current_client.id
-        ).first()
-        
-        if not vehicle:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Vehicle not found"
-            )
-        
-        # Get service items for this record
-        service_items = db.query(ServiceItem).filter(
-            ServiceItem.service_record_id == service_record.id
-        ).all()
-        
-        # Create service type summary from items
-        service_types = [item.service_name for item in service_items]
-        service_type_summary = ", ".join(service_types) if service_types else "General Service"
-        
-        # Check for linked inspection
-        linked_inspection = None
-        if service_record.linked_inspection_id:
-            inspection = db.query(InspectionReport).filter(
-                InspectionReport.id == service_record.linked_inspection_id
+    def build():
+        if visit_type == "service":
+            # Get service record
+            service_record = db.query(DBServiceRecord).filter(
+                DBServiceRecord.id == int(visit_id)
             ).first()
-            if inspection:
-                linked_inspection = {
-                    "inspection_id": str(inspection.id),
-                    "overall_condition": inspection.overall_condition,
-                    "recommendations": inspection.recommendations
-                }
-        
-        return {
-            "visit_id": str(service_record.id),
-            "visit_type": "service",
-            "vehicle": {
-                "make": vehicle.make,
-                "model": vehicle.model,
-                "year": vehicle.year,
-                "license_plate": vehicle.license_plate
-            },
-            "date": service_record.service_date.isoformat(),
-            "service_type": service_type_summary,
-            "description": f"{len(service_items)} service(s): {service_type_summary}",
-            "cost": float(service_record.total_cost),
-            "status": service_record.status,
-            "technician_notes": service_record.technician_notes,
-            "created_at": service_record.created_at.isoformat(),
-            "linked_inspection": linked_inspection,
-            "service_items": [
-                {
-                    "service_type": item.service_type,
-                    "service_name": item.service_name,
-                    "description": item.description,
-                    "price": float(item.price)
-                }
-                for item in service_items
-            ]
-        }
-    
-    elif visit_type == "inspection":
-        # Get inspection report
-        inspection = db.query(InspectionReport).filter(
-            InspectionReport.id == int(visit_id)
-        ).first()
-        
-        if not inspection:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Inspection report not found"
-            )
+            
+            if not service_record:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Service record not found"
+                )
+            
+            # Verify the vehicle belongs to the current client
+            vehicle = db.query(Vehicle).filter(
+                Vehicle.id == service_record.vehicle_id,
+                Vehicle.client_id == current_client.id
+            ).first()
+            
+            if not vehicle:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Vehicle not found"
+                )
+            
+            # Get service items for this record
+            service_items = db.query(ServiceItem).filter(
+                ServiceItem.service_record_id == service_record.id
+            ).order_by(ServiceItem.id).all()
+            
+            # Create service type summary from items
+            service_types = [item.service_name for item in service_items]
+            service_type_summary = ", ".join(service_types) if service_types else "General Service"
+            
+            # Check for linked inspection
+            linked_inspection = None
+            if service_record.linked_inspection_id:
+                inspection = db.query(InspectionReport).filter(
+                    InspectionReport.id == service_record.linked_inspection_id
+                ).first()
+                if inspection:
+                    linked_inspection = {
+                        "inspection_id": str(inspection.id),
+                        "overall_condition": inspection.overall_condition,
+                        "recommendations": inspection.recommendations
+                    }
+            
+            # The linked inspection is part of the body, so its changes must drop the cached entry too
+            linked_tags = [record_tag("inspection", service_record.linked_inspection_id)] if service_record.linked_inspection_id else []
+            return Tagged({
+                "visit_id": str(service_record.id),
+                "visit_type": "service",
+                "vehicle": {
+                    "make": vehicle.make,
+                    "model": vehicle.model,
+                    "year": vehicle.year,
+                    "license_plate": vehicle.license_plate
+                },
+                "date": service_record.service_date.isoformat(),
+                "service_type": service_type_summary,
+                "description": f"{len(service_items)} service(s): {service_type_summary}",
+                "cost": float(service_record.total_cost),
+                "status": service_record.status,
+                "technician_notes": service_record.technician_notes,
+                "created_at": service_record.created_at.isoformat(),
+                "linked_inspection": linked_inspection,
+                "service_items": [
+                    {
+                        "service_type": item.service_type,
+                        "service_name": item.service_name,
+                        "description": item.description,
+                        "price": float(item.price)
+                    }
+                    for item in service_items
+                ]
+            }, linked_tags)
         
-        # Verify the vehicle belongs to the current client
-        vehicle = db.query(Vehicle).filter(
-            Vehicle.id == inspection.vehicle_id,
-            Vehicle.client_id == current_client.id
-        ).first()
+        elif visit_type == "inspection":
+            # Get inspection report
+            inspection = db.query(InspectionReport).options(undefer(InspectionReport.items_json)).filter(
+                InspectionReport.id == int(visit_id)
+            ).first()
+            
+            if not inspection:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Inspection report not found"
+                )
+            
+            # Verify the vehicle belongs to the current client
+            vehicle = db.query(Vehicle).filter(
+                Vehicle.id == inspection.vehicle_id,
+                Vehicle.client_id == current_client.id
+            ).first()
+            
+            if not vehicle:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Vehicle not found"
+                )
+            
+            # Get inspection items
+            items = report_items(db, inspection)
+            attachments = attachments_by_item(db, [item.id for item in items])
+            
+            return {
+                "visit_id": str(inspection.id),
+                "visit_type": "inspection",
+                "vehicle": {
+                    "make": vehicle.make,
+                    "model": vehicle.model,
+                    "year": vehicle.year,
+                    "license_plate": vehicle.license_plate
+                },
+                "date": inspection.inspection_date.isoformat(),
+                "overall_condition": inspection.overall_condition,
+                "technician_notes": inspection.technician_notes,
+                "recommendations": inspection.recommendations,
+                "items": [
+                    {
+                        "item_name": item.item_name,
+                        "status": item.status,
+                        "notes": item.notes,
+                        "attachments": [attachment_to_dict(attachment, "/client") for attachment in attachments[item.id]]
+                    }
+                    for item in items
+                ],
+                "created_at": inspection.created_at.isoformat()
+            }
         
-        if not vehicle:
+        else:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Vehicle not found"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid visit type. Must be 'service' or 'inspection'"
             )
-        
-        # Get inspection items
-        items = db.query(InspectionItem).filter(
-            InspectionItem.inspection_id == inspection.id
-        ).all()
-        
-        return {
-            "visit_id": str(inspection.id),
-            "visit_type": "inspection",
-            "vehicle": {
-                "make": vehicle.make,
-                "model": vehicle.model,
-                "year": vehicle.year,
-                "license_plate": vehicle.license_plate
-            },
-            "date": inspection.inspection_date.isoformat(),
-            "overall_condition": inspection.overall_condition,
-            "technician_notes": inspection.technician_notes,
-            "recommendations": inspection.recommendations,
-            "items": [
-                {
-                    "item_name": item.item_name,
-                    "status": item.status,
-                    "notes": item.notes
-                }
-                for item in items
-            ],
-            "created_at": inspection.created_at.isoformat()
-        }
     
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid visit type. Must be 'service' or 'inspection'"
-        )
+    return cached_for_client(request, db, current_client, [client_tag(current_client.id), record_tag(VISIT_ENTITIES.get(visit_type, visit_type), int(visit_id))], build)
 
 @app.get("/client/cars/{car_id}")
 async def get_car_details(
+    request: Request,
     car_id: str,
     current_client: Client = Depends(get_current_client),
     db: Session = Depends(get_db)
 ):
     """Get detailed information about a specific vehicle owned by the current client."""
-    # First verify the vehicle belongs to the current client
-    vehicle = db.query(Vehicle).filter(
-        Vehicle.id == int(car_id),
-        Vehicle.client_id == current_client.id
-    ).first()
-    
-    if not vehicle:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Vehicle not found"
-        )
-    
-    # Get service records count and latest service
-    service_count = db.query(DBServiceRecord).filter(
-        DBServiceRecord.vehicle_id == vehicle.id
-    ).count()
-    
-    latest_service = db.query(DBServiceRecord).filter(
-        DBServiceRecord.vehicle_id == vehicle.id
-    ).order_by(DBServiceRecord.service_date.desc()).first()
-    
-    # Get inspection reports count and latest inspection
-    inspection_count = db.query(InspectionReport).filter(
-        InspectionReport.vehicle_id == vehicle.id
-    ).count()
-    
-    latest_inspection = db.query(InspectionReport).filter(
-        InspectionReport.vehicle_id == vehicle.id
-    ).order_by(InspectionReport.inspection_date.desc()).first()
-    
-    return {
-        "car_id": str(vehicle.id),
-        "make": vehicle.make,
-        "model": vehicle.model,
-        "year": vehicle.year,
-        "license_plate": vehicle.license_plate,
-        "vin": vehicle.vin,
-        "color": vehicle.color,
-        "stats": {
-            "total_services": service_count,
-            "total_inspections": inspection_count,
-            "last_service_date": latest_service.service_date.isoformat() if latest_service else None,
-            "last_inspection_date": latest_inspection.inspection_date.isoformat() if latest_inspection else None
+    def build():
+        # First verify the vehicle belongs to the current client
+        vehicle = get_client_vehicle_row(db, current_client, car_id)
+        
+        # Service and inspection counts and latest dates in one statement
+        service_count, last_service_date, inspection_count, last_inspection_date = readmodels.vehicle_stats(db, vehicle.id)
+        
+        return {
+            **car_to_dict(vehicle),
+            "stats": {
+                "total_services": service_count,
+                "total_inspections": inspection_count,
+                "last_service_date": last_service_date.isoformat() if last_service_date else None,
+                "last_inspection_date": last_inspection_date.isoformat() if last_inspection_date else None
+            }
         }
-    }
+    
+    return cached_for_client(request, db, current_client, [vehicle_tag(int(car_id))], build)
 
 @app.get("/client/cars/{car_id}/inspection")
 async def get_car_inspection(
@@ -523,21 +647,10 @@ async def get_car_inspection(
 ):
     """Get the latest inspection report for a specific vehicle owned by the current client."""
     # First verify the vehicle belongs to the current client
-    vehicle = db.query(Vehicle).filter(
-        Vehicle.id == int(car_id),
-        Vehicle.client_id == current_client.id
-    ).first()
-    
-    if not vehicle:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Vehicle not found"
-        )
+    vehicle = get_client_vehicle_row(db, current_client, car_id)
     
-    # Get the latest inspection report for this vehicle
-    inspection = db.query(InspectionReport).filter(
-        InspectionReport.vehicle_id == vehicle.id
-    ).order_by(InspectionReport.inspection_date.desc()).first()
+    # Get the latest inspection report for this vehicle with its items
+    inspection, items = readmodels.latest_inspection(db, vehicle.id)
     
     if not inspection:
         raise HTTPException(
@@ -545,11 +658,6 @@ async def get_car_inspection(
             detail="No inspection reports found for this vehicle"
         )
     
-    # Get inspection items
-    items = db.query(InspectionItem).filter(
-        InspectionItem.inspection_id == inspection.id
-    ).all()
-    
     return {
         "inspection_id": str(inspection.id),
         "car_id": str(inspection.vehicle_id),
@@ -567,6 +675,83 @@ async def get_car_inspection(
         ]
     }
 
+@app.get("/client/cars/{car_id}/inspection/pdf")
+async def get_car_inspection_pdf(
+    car_id: str,
+    request: Request,
+    lang: str = "en",
+    current_client: Client = Depends(get_current_client),
+    db: Session = Depends(get_db)
+):
+    """Download the latest inspection report of a vehicle as a PDF (en/ar)."""
+    vehicle = get_client_vehicle_row(db, current_client, car_id)
+    inspection, items = readmodels.latest_inspection(db, vehicle.id)
+    if not inspection:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No inspection reports found for this vehicle"
+        )
+    
+    document = inspection_document(inspection, items, vehicle, current_client.name, pdf_language(lang), workshop_of(db))
+    return await pdf_cache.response(request, document)
+
+@app.get("/client/visits/inspection/{inspection_id}/pdf")
+async def get_inspection_pdf(
+    inspection_id: int,
+    request: Request,
+    lang: str = "en",
+    current_client: Client = Depends(get_current_client),
+    db: Session = Depends(get_db)
+):
+    """Download an inspection report as a PDF (en/ar)."""
+    inspection = db.query(InspectionReport).options(undefer(InspectionReport.items_json)).join(
+        Vehicle, InspectionReport.vehicle_id == Vehicle.id
+    ).filter(
+        InspectionReport.id == inspection_id,
+        Vehicle.client_id == current_client.id
+    ).first()
+    if not inspection:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Inspection report not found"
+        )
+    
+    items = report_items(db, inspection)
+    document = inspection_document(inspection, items, inspection.vehicle, current_client.name, pdf_language(lang), workshop_of(db))
+    return await pdf_cache.response(request, document)
+
+# Attachment downloads
+def get_attachment_or_404(db: Session, attachment_id: int, client_id: Optional[int] = None) -> InspectionAttachment:
+    query = db.query(InspectionAttachment).filter(InspectionAttachment.id == attachment_id)
+    if client_id is not None:
+        query = query.join(InspectionItem).join(InspectionReport).join(Vehicle).filter(Vehicle.client_id == client_id)
+    attachment = query.first()
+    if not attachment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Attachment not found")
+    return attachment
+
+@app.get("/client/attachments/{attachment_id}")
+async def download_client_attachment(
+    attachment_id: int,
+    request: Request,
+    current_client: Client = Depends(get_current_client),
+    db: Session = Depends(get_db)
+):
+    """Download a photo or document attached to one of the client's inspections (supports Range requests)."""
+    attachment = get_attachment_or_404(db, attachment_id, client_id=current_client.id)
+    return attachment_response(request, attachment, workshop_of(db))
+
+@app.get("/client/attachments/{attachment_id}/thumbnail")
+async def download_client_attachment_thumbnail(
+    attachment_id: int,
+    request: Request,
+    current_client: Client = Depends(get_current_client),
+    db: Session = Depends(get_db)
+):
+    """Download the thumbnail of a photo attached to one of the client's inspections."""
+    attachment = get_attachment_or_404(db, attachment_id, client_id=current_client.id)
+    return attachment_response(request, attachment, workshop_of(db), thumbnail=True)
+
 # Booking endpoints
 class BookingRequest(BaseModel):
     date: str
@@ -574,35 +759,116 @@ class BookingRequest(BaseModel):
     service: str
     vehicle_id: Optional[str] = None
 
+def booking_to_dict(booking: Booking):
+    return {
+        "booking_id": str(booking.id),
+        "date": booking.slot_start.date().isoformat(),
+        "time": format_slot_time(booking.slot_start.time()),
+        "service": booking.service,
+        "vehicle_id": str(booking.vehicle_id) if booking.vehicle_id else None,
+        "status": booking.status
+    }
+
+@app.get("/bookings/availability")
+async def get_booking_availability(
+    days: int = 14,
+    current_client: Client = Depends(get_current_client),
+    db: Session = Depends(get_db)
+):
+    """Get free slots (with remaining bay count) for the upcoming days."""
+    return booking_engine_for(db).availability(db, days=days)
+
 @app.post("/bookings")
-async def create_booking(booking: BookingRequest, credentials: HTTPAuthorizationCredentials = Depends(security)):
-    # TODO: Implement database booking creation
+async def create_booking(
+    booking: BookingRequest,
+    current_client: Client = Depends(get_current_client),
+    db: Session = Depends(get_db)
+):
+    """Book a service slot for the current client."""
+    try:
+        slot_start = datetime.combine(
+            datetime.strptime(booking.date, "%Y-%m-%d").date(),
+            parse_slot_time(booking.time)
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid date or time. Use YYYY-MM-DD and e.g. '10:00 AM'"
+        )
+    
+    vehicle_id = None
+    if booking.vehicle_id:
+        vehicle = db.query(Vehicle).filter(
+            Vehicle.id == int(booking.vehicle_id),
+            Vehicle.client_id == current_client.id
+        ).first()
+        if not vehicle:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Vehicle not found"
+            )
+        vehicle_id = vehicle.id
+    
+    try:
+        db_booking = booking_engine_for(db).reserve(
+            db, current_client.id, slot_start, booking.service, vehicle_id=vehicle_id
+        )
+    except SlotUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    
+    publish_change("booking", "created", id=db_booking.id, client_id=current_client.id,
+                   vehicle_id=vehicle_id, slot_start=db_booking.slot_start.isoformat())
+    
     return {
-        "booking_id": "booking_001",
-        "status": "confirmed",
-        "date": booking.date,
-        "time": booking.time,
-        "service": booking.service,
+        **booking_to_dict(db_booking),
         "message": "Booking confirmed successfully"
     }
 
 @app.get("/bookings")
-async def get_client_bookings(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    # TODO: Implement database query for client bookings
-    return [
-        {
-            "booking_id": "booking_001",
-            "date": "2023-12-15",
-            "time": "10:00 AM",
-            "service": "Oil Change",
-            "status": "confirmed"
-        }
-    ]
+async def get_client_bookings(current_client: Client = Depends(get_current_client), db: Session = Depends(get_db)):
+    """Get the current client's bookings, most recent first."""
+    bookings = db.query(Booking).filter(
+        Booking.client_id == current_client.id
+    ).order_by(Booking.slot_start.desc()).all()
+    
+    return [booking_to_dict(booking) for booking in bookings]
+
+@app.delete("/bookings/{booking_id}")
+async def cancel_booking(
+    booking_id: str,
+    current_client: Client = Depends(get_current_client),
+    db: Session = Depends(get_db)
+):
+    """Cancel one of the current client's bookings."""
+    booking = db.query(Booking).filter(
+        Booking.id == int(booking_id),
+        Booking.client_id == current_client.id
+    ).first()
+    
+    if not booking:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Booking not found"
+        )
+    
+    if booking.status != "cancelled":
+        booking_engine_for(db).cancel(db, booking)
+        publish_change("booking", "cancelled", id=booking.id, client_id=current_client.id,
+                       vehicle_id=booking.vehicle_id, slot_start=booking.slot_start.isoformat())
+    
+    return {"message": "Booking cancelled successfully"}
 
 # FAQ endpoints
 @app.get("/faq")
-async def get_faqs(lang: str = "en", db: Session = Depends(get_db)):
+async def get_faqs(request: Request, lang: str = "en", db: Session = Depends(get_db)):
     """Get FAQs with language support (en/ar)."""
+    if lang != "ar":
+        lang = "en"  # Default to English
+    # FAQs are read-only at runtime, so serve them pre-serialized and pre-compressed
+    return static_payloads.response(request, f"faq:{workshop_of(db)}:{lang}", lambda: build_faq_payload(db, lang))
+
+def build_faq_payload(db: Session, lang: str):
+    """Build the FAQ list for a language"""
     # Get FAQs from database ordered by display_order
     faqs = db.query(FAQ).filter(FAQ.is_active == True).order_by(FAQ.display_order, FAQ.created_at).all()
     
@@ -669,222 +935,276 @@ async def get_faqs(lang: str = "en", db: Session = Depends(get_db)):
 
 # ===== ADMIN INSPECTION MANAGEMENT =====
 
+# Admin inspection list fields - created_at doubles as updated_at, as the dashboard has always received it
+ADMIN_CLIENT_RESOURCE = Resource(Client, {
+    "id": Field(Client.id),
+    "name": Field(Client.name),
+    "phone": Field(Client.phone),
+    "email": Field(Client.email),
+    "address": Field(Client.address),
+    "is_active": Field(Client.is_active),
+    "created_at": Field(Client.created_at, get=_iso(Client.created_at)),
+    "updated_at": Field(Client.created_at, get=_iso(Client.created_at))
+})
+
+ADMIN_VEHICLE_RESOURCE = Resource(Vehicle, {
+    "id": Field(Vehicle.id),
+    "make": Field(Vehicle.make),
+    "model": Field(Vehicle.model),
+    "year": Field(Vehicle.year),
+    "license_plate": Field(Vehicle.license_plate),
+    "vin": Field(Vehicle.vin),
+    "color": Field(Vehicle.color),
+    "client_id": Field(Vehicle.client_id),
+    "created_at": Field(Vehicle.created_at, get=_iso(Vehicle.created_at)),
+    "updated_at": Field(Vehicle.created_at, get=_iso(Vehicle.created_at)),
+    "client": Embed(Vehicle.owner, ADMIN_CLIENT_RESOURCE)
+})
+
+ADMIN_INSPECTION_RESOURCE = Resource(InspectionReport, {
+    "id": Field(InspectionReport.id),
+    "vehicle_id": Field(InspectionReport.vehicle_id),
+    "inspection_date": Field(InspectionReport.inspection_date, get=_iso(InspectionReport.inspection_date)),
+    "overall_status": Field(InspectionReport.overall_condition),
+    "notes": Field(InspectionReport.technician_notes),
+    "version": Field(InspectionReport.version),
+    "created_at": Field(InspectionReport.created_at, get=_iso(InspectionReport.created_at)),
+    "updated_at": Field(InspectionReport.created_at, get=_iso(InspectionReport.created_at)),
+    "linked_service_id": Field(InspectionReport.linked_service_record_id),
+    "vehicle": Embed(InspectionReport.vehicle, ADMIN_VEHICLE_RESOURCE),
+    "items": Embed(InspectionReport.items, Resource(InspectionItem, {
+        "id": Field(InspectionItem.id),
+        "report_id": Field(InspectionItem.inspection_id),
+        "category": Field(get=lambda item: ""),  # You might need to add category field to InspectionItem model
+        "item_name": Field(InspectionItem.item_name),
+        "status": Field(InspectionItem.status),
+        "notes": Field(InspectionItem.notes)
+    }), many=True)
+})
+
+INSPECTION_SORT_KEYS = {
+    "id": InspectionReport.id,
+    "inspection_date": InspectionReport.inspection_date,
+    "overall_condition": InspectionReport.overall_condition,
+    "vehicle_id": InspectionReport.vehicle_id,
+    "client": Client.name,
+    "created_at": InspectionReport.created_at
+}
+
 @app.get("/admin/inspections")
-async def get_all_inspections(db: Session = Depends(get_db)):
-    """Get all inspection reports for admin management"""
-    inspections = db.query(InspectionReport).join(
+async def get_all_inspections(
+    vehicle_id: Optional[int] = None,
+    client_id: Optional[int] = None,
+    overall_condition: Optional[str] = Query(None, description="Comma-separated conditions, e.g. fair,poor"),
+    status: Optional[str] = Query(None, description="Reports with at least one item in these statuses, e.g. replace"),
+    date_from: Optional[date] = Query(None, description="First inspection date to include (YYYY-MM-DD)"),
+    date_to: Optional[date] = Query(None, description="Last inspection date to include (YYYY-MM-DD)"),
+    order_by: list = Depends(sort_order(INSPECTION_SORT_KEYS, "id", tiebreaker=InspectionReport.id)),
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    selection: FieldSelection = Depends(sparse_fields(ADMIN_INSPECTION_RESOURCE)),
+    db: Session = Depends(get_db)
+):
+    """Get inspection reports matching the filters for admin management"""
+    query = db.query(InspectionReport).join(
         Vehicle, InspectionReport.vehicle_id == Vehicle.id
     ).join(
         Client, Vehicle.client_id == Client.id
-    ).all()
-    
-    result = []
-    for inspection in inspections:
-        # Get inspection items
-        items = db.query(InspectionItem).filter(
-            InspectionItem.inspection_id == inspection.id
-        ).all()
-        
-        result.append({
-            "id": inspection.id,
-            "vehicle_id": inspection.vehicle_id,
-            "inspection_date": inspection.inspection_date.isoformat(),
-            "overall_status": inspection.overall_condition,
-            "notes": inspection.technician_notes,
-            "created_at": inspection.created_at.isoformat(),
-            "updated_at": inspection.created_at.isoformat(),  # Use created_at since updated_at doesn't exist
-            "linked_service_id": getattr(inspection, 'linked_service_record_id', None),
-            "vehicle": {
-                "id": inspection.vehicle.id,
-                "make": inspection.vehicle.make,
-                "model": inspection.vehicle.model,
-                "year": inspection.vehicle.year,
-                "license_plate": inspection.vehicle.license_plate,
-                "vin": inspection.vehicle.vin,
-                "color": inspection.vehicle.color,
-                "client_id": inspection.vehicle.client_id,
-                "created_at": inspection.vehicle.created_at.isoformat(),
-                "updated_at": inspection.vehicle.created_at.isoformat(),  # Use created_at since updated_at doesn't exist
-                "client": {
-                    "id": inspection.vehicle.owner.id,
-                    "name": inspection.vehicle.owner.name,
-                    "phone": inspection.vehicle.owner.phone,
-                    "email": inspection.vehicle.owner.email,
-                    "address": inspection.vehicle.owner.address,
-                    "is_active": inspection.vehicle.owner.is_active,
-                    "created_at": inspection.vehicle.owner.created_at.isoformat(),
-                    "updated_at": inspection.vehicle.owner.created_at.isoformat()  # Use created_at since updated_at doesn't exist
-                }
-            },
-            "items": [{
-                "id": item.id,
-                "report_id": item.inspection_id,
-                "category": "",  # You might need to add category field to InspectionItem model
-                "item_name": item.item_name,
-                "status": item.status,
-                "notes": item.notes
-            } for item in items]
-        })
+    )
+    if vehicle_id:
+        query = query.filter(InspectionReport.vehicle_id == vehicle_id)
+    if client_id:
+        query = query.filter(Vehicle.client_id == client_id)
+    if overall_condition:
+        query = query.filter(InspectionReport.overall_condition.in_(split_values(overall_condition)))
+    if status:
+        query = query.filter(select(InspectionItem.id).where(
+            InspectionItem.inspection_id == InspectionReport.id,
+            InspectionItem.status.in_(split_values(status))
+        ).exists())
+    query = query.filter(*date_range(InspectionReport.inspection_date, date_from, date_to))
+    inspections = query.options(
+        *ADMIN_INSPECTION_RESOURCE.loader_options(selection)
+    ).order_by(*order_by).offset(skip).limit(limit).all()
     
-    return result
+    return [ADMIN_INSPECTION_RESOURCE.serialize(inspection, selection) for inspection in inspections]
 
 @app.post("/admin/inspections")
-async def create_inspection(inspection_data: dict, db: Session = Depends(get_db)):
+async def create_inspection(
+    inspection_data: dict,
+    response: Response,
+    background: bool = False,
+    db: Session = Depends(get_db)
+):
     """Create a new inspection report with optional service creation"""
+    if background:
+        # Hand the work to the job executor and return straight away
+        job = job_executor.enqueue("create_inspection", inspection_data, workshop=workshop_of(db))
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"job_id": job.id, "status": job.status}
+    
     try:
-        # Verify vehicle exists
-        vehicle = db.query(Vehicle).filter(Vehicle.id == inspection_data["vehicle_id"]).first()
-        if not vehicle:
-            raise HTTPException(status_code=404, detail="Vehicle not found")
+        return create_inspection_record(db, inspection_data)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+@job_executor.register("create_inspection")
+def create_inspection_record(db: Session, inspection_data: dict):
+    """Create an inspection report, its items and an optional linked service"""
+    # Verify vehicle exists
+    vehicle = db.query(Vehicle).filter(Vehicle.id == inspection_data["vehicle_id"]).first()
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    
+    # Create inspection report
+    inspection = InspectionReport(
+        vehicle_id=inspection_data["vehicle_id"],
+        inspection_date=datetime.fromisoformat(inspection_data["inspection_date"].replace('Z', '+00:00')),
+        overall_condition=inspection_data["overall_condition"],
+        technician_notes=inspection_data.get("technician_notes"),
+        recommendations=inspection_data.get("recommendations")
+    )
+    
+    db.add(inspection)
+    db.flush()  # Get the ID
+    
+    # Add inspection items if provided
+    if "items" in inspection_data:
+        for item_data in inspection_data["items"]:
+            item = InspectionItem(
+                inspection_id=inspection.id,
+                item_name=item_data["item_name"],
+                status=item_data["status"],
+                notes=item_data.get("notes")
+            )
+            db.add(item)
+    
+    # Create linked service if requested
+    created_service = None
+    if inspection_data.get("create_service"):
+        service_data = inspection_data.get("service_data", {})
         
-        # Create inspection report
-        inspection = InspectionReport(
+        # Create service record
+        service = DBServiceRecord(
             vehicle_id=inspection_data["vehicle_id"],
-            inspection_date=datetime.fromisoformat(inspection_data["inspection_date"].replace('Z', '+00:00')),
-            overall_condition=inspection_data["overall_condition"],
-            technician_notes=inspection_data.get("technician_notes"),
-            recommendations=inspection_data.get("recommendations")
+            service_date=inspection.inspection_date,  # Use same date as inspection
+            status=service_data.get("status", "pending"),
+            technician_notes=service_data.get("technician_notes", f"Service recommended based on inspection findings: {inspection_data.get('recommendations', '')}"),
+            total_cost=0.0,  # Will be calculated from service items
+            linked_inspection_id=inspection.id,
+            created_at=datetime.utcnow()
         )
         
-        db.add(inspection)
-        db.flush()  # Get the ID
-        
-        # Add inspection items if provided
-        if "items" in inspection_data:
-            for item_data in inspection_data["items"]:
-                item = InspectionItem(
-                    inspection_id=inspection.id,
-                    item_name=item_data["item_name"],
-                    status=item_data["status"],
-                    notes=item_data.get("notes")
-                )
-                db.add(item)
-        
-        # Create linked service if requested
-        created_service = None
-        if inspection_data.get("create_service"):
-            service_data = inspection_data.get("service_data", {})
-            
-            # Create service record
-            service = DBServiceRecord(
-                vehicle_id=inspection_data["vehicle_id"],
-                service_date=inspection.inspection_date,  # Use same date as inspection
-                status=service_data.get("status", "pending"),
-                technician_notes=service_data.get("technician_notes", f"Service recommended based on inspection findings: {inspection_data.get('recommendations', '')}"),
-                total_cost=0.0,  # Will be calculated from service items
-                linked_inspection_id=inspection.id,
-                created_at=datetime.utcnow()
-            )
-            
-            db.add(service)
-            db.flush()  # Get service ID
-            
-            # Link inspection to service
-            inspection.linked_service_record_id = service.id
-            
-            # Create service items if provided
-            total_cost = 0.0
-            if "service_items" in service_data:
-                for item_data in service_data["service_items"]:
-                    service_item = ServiceItem(
-                        service_record_id=service.id,
-                        service_type=item_data["service_type"],
-                        service_name=item_data["service_name"],
-                        description=item_data.get("description"),
-                        price=float(item_data["price"]),
-                        created_at=datetime.utcnow()
-                    )
-                    db.add(service_item)
-                    total_cost += float(item_data["price"])
-            
-            # Update service total cost
-            service.total_cost = total_cost
-            created_service = service
-        
-        db.commit()
-        
-        # Refresh to get the relationships
-        db.refresh(inspection)
+        db.add(service)
+        db.flush()  # Get service ID
         
-        # Get the created items
-        items = db.query(InspectionItem).filter(
-            InspectionItem.inspection_id == inspection.id
-        ).all()
+        # Link inspection to service
+        inspection.linked_service_record_id = service.id
         
-        # Get vehicle and client data
-        vehicle = db.query(Vehicle).filter(Vehicle.id == inspection.vehicle_id).first()
-        client = db.query(Client).filter(Client.id == vehicle.client_id).first()
+        # Create service items if provided
+        total_cost = 0.0
+        if "service_items" in service_data:
+            for item_data in service_data["service_items"]:
+                service_item = ServiceItem(
+                    service_record_id=service.id,
+                    service_type=item_data["service_type"],
+                    service_name=item_data["service_name"],
+                    description=item_data.get("description"),
+                    price=float(item_data["price"]),
+                    created_at=datetime.utcnow()
+                )
+                db.add(service_item)
+                total_cost += float(item_data["price"])
         
-        # Prepare service data if created
-        created_service_data = None
-        if created_service:
-            service_items = db.query(ServiceItem).filter(
-                ServiceItem.service_record_id == created_service.id
-            ).all()
-            
-            created_service_data = {
-                "id": created_service.id,
-                "status": created_service.status,
-                "total_cost": created_service.total_cost,
-                "technician_notes": created_service.technician_notes,
-                "service_items": [{
-                    "id": item.id,
-                    "service_type": item.service_type,
-                    "service_name": item.service_name,
-                    "description": item.description,
-                    "price": item.price
-                } for item in service_items]
-            }
+        # Update service total cost
+        service.total_cost = total_cost
+        created_service = service
+    
+    db.commit()
+    
+    # Refresh to get the relationships
+    db.refresh(inspection)
+    
+    # Get the created items
+    items = report_items(db, inspection)
+    
+    # Get vehicle and client data
+    vehicle = db.query(Vehicle).filter(Vehicle.id == inspection.vehicle_id).first()
+    client = db.query(Client).filter(Client.id == vehicle.client_id).first()
+    
+    publish_change("inspection", "created", id=inspection.id, vehicle_id=vehicle.id, client_id=client.id)
+    if created_service:
+        publish_change("service_record", "created", id=created_service.id, vehicle_id=vehicle.id,
+                       client_id=client.id, status=created_service.status)
+    
+    # Prepare service data if created
+    created_service_data = None
+    if created_service:
+        service_items = db.query(ServiceItem).filter(
+            ServiceItem.service_record_id == created_service.id
+        ).order_by(ServiceItem.id).all()
         
-        return {
-            "id": inspection.id,
-            "vehicle_id": inspection.vehicle_id,
-            "inspection_date": inspection.inspection_date.isoformat(),
-            "overall_status": inspection.overall_condition,
-            "notes": inspection.technician_notes,
-            "recommendations": inspection.recommendations,
-            "created_at": inspection.created_at.isoformat(),
-            "updated_at": inspection.created_at.isoformat(),
-            "created_service": created_service_data,
-            "vehicle": {
-                "id": vehicle.id,
-                "make": vehicle.make,
-                "model": vehicle.model,
-                "year": vehicle.year,
-                "license_plate": vehicle.license_plate,
-                "vin": vehicle.vin,
-                "color": vehicle.color,
-                "client_id": vehicle.client_id,
-                "created_at": vehicle.created_at.isoformat(),
-                "updated_at": vehicle.created_at.isoformat(),
-                "client": {
-                    "id": client.id,
-                    "name": client.name,
-                    "phone": client.phone,
-                    "email": client.email,
-                    "address": client.address,
-                    "is_active": client.is_active,
-                    "created_at": client.created_at.isoformat(),
-                    "updated_at": client.created_at.isoformat()
-                }
-            },
-            "items": [{
+        created_service_data = {
+            "id": created_service.id,
+            "status": created_service.status,
+            "total_cost": created_service.total_cost,
+            "technician_notes": created_service.technician_notes,
+            "service_items": [{
                 "id": item.id,
-                "report_id": item.inspection_id,
-                "category": "",
-                "item_name": item.item_name,
-                "status": item.status,
-                "notes": item.notes
-            } for item in items]
+                "service_type": item.service_type,
+                "service_name": item.service_name,
+                "description": item.description,
+                "price": item.price
+            } for item in service_items]
         }
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "id": inspection.id,
+        "vehicle_id": inspection.vehicle_id,
+        "inspection_date": inspection.inspection_date.isoformat(),
+        "overall_status": inspection.overall_condition,
+        "notes": inspection.technician_notes,
+        "recommendations": inspection.recommendations,
+        "created_at": inspection.created_at.isoformat(),
+        "updated_at": inspection.created_at.isoformat(),
+        "created_service": created_service_data,
+        "vehicle": {
+            "id": vehicle.id,
+            "make": vehicle.make,
+            "model": vehicle.model,
+            "year": vehicle.year,
+            "license_plate": vehicle.license_plate,
+            "vin": vehicle.vin,
+            "color": vehicle.color,
+            "client_id": vehicle.client_id,
+            "created_at": vehicle.created_at.isoformat(),
+            "updated_at": vehicle.created_at.isoformat(),
+            "client": {
+                "id": client.id,
+                "name": client.name,
+                "phone": client.phone,
+                "email": client.email,
+                "address": client.address,
+                "is_active": client.is_active,
+                "created_at": client.created_at.isoformat(),
+                "updated_at": client.created_at.isoformat()
+            }
+        },
+        "items": [{
+            "id": item.id,
+            "report_id": item.inspection_id,
+            "category": "",
+            "item_name": item.item_name,
+            "status": item.status,
+            "notes": item.notes
+        } for item in items]
+    }
 
 @app.get("/admin/inspections/{inspection_id}")
-async def get_inspection_details(inspection_id: int, db: Session = Depends(get_db)):
+async def get_inspection_details(inspection_id: int, response: Response, db: Session = Depends(get_db)):
     """Get detailed inspection report with items"""
-    inspection = db.query(InspectionReport).filter(
+    inspection = db.query(InspectionReport).options(undefer(InspectionReport.items_json)).filter(
         InspectionReport.id == inspection_id
     ).join(Vehicle).join(Client).first()
     
@@ -892,13 +1212,14 @@ async def get_inspection_details(inspection_id: int, db: Session = Depends(get_d
         raise HTTPException(status_code=404, detail="Inspection not found")
     
     # Get inspection items
-    items = db.query(InspectionItem).filter(
-        InspectionItem.inspection_id == inspection_id
-    ).all()
+    items = report_items(db, inspection)
+    attachments = attachments_by_item(db, [item.id for item in items])
     
+    response.headers["ETag"] = version_etag(inspection.version)
     return {
         "id": inspection.id,
         "vehicle_id": inspection.vehicle_id,
+        "version": inspection.version,
         "inspection_date": inspection.inspection_date.isoformat(),
         "overall_status": inspection.overall_condition,
         "notes": inspection.technician_notes,
@@ -932,13 +1253,15 @@ async def get_inspection_details(inspection_id: int, db: Session = Depends(get_d
             "category": "",
             "item_name": item.item_name,
             "status": item.status,
-            "notes": item.notes
+            "notes": item.notes,
+            "attachments": [attachment_to_dict(attachment, "/admin") for attachment in attachments[item.id]]
         } for item in items]
     }
 
 @app.put("/admin/inspections/{inspection_id}")
-async def update_inspection(inspection_id: int, inspection_data: dict, db: Session = Depends(get_db)):
-    """Update an inspection report"""
+async def update_inspection(inspection_id: int, inspection_data: dict, request: Request, response: Response,
+                            db: Session = Depends(get_db)):
+    """Update an inspection report (409 when it changed since the version being edited)"""
     try:
         # Get existing inspection
         inspection = db.query(InspectionReport).filter(
@@ -947,44 +1270,66 @@ async def update_inspection(inspection_id: int, inspection_data: dict, db: Sessi
         
         if not inspection:
             raise HTTPException(status_code=404, detail="Inspection not found")
+        check_version(inspection, expected_version(request, inspection_data.get("version")), "Inspection")
         
         # Update inspection fields
+        previous_vehicle_id = inspection.vehicle_id
         inspection.vehicle_id = inspection_data["vehicle_id"]
         inspection.inspection_date = datetime.fromisoformat(inspection_data["inspection_date"].replace('Z', '+00:00'))
         inspection.overall_condition = inspection_data["overall_condition"]
         inspection.technician_notes = inspection_data.get("technician_notes")
         inspection.recommendations = inspection_data.get("recommendations")
+        # Compare-and-swap the version before touching the items and their attachments
+        claim_version(db, inspection)
         
-        # Delete existing items and add new ones
-        db.query(InspectionItem).filter(
+        # Replace the items in place: an existing row is matched by id, else by
+        # item name, and updated; unmatched items are added and unmatched rows
+        # deleted, so unchanged items (and their attachments) stay as they are
+        existing = db.query(InspectionItem).filter(
             InspectionItem.inspection_id == inspection_id
-        ).delete()
-        
-        # Add new inspection items if provided
-        if "items" in inspection_data:
-            for item_data in inspection_data["items"]:
-                item = InspectionItem(
+        ).order_by(InspectionItem.id).all()
+        by_id = {item.id: item for item in existing}
+        by_name = {}
+        for item in existing:
+            by_name.setdefault(item.item_name, item)
+        matched = set()
+        for item_data in inspection_data.get("items") or []:
+            item = by_id.get(item_data.get("id")) or by_name.get(item_data["item_name"])
+            if item is None or item.id in matched:
+                db.add(InspectionItem(
                     inspection_id=inspection.id,
                     item_name=item_data["item_name"],
                     status=item_data["status"],
                     notes=item_data.get("notes")
-                )
-                db.add(item)
+                ))
+                continue
+            matched.add(item.id)
+            item.item_name = item_data["item_name"]
+            item.status = item_data["status"]
+            item.notes = item_data.get("notes")
+        removed = [item for item in existing if item.id not in matched]
+        removed_digests = delete_item_attachments(db, [item.id for item in removed])
+        for item in removed:
+            db.delete(item)
         
         db.commit()
+        attachment_store.discard_unreferenced(db, workshop_of(db), removed_digests)
         
         # Get updated items
-        items = db.query(InspectionItem).filter(
-            InspectionItem.inspection_id == inspection_id
-        ).all()
+        items = report_items(db, inspection)
         
         # Get vehicle and client data
         vehicle = db.query(Vehicle).filter(Vehicle.id == inspection.vehicle_id).first()
         client = db.query(Client).filter(Client.id == vehicle.client_id).first()
         
+        publish_change("inspection", "updated", id=inspection.id, vehicle_id=vehicle.id, client_id=client.id,
+                       previous_vehicle_id=previous_vehicle_id)
+        
+        response.headers["ETag"] = version_etag(inspection.version)
         return {
             "id": inspection.id,
             "vehicle_id": inspection.vehicle_id,
+            "version": inspection.version,
             "inspection_date": inspection.inspection_date.isoformat(),
             "overall_status": inspection.overall_condition,
             "notes": inspection.technician_notes,
@@ -1021,6 +1366,12 @@ async def update_inspection(inspection_id: int, inspection_data: dict, db: Sessi
                 "notes": item.notes
             } for item in items]
         }
+    except StaleDataError:
+        # Another edit committed between our read and our write
+        raise stale_conflict(db, InspectionReport, inspection_id, "Inspection")
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1035,93 +1386,176 @@ async def delete_inspection(inspection_id: int, db: Session = Depends(get_db)):
     if not inspection:
         raise HTTPException(status_code=404, detail="Inspection not found")
     
-    # Delete inspection items first (cascade should handle this, but being explicit)
+    # Delete inspection items and their attachments first (cascade should handle this, but being explicit)
+    removed_digests = delete_item_attachments(db, [item_id for (item_id,) in db.query(InspectionItem.id).filter(
+        InspectionItem.inspection_id == inspection_id
+    )])
     db.query(InspectionItem).filter(
         InspectionItem.inspection_id == inspection_id
     ).delete()
     
+    vehicle_id = inspection.vehicle_id
+    client_id = inspection.vehicle.client_id if inspection.vehicle else None
+    
     # Delete inspection report
     db.delete(inspection)
     db.commit()
+    attachment_store.discard_unreferenced(db, workshop_of(db), removed_digests)
     
+    publish_change("inspection", "deleted", id=inspection_id, vehicle_id=vehicle_id, client_id=client_id)
     return {"message": "Inspection deleted successfully"}
 
+# Inspection item attachments
+@app.post("/admin/inspections/{inspection_id}/items/{item_id}/attachments")
+async def upload_item_attachments(inspection_id: int, item_id: int, request: Request, db: Session = Depends(get_db)):
+    """Attach photos, videos or PDFs to an inspection item (multipart/form-data, any number of file parts)"""
+    item = db.query(InspectionItem).filter(
+        InspectionItem.id == item_id,
+        InspectionItem.inspection_id == inspection_id
+    ).first()
+    if not item:
+        raise HTTPException(status_code=404, detail="Inspection item not found")
+    
+    workshop = workshop_of(db)
+    uploads = await attachment_store.receive(request, workshop)
+    try:
+        attachments = [InspectionAttachment(
+            inspection_item_id=item.id,
+            sha256=upload.digest,
+            filename=upload.filename[:255],
+            content_type=upload.content_type,
+            size=upload.size,
+            created_at=datetime.utcnow()
+        ) for upload in uploads]
+        db.add_all(attachments)
+        db.commit()
+    except Exception:
+        db.rollback()
+        attachment_store.discard_uploads(uploads)
+        raise
+    attachment_store.publish(uploads)
+    
+    images = sorted({upload.digest for upload in uploads if upload.content_type in IMAGE_TYPES})
+    if images:
+        job_executor.enqueue("attachment_thumbnails", {"workshop": workshop, "digests": images}, workshop=workshop)
+    
+    vehicle = item.report.vehicle
+    publish_change("inspection", "updated", id=inspection_id, vehicle_id=vehicle.id, client_id=vehicle.client_id)
+    return [attachment_to_dict(attachment, "/admin") for attachment in attachments]
+
+@app.get("/admin/inspections/{inspection_id}/attachments")
+async def get_inspection_attachments(inspection_id: int, db: Session = Depends(get_db)):
+    """Get the attachments of all items of an inspection report"""
+    attachments = db.query(InspectionAttachment).join(InspectionItem).filter(
+        InspectionItem.inspection_id == inspection_id
+    ).order_by(InspectionAttachment.id).all()
+    return [attachment_to_dict(attachment, "/admin") for attachment in attachments]
+
+@app.get("/admin/attachments/{attachment_id}")
+async def download_attachment(attachment_id: int, request: Request, db: Session = Depends(get_db)):
+    """Download an attachment (supports Range requests)"""
+    return attachment_response(request, get_attachment_or_404(db, attachment_id), workshop_of(db))
+
+@app.get("/admin/attachments/{attachment_id}/thumbnail")
+async def download_attachment_thumbnail(attachment_id: int, request: Request, db: Session = Depends(get_db)):
+    """Download the thumbnail of a photo attachment"""
+    return attachment_response(request, get_attachment_or_404(db, attachment_id), workshop_of(db), thumbnail=True)
+
+@app.delete("/admin/attachments/{attachment_id}")
+async def delete_attachment(attachment_id: int, db: Session = Depends(get_db)):
+    """Delete an attachment; its file is removed when no other attachment has the same content"""
+    attachment = get_attachment_or_404(db, attachment_id)
+    vehicle = attachment.item.report.vehicle
+    inspection_id = attachment.item.inspection_id
+    digest = attachment.sha256
+    db.delete(attachment)
+    db.commit()
+    attachment_store.discard_unreferenced(db, workshop_of(db), [digest])
+    
+    publish_change("inspection", "updated", id=inspection_id, vehicle_id=vehicle.id, client_id=vehicle.client_id)
+    return {"message": "Attachment deleted successfully"}
+
 @app.get("/admin/vehicles/{vehicle_id}/inspections")
 async def get_vehicle_inspections(vehicle_id: int, db: Session = Depends(get_db)):
     """Get available inspections for a specific vehicle that can be linked to services"""
-    vehicle = db.query(Vehicle).filter(Vehicle.id == vehicle_id).first()
+    vehicle = db.query(Vehicle.id).filter(Vehicle.id == vehicle_id).first()
     if not vehicle:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     
-    inspections = db.query(InspectionReport).filter(
+    # The service an inspection is linked to, if any, comes back with the inspection itself
+    linked_service_id = select(func.min(DBServiceRecord.id)).where(
+        DBServiceRecord.linked_inspection_id == InspectionReport.id
+    ).correlate(InspectionReport).scalar_subquery()
+    
+    inspections = db.query(InspectionReport, linked_service_id).filter(
         InspectionReport.vehicle_id == vehicle_id
     ).order_by(InspectionReport.inspection_date.desc()).all()
     
-    result = []
-    for inspection in inspections:
-        # Check if this inspection is already linked to a service
-        linked_service = db.query(DBServiceRecord).filter(
-            DBServiceRecord.linked_inspection_id == inspection.id
-        ).first()
-        
-        result.append({
+    return [
+        {
             "id": inspection.id,
             "inspection_date": inspection.inspection_date.isoformat(),
             "overall_condition": inspection.overall_condition,
             "technician_notes": inspection.technician_notes or "",
-            "is_linked": linked_service is not None,
-            "linked_service_id": linked_service.id if linked_service else None
-        })
-    
-    return result
+            "is_linked": service_id is not None,
+            "linked_service_id": service_id
+        }
+        for inspection, service_id in inspections
+    ]
 
 # ===== ADMIN SERVICE RECORDS MANAGEMENT =====
 
+def _vehicle_info(service):
+    vehicle = service.vehicle
+    return f"{vehicle.make} {vehicle.model} ({vehicle.license_plate})" if vehicle else "Unknown Vehicle"
+
+def _client_name(service):
+    client = service.vehicle.owner if service.vehicle else None
+    return client.name if client else "Unknown Client"
+
+# Admin service list fields - vehicle and client are only read for the summary fields
+ADMIN_SERVICE_RESOURCE = Resource(DBServiceRecord, {
+    "id": Field(DBServiceRecord.id),
+    "vehicle_id": Field(DBServiceRecord.vehicle_id),
+    "vehicle_info": Field(get=_vehicle_info, needs=("vehicle",)),
+    "client_name": Field(get=_client_name, needs=("vehicle.client",)),
+    "client_id": Field(get=lambda service: service.vehicle.client_id if service.vehicle else None, needs=("vehicle",)),
+    "service_type": Field(get=_service_summary, needs=("service_items",)),
+    "description": Field(
+        get=lambda service: f"{len(service.service_items)} service(s): {_service_summary(service)}",
+        needs=("service_items",)
+    ),
+    "cost": Field(DBServiceRecord.total_cost),
+    "service_date": Field(DBServiceRecord.service_date, get=_iso(DBServiceRecord.service_date)),
+    "status": Field(DBServiceRecord.status),
+    "technician_notes": Field(DBServiceRecord.technician_notes),
+    "version": Field(DBServiceRecord.version),
+    "created_at": Field(DBServiceRecord.created_at, get=_iso(DBServiceRecord.created_at)),
+    "vehicle": Embed(DBServiceRecord.vehicle, Resource(Vehicle, {
+        "make": Field(Vehicle.make),
+        "model": Field(Vehicle.model),
+        "license_plate": Field(Vehicle.license_plate),
+        "client_id": Field(Vehicle.client_id),
+        "client": Embed(Vehicle.owner, Resource(Client, {"name": Field(Client.name)}), hidden=True)
+    }), hidden=True),
+    "service_items": Embed(DBServiceRecord.service_items, Resource(ServiceItem, {
+        "id": Field(ServiceItem.id),
+        "service_type": Field(ServiceItem.service_type),
+        "service_name": Field(ServiceItem.service_name),
+        "description": Field(ServiceItem.description),
+        "price": Field(ServiceItem.price)
+    }), many=True)
+})
+
 @app.get("/admin/services")
-async def get_all_service_records(db: Session = Depends(get_db)):
+async def get_all_service_records(
+    selection: FieldSelection = Depends(sparse_fields(ADMIN_SERVICE_RESOURCE)),
+    db: Session = Depends(get_db)
+):
     """Get all service records for admin management"""
-    services = db.query(DBServiceRecord).all()
-    
-    result = []
-    for service in services:
-        # Get vehicle and client data using relationships
-        vehicle = db.query(Vehicle).filter(Vehicle.id == service.vehicle_id).first()
-        client = None
-        if vehicle:
-            client = db.query(Client).filter(Client.id == vehicle.client_id).first()
-        
-        # Get service items
-        service_items = db.query(ServiceItem).filter(
-            ServiceItem.service_record_id == service.id
-        ).all()
-        
-        # Create service type summary from items
-        service_types = [item.service_name for item in service_items]
-        service_type_summary = ", ".join(service_types) if service_types else "General Service"
-        
-        result.append({
-            "id": service.id,
-            "vehicle_id": service.vehicle_id,
-            "vehicle_info": f"{vehicle.make} {vehicle.model} ({vehicle.license_plate})" if vehicle else "Unknown Vehicle",
-            "client_name": client.name if client else "Unknown Client",
-            "client_id": vehicle.client_id if vehicle else None,
-            "service_type": service_type_summary,
-            "description": f"{len(service_items)} service(s): {service_type_summary}",
-            "cost": service.total_cost,
-            "service_date": service.service_date.isoformat(),
-            "status": service.status,
-            "technician_notes": service.technician_notes,
-            "created_at": service.created_at.isoformat(),
-            "service_items": [{
-                "id": item.id,
-                "service_type": item.service_type,
-                "service_name": item.service_name,
-                "description": item.description,
-                "price": item.price
-            } for item in service_items]
-        })
+    services = db.query(DBServiceRecord).options(*ADMIN_SERVICE_RESOURCE.loader_options(selection)).all()
     
-    return result
+    return [ADMIN_SERVICE_RESOURCE.serialize(service, selection) for service in services]
 
 @app.post("/admin/services")
 async def create_service_record(service_data: dict, db: Session = Depends(get_db)):
@@ -1155,6 +1589,10 @@ async def create_service_record(service_data: dict, db: Session = Depends(get_db
         
         db.commit()
         
+        vehicle = db.query(Vehicle).filter(Vehicle.id == service.vehicle_id).first()
+        publish_change("service_record", "created", id=service.id, vehicle_id=service.vehicle_id,
+                       client_id=vehicle.client_id if vehicle else None, status=service.status)
+        
         return {
             "id": service.id,
             "message": "Service record created successfully"
@@ -1182,7 +1620,7 @@ async def get_service_details(service_id: int, db: Session = Depends(get_db)):
     # Get service items
     service_items = db.query(ServiceItem).filter(
         ServiceItem.service_record_id == service.id
-    ).all()
+    ).order_by(ServiceItem.id).all()
     
     # Create service type summary from items
     service_types = [item.service_name for item in service_items]
@@ -1220,23 +1658,35 @@ async def delete_service_record(service_id: int, db: Session = Depends(get_db)):
     if not service:
         raise HTTPException(status_code=404, detail="Service record not found")
     
+    vehicle_id = service.vehicle_id
+    client_id = service.vehicle.client_id if service.vehicle else None
+    
     # Service items will be deleted automatically due to cascade
     db.delete(service)
     db.commit()
     
+    publish_change("service_record", "deleted", id=service_id, vehicle_id=vehicle_id, client_id=client_id)
     return {"message": "Service record deleted successfully"}
 
 if __name__ == "__main__":
     import uvicorn
     print("\n🚗 EvMaster Workshop API Starting...")
     print("📍 Backend will be accessible at:")
-    print("   • Localhost: http://localhost:8000")
+    print(f"   • Localhost: http://localhost:{API_PORT}")
     print("   • MacBook IP: http://192.168.100.126:8000 (for iPhone/physical devices)")
     print("   • Android Emulator: http://10.0.2.2:8000")
-    print("   • API Docs: http://localhost:8000/docs")
-    print("   • Health Check: http://localhost:8000/health")
+    print(f"   • API Docs: http://localhost:{API_PORT}/docs")
+    print(f"   • Health Check: http://localhost:{API_PORT}/health")
     print("\n📱 iPhone App Configuration:")
     print("   • iOS will automatically use: http://192.168.100.126:8000")
     print("\n🔄 Starting server...\n")
     
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if WEB_WORKERS > 1:
+        # Prepare the database once, then let every worker skip it
+        prepare_database()
+        job_executor.requeue_interrupted()
+        os.environ[DATABASE_PREPARED_ENV] = "1"
+        print(f"👥 Starting {WEB_WORKERS} workers (invalidation bus: {type(invalidation_bus).__name__})")
+        uvicorn.run("main:app", host="0.0.0.0", port=API_PORT, workers=WEB_WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=API_PORT)
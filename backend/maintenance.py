@@ -0,0 +1,380 @@
+"""SQLite maintenance: statistics, incremental vacuum, integrity checks and hot backups.
+
+Every run reports the file size, page and freelist counts before and after,
+and the duration of each task. Backups use the SQLite online backup API in
+small page steps with a pause in between, so the database stays writable while
+it is copied.
+
+Every workshop's SQLite database is maintained on its own, with its own state
+and lock file next to it and backups named after the workshop. Runs from the
+command line (e.g. from cron; every workshop unless --workshop is given), as
+the "db_maintenance" background job of a workshop (POST /admin/db/maintenance)
+or on a schedule inside the API when MAINTENANCE_INTERVAL_HOURS is set:
+    python maintenance.py run                  # the MAINTENANCE_TASKS
+    python maintenance.py backup --dest /backups
+    python maintenance.py integrity --full --workshop north
+    python maintenance.py vacuum --full        # blocking VACUUM, enables incremental vacuum
+    python maintenance.py status
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from database import shard_router
+from jobs import job_executor
+from shards import UnknownWorkshop, workshop_of
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Maintenance settings
+MAINTENANCE_TASKS = [t.strip() for t in os.getenv("MAINTENANCE_TASKS", "optimize,vacuum,integrity,backup").split(",") if t.strip()]
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv("MAINTENANCE_INTERVAL_HOURS", "0"))  # 0 = no scheduler in the API
+VACUUM_MAX_PAGES = int(os.getenv("VACUUM_MAX_PAGES", "2000"))     # freelist pages returned per incremental vacuum
+BACKUP_DIR = os.getenv("BACKUP_DIR", "")                            # default: backups/ next to the database
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))                    # newest backups kept, 0 = keep all
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", "0.05"))  # seconds between steps, lets writers in
+
+MAINTENANCE_HISTORY = 20  # reports kept in the state file
+
+
+class MaintenanceError(Exception):
+    """Maintenance cannot run against this database"""
+
+
+def database_path(workshop: Optional[str] = None) -> str:
+    engine = shard_router.engine(workshop)
+    if engine.dialect.name != "sqlite":
+        raise MaintenanceError(f"Maintenance commands support SQLite only (database is {engine.dialect.name})")
+    path = engine.url.database
+    if not path or path == ":memory:" or "mode=memory" in str(engine.url):
+        raise MaintenanceError("Maintenance needs a file database")
+    return os.path.abspath(path)
+
+
+def sqlite_workshops() -> List[str]:
+    """Workshops whose database is a SQLite file, default first"""
+    workshops = []
+    for workshop in shard_router.workshops():
+        try:
+            database_path(workshop)
+        except MaintenanceError:
+            continue
+        workshops.append(workshop)
+    return workshops
+
+
+def _state_path(workshop: Optional[str] = None) -> str:
+    return database_path(workshop) + ".maintenance.json"
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # Its own connection in autocommit mode: VACUUM and the backup API cannot run inside a transaction
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    connection.execute("PRAGMA busy_timeout = 30000")
+    return connection
+
+
+def _pragma(connection: sqlite3.Connection, name: str):
+    return connection.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def file_stats(connection: sqlite3.Connection, path: str) -> dict:
+    page_size = _pragma(connection, "page_size")
+    freelist = _pragma(connection, "freelist_count")
+    size = sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+    return {
+        "file_bytes": size,
+        "page_size": page_size,
+        "page_count": _pragma(connection, "page_count"),
+        "freelist_pages": freelist,
+        "freelist_bytes": freelist * page_size,
+        "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(_pragma(connection, "auto_vacuum")),
+        "journal_mode": _pragma(connection, "journal_mode")
+    }
+
+
+# Tasks - each takes (connection, path, options) and returns details for the report
+
+def task_optimize(connection, path, options) -> dict:
+    """Refresh query planner statistics (ANALYZE, then PRAGMA optimize)"""
+    # A fresh connection has run no queries, so PRAGMA optimize alone would skip every table;
+    # analysis_limit keeps ANALYZE to a sample of each index unless --full is given
+    limit = 0 if options.get("full") else 1000
+    connection.execute(f"PRAGMA analysis_limit = {limit}")
+    connection.execute("ANALYZE")
+    connection.execute("PRAGMA optimize")
+    analyzed = connection.execute("SELECT COUNT(DISTINCT tbl) FROM sqlite_stat1").fetchone()[0]
+    return {"analysis_limit": limit or None, "tables_analyzed": analyzed}
+
+
+def task_vacuum(connection, path, options) -> dict:
+    """Return free pages to the file system"""
+    if options.get("full"):
+        # Rewrites the whole file and blocks writers meanwhile; switches the file to incremental mode
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.execute("VACUUM")
+        return {"mode": "full"}
+    if _pragma(connection, "auto_vacuum") != 2:
+        return {"mode": "skipped", "reason": "auto_vacuum is not incremental - run 'maintenance.py vacuum --full' once"}
+    freed = _pragma(connection, "freelist_count")
+    connection.execute(f"PRAGMA incremental_vacuum({VACUUM_MAX_PAGES})").fetchall()
+    return {"mode": "incremental", "pages_freed": freed - _pragma(connection, "freelist_count")}
+
+
+def task_integrity(connection, path, options) -> dict:
+    """PRAGMA quick_check (or the slower integrity_check with --full)"""
+    check = "integrity_check" if options.get("full") else "quick_check"
+    problems = [row[0] for row in connection.execute(f"PRAGMA {check}(100)").fetchall()]
+    ok = problems == ["ok"]
+    foreign_keys = connection.execute("PRAGMA foreign_key_check").fetchall()
+    return {
+        "check": check,
+        "ok": ok and not foreign_keys,
+        "problems": [] if ok else problems,
+        "foreign_key_violations": len(foreign_keys)
+    }
+
+
+def task_backup(connection, path, options) -> dict:
+    """Online copy through the backup API, verified and rotated"""
+    directory = options.get("dest") or BACKUP_DIR or os.path.join(os.path.dirname(path), "backups")
+    os.makedirs(directory, exist_ok=True)
+    name, _ = os.path.splitext(os.path.basename(path))
+    name = f"{name}-{options['workshop']}"
+    target_path = os.path.join(directory, f"{name}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.db")
+    temporary = target_path + ".tmp"
+
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+
+    target = sqlite3.connect(temporary)
+    try:
+        # Copies BACKUP_PAGES_PER_STEP pages, releases the read lock and sleeps, until done
+        connection.backup(target, pages=BACKUP_PAGES_PER_STEP, progress=progress, sleep=BACKUP_STEP_SLEEP)
+        verified = target.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+    finally:
+        target.close()
+    if not verified:
+        os.remove(temporary)
+        raise MaintenanceError("Backup copy failed its integrity check")
+    os.replace(temporary, target_path)
+
+    removed = []
+    if BACKUP_KEEP > 0:
+        backups = sorted(
+            entry for entry in os.listdir(directory)
+            if entry.startswith(f"{name}-") and entry.endswith(".db")
+        )
+        for entry in backups[:-BACKUP_KEEP]:
+            os.remove(os.path.join(directory, entry))
+            removed.append(entry)
+
+    return {
+        "file": target_path,
+        "bytes": os.path.getsize(target_path),
+        "steps": steps,
+        "pages_per_step": BACKUP_PAGES_PER_STEP,
+        "rotated_out": removed
+    }
+
+
+TASKS: Dict[str, Callable] = {
+    "optimize": task_optimize,
+    "vacuum": task_vacuum,
+    "integrity": task_integrity,
+    "backup": task_backup
+}
+
+
+def run_maintenance(tasks: Optional[List[str]] = None, workshop: Optional[str] = None, **options) -> dict:
+    """Run maintenance tasks in order on a workshop's database (default: the default workshop)
+    and return the report (also stored in the workshop's state file)"""
+    tasks = tasks or MAINTENANCE_TASKS
+    unknown = [task for task in tasks if task not in TASKS]
+    if unknown:
+        raise MaintenanceError(f"Unknown maintenance tasks: {', '.join(unknown)}")
+
+    workshop = shard_router.resolve(workshop)
+    options["workshop"] = workshop
+    path = database_path(workshop)
+    started = time.perf_counter()
+    report = {"workshop": workshop, "database": path, "started_at": datetime.utcnow().isoformat(), "ok": True, "tasks": []}
+    connection = _connect(path)
+    try:
+        report["before"] = file_stats(connection, path)
+        for task in tasks:
+            task_started = time.perf_counter()
+            entry = {"task": task}
+            try:
+                entry.update(TASKS[task](connection, path, options))
+                entry.setdefault("ok", True)
+            except (sqlite3.Error, OSError, MaintenanceError) as e:
+                entry.update(ok=False, error=str(e))
+            entry["duration_ms"] = round((time.perf_counter() - task_started) * 1000, 1)
+            report["ok"] = report["ok"] and entry["ok"]
+            report["tasks"].append(entry)
+        report["after"] = file_stats(connection, path)
+    finally:
+        connection.close()
+    report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    _save_report(workshop, report)
+    return report
+
+
+def _load_state(workshop: Optional[str] = None) -> dict:
+    try:
+        with open(_state_path(workshop), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"reports": []}
+
+
+def _save_report(workshop: str, report: dict):
+    state = _load_state(workshop)
+    state["reports"] = (state.get("reports", []) + [report])[-MAINTENANCE_HISTORY:]
+    state["last_run_at"] = report["started_at"]
+    temporary = _state_path(workshop) + f".{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(temporary, _state_path(workshop))
+
+
+def maintenance_status(workshop: Optional[str] = None) -> dict:
+    """Current file statistics and the most recent reports of a workshop's database"""
+    workshop = shard_router.resolve(workshop)
+    path = database_path(workshop)
+    connection = _connect(path)
+    try:
+        stats = file_stats(connection, path)
+    finally:
+        connection.close()
+    state = _load_state(workshop)
+    return {"workshop": workshop, "database": path, "current": stats, "last_run_at": state.get("last_run_at"),
+            "reports": state["reports"][::-1]}
+
+
+class MaintenanceScheduler:
+    """Runs the MAINTENANCE_TASKS on every workshop's SQLite database every interval from a background thread.
+
+    Every web worker runs a scheduler, but a run only starts while holding the
+    database's exclusive lock file and when its state file shows that the
+    interval has elapsed, so a deployment performs each run once.
+    """
+
+    def __init__(self, interval_hours: float = MAINTENANCE_INTERVAL_HOURS):
+        self.interval = timedelta(hours=interval_hours)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _due(self, workshop: str) -> bool:
+        last_run = _load_state(workshop).get("last_run_at")
+        return last_run is None or datetime.utcnow() - datetime.fromisoformat(last_run) >= self.interval
+
+    def run_if_due(self, workshop: Optional[str] = None) -> Optional[dict]:
+        workshop = shard_router.resolve(workshop)
+        with open(database_path(workshop) + ".maintenance.lock", "w") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None  # Another worker is running maintenance
+            if not self._due(workshop):
+                return None
+            report = run_maintenance(workshop=workshop)
+            print(f"🧹 Database maintenance of {workshop} {'finished' if report['ok'] else 'finished with errors'} "
+                  f"in {report['duration_ms'] / 1000:.1f}s")
+            return report
+
+    def _run(self):
+        # Check a few times per interval, so a missed run (e.g. after a restart) happens soon
+        check_every = min(self.interval.total_seconds() / 4, 900)
+        while not self._stopped.wait(check_every):
+            for workshop in sqlite_workshops():
+                try:
+                    self.run_if_due(workshop)
+                except Exception as e:
+                    print(f"⚠️ Database maintenance of {workshop} failed: {e}")
+
+    def start(self):
+        """Start the scheduler thread (only for SQLite file databases with an interval set)"""
+        if self._thread is not None or self.interval <= timedelta(0):
+            return
+        if not sqlite_workshops():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# Scheduler used by the API process
+maintenance_scheduler = MaintenanceScheduler()
+
+
+@job_executor.register("db_maintenance")
+def db_maintenance_job(db, payload: dict):
+    """Background job: run maintenance tasks (default: MAINTENANCE_TASKS) on the job's workshop"""
+    return run_maintenance(payload.get("tasks"), workshop=workshop_of(db), full=payload.get("full", False))
+
+
+def _print_report(report: dict):
+    before, after = report["before"], report["after"]
+    print(f"🗄️  {report['workshop']}: {report['database']}")
+    for entry in report["tasks"]:
+        details = {k: v for k, v in entry.items() if k not in ("task", "ok", "duration_ms")}
+        print(f"   {'✅' if entry['ok'] else '❌'} {entry['task']:<10} {entry['duration_ms']:>9.1f} ms  {details}")
+    print(f"   size {before['file_bytes']:,} → {after['file_bytes']:,} bytes, "
+          f"freelist {before['freelist_pages']} → {after['freelist_pages']} pages, "
+          f"total {report['duration_ms']:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "status"] + list(TASKS))
+    parser.add_argument("--full", action="store_true", help="full ANALYZE, blocking VACUUM or integrity_check")
+    parser.add_argument("--dest", help="backup directory (default: BACKUP_DIR or backups/ next to the database)")
+    parser.add_argument("--workshop", help="only this workshop's database (default: every SQLite workshop database)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        workshops = [shard_router.resolve(args.workshop)] if args.workshop else sqlite_workshops()
+        if not workshops:
+            raise MaintenanceError("No workshop uses a SQLite file database")
+        if args.command == "status":
+            results = {workshop: maintenance_status(workshop) for workshop in workshops}
+            print(json.dumps(results if args.json else {w: r["current"] for w, r in results.items()}, indent=2))
+            return 0
+        tasks = None if args.command == "run" else [args.command]
+        reports = [run_maintenance(tasks, workshop=workshop, full=args.full, dest=args.dest) for workshop in workshops]
+    except (MaintenanceError, UnknownWorkshop) as e:
+        print(f"❌ {e}")
+        return 2
+    if args.json:
+        print(json.dumps({report["workshop"]: report for report in reports}, indent=2))
+    else:
+        for report in reports:
+            _print_report(report)
+    return 0 if all(report["ok"] for report in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
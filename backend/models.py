@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Index, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 
 Base = declarative_base()
@@ -36,7 +36,7 @@ class Vehicle(Base):
     __tablename__ = "vehicles"
     
     id = Column(Integer, primary_key=True, index=True)
-    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False)
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False, index=True)
     make = Column(String, nullable=False)
     model = Column(String, nullable=False)
     year = Column(Integer, nullable=False)
@@ -45,6 +45,8 @@ class Vehicle(Base):
     color = Column(String, nullable=True)
     mileage = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(Integer, index=True, default=0, server_default="0")  # Delta-sync position, see sync.py
     
     owner = relationship("Client", back_populates="vehicles")
     services = relationship("ServiceRecord", back_populates="vehicle")
@@ -52,22 +54,35 @@ class Vehicle(Base):
 
 class ServiceRecord(Base):
     __tablename__ = "service_records"
+    __table_args__ = (
+        # Admin list filters (see listing.py): per vehicle or status, newest first
+        Index("ix_service_records_vehicle_date", "vehicle_id", "service_date"),
+        Index("ix_service_records_status_date", "status", "service_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=False)
-    service_date = Column(DateTime, nullable=False)
+    service_date = Column(DateTime, nullable=False, index=True)
     status = Column(String, default="completed")  # pending, in_progress, completed
     technician_notes = Column(Text, nullable=True)
     total_cost = Column(Float, nullable=False, default=0.0)
-    linked_inspection_id = Column(Integer, ForeignKey("inspection_reports.id"), nullable=True)  # Link to inspection if service includes inspection
+    linked_inspection_id = Column(Integer, ForeignKey("inspection_reports.id"), nullable=True, index=True)  # Link to inspection if service includes inspection
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(Integer, index=True, default=0, server_default="0")
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Optimistic concurrency, see concurrency.py
+    
+    __mapper_args__ = {"version_id_col": version}
     
     vehicle = relationship("Vehicle", back_populates="services")
-    service_items = relationship("ServiceItem", back_populates="service_record", cascade="all, delete-orphan")
+    service_items = relationship("ServiceItem", back_populates="service_record", cascade="all, delete-orphan", order_by="ServiceItem.id")
     linked_inspection = relationship("InspectionReport", post_update=True, foreign_keys=[linked_inspection_id])
 
 class ServiceItem(Base):
     __tablename__ = "service_items"
+    __table_args__ = (
+        Index("ix_service_items_record_type", "service_record_id", "service_type"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     service_record_id = Column(Integer, ForeignKey("service_records.id"), nullable=False)
@@ -76,35 +91,66 @@ class ServiceItem(Base):
     description = Column(Text, nullable=True)
     price = Column(Float, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(Integer, default=0, server_default="0")
     
     service_record = relationship("ServiceRecord", back_populates="service_items")
 
 class InspectionReport(Base):
     __tablename__ = "inspection_reports"
+    __table_args__ = (
+        Index("ix_inspection_reports_vehicle_date", "vehicle_id", "inspection_date"),
+        Index("ix_inspection_reports_condition_date", "overall_condition", "inspection_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=False)
-    inspection_date = Column(DateTime, nullable=False)
+    inspection_date = Column(DateTime, nullable=False, index=True)
     overall_condition = Column(String, nullable=False)  # excellent, good, fair, poor
     technician_notes = Column(Text, nullable=True)
     recommendations = Column(Text, nullable=True)
     linked_service_record_id = Column(Integer, ForeignKey("service_records.id"), nullable=True)  # Link to service if inspection was part of service
+    items_json = deferred(Column(Text, nullable=True))  # Compact copy of the item rows, maintained by inspectiondocs.py
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(Integer, index=True, default=0, server_default="0")
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Optimistic concurrency, see concurrency.py
+    
+    __mapper_args__ = {"version_id_col": version}
     
     vehicle = relationship("Vehicle", back_populates="inspections")
-    items = relationship("InspectionItem", back_populates="report")
+    items = relationship("InspectionItem", back_populates="report", order_by="InspectionItem.id")
     linked_service = relationship("ServiceRecord", post_update=True, foreign_keys=[linked_service_record_id])
 
 class InspectionItem(Base):
     __tablename__ = "inspection_items"
+    __table_args__ = (
+        Index("ix_inspection_items_inspection_status", "inspection_id", "status"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     inspection_id = Column(Integer, ForeignKey("inspection_reports.id"), nullable=False)
     item_name = Column(String, nullable=False)  # Engine Oil, Tire Pressure, etc.
     status = Column(String, nullable=False)  # good, needs_attention, replace
     notes = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    change_seq = Column(Integer, default=0, server_default="0")
     
     report = relationship("InspectionReport", back_populates="items")
+    attachments = relationship("InspectionAttachment", back_populates="item")
+
+class InspectionAttachment(Base):
+    __tablename__ = "inspection_attachments"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    inspection_item_id = Column(Integer, ForeignKey("inspection_items.id"), nullable=False, index=True)
+    sha256 = Column(String(64), nullable=False, index=True)  # Content address of the stored file, see attachments.py
+    filename = Column(String, nullable=False)  # As uploaded
+    content_type = Column(String, nullable=False)  # Detected from the content
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    item = relationship("InspectionItem", back_populates="attachments")
 
 class FAQ(Base):
     __tablename__ = "faqs"
@@ -119,3 +165,70 @@ class FAQ(Base):
     is_active = Column(Boolean, default=True)   # Enable/disable FAQ
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class Booking(Base):
+    __tablename__ = "bookings"
+    __table_args__ = (
+        # A bay can only hold one confirmed booking per slot - this is what prevents double booking
+        Index(
+            "uq_bookings_confirmed_slot_bay", "slot_start", "bay", unique=True,
+            sqlite_where=text("status = 'confirmed'"),
+            postgresql_where=text("status = 'confirmed'")
+        ),
+        Index("ix_bookings_slot_status", "slot_start", "status"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    client_id = Column(Integer, ForeignKey("clients.id"), nullable=False, index=True)
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=True)
+    slot_start = Column(DateTime, nullable=False)  # Workshop local time of the slot
+    bay = Column(Integer, nullable=False)          # Service bay number, 1..WORKSHOP_BAYS
+    service = Column(String, nullable=False)
+    status = Column(String, default="confirmed")  # confirmed, cancelled
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    client = relationship("Client")
+    vehicle = relationship("Vehicle")
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String, nullable=False)
+    payload = Column(Text, nullable=True)          # JSON encoded handler arguments
+    status = Column(String, default="queued", index=True)  # queued, running, succeeded, failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    result = Column(Text, nullable=True)           # JSON encoded handler result
+    error = Column(Text, nullable=True)
+    progress = Column(Text, nullable=True)         # JSON {"done", "total", "message"} from report_progress()
+    workshop = Column(String, nullable=True)       # Shard the handler works on, None for the default workshop
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class SyncCounter(Base):
+    __tablename__ = "sync_counter"
+    
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)  # Last change sequence number handed out
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    entity = Column(String, nullable=False)     # vehicle, service_record, inspection
+    entity_id = Column(Integer, nullable=False)
+    client_id = Column(Integer, nullable=True, index=True)
+    change_seq = Column(Integer, nullable=False, index=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+class InvalidationEvent(Base):
+    __tablename__ = "invalidation_events"
+    __table_args__ = {"sqlite_autoincrement": True}  # Ids must never be reused, workers poll by id
+    
+    id = Column(Integer, primary_key=True)
+    origin = Column(String, nullable=False)       # Publishing worker, see invalidation.py
+    event_type = Column(String, nullable=False)
+    data = Column(Text, nullable=True)            # JSON encoded event data
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,396 @@
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, Response
+from datetime import datetime
+from typing import Dict, Optional
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+
+from jobs import job_executor
+from shards import DEFAULT_WORKSHOP
+
+# Optional PDF stack - reportlab draws the document, arabic_reshaper and python-bidi
+# turn Arabic text into joined glyphs in visual (right-to-left) order
+try:
+    import reportlab
+except ImportError:
+    reportlab = None
+
+try:
+    import arabic_reshaper
+    from bidi.algorithm import get_display
+except ImportError:
+    arabic_reshaper = None
+    get_display = None
+
+# PDF settings
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf_cache"))
+PDF_FONT_PATH = os.getenv("PDF_FONT_PATH", "")  # TTF with Arabic glyphs, e.g. NotoNaskhArabic-Regular.ttf
+PDF_FONT_CANDIDATES = (
+    "/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansArabic-Regular.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+)
+
+# Bump when the layout changes so cached documents are rendered again
+PDF_RENDERER_VERSION = 1
+
+PDF_LANGUAGES = ("en", "ar")
+
+ARABIC_TEXT = re.compile(r"[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]")
+
+LABELS = {
+    "en": {
+        "title": "Vehicle Inspection Report",
+        "report": "Report",
+        "date": "Inspection date",
+        "client": "Client",
+        "vehicle": "Vehicle",
+        "plate": "License plate",
+        "vin": "VIN",
+        "overall": "Overall condition",
+        "item": "Item",
+        "status": "Status",
+        "notes": "Notes",
+        "technician_notes": "Technician notes",
+        "recommendations": "Recommendations",
+        "no_items": "No inspection items recorded.",
+        "workshop": "EV Master Workshop"
+    },
+    "ar": {
+        "title": "تقرير فحص المركبة",
+        "report": "التقرير",
+        "date": "تاريخ الفحص",
+        "client": "العميل",
+        "vehicle": "المركبة",
+        "plate": "رقم اللوحة",
+        "vin": "رقم الهيكل",
+        "overall": "الحالة العامة",
+        "item": "البند",
+        "status": "الحالة",
+        "notes": "ملاحظات",
+        "technician_notes": "ملاحظات الفني",
+        "recommendations": "التوصيات",
+        "no_items": "لا توجد بنود فحص مسجلة.",
+        "workshop": "ورشة إي في ماستر"
+    }
+}
+
+STATUS_LABELS = {
+    "en": {
+        "excellent": "Excellent", "good": "Good", "fair": "Fair", "poor": "Poor",
+        "needs_attention": "Needs attention", "replace": "Replace"
+    },
+    "ar": {
+        "excellent": "ممتازة", "good": "جيدة", "fair": "مقبولة", "poor": "سيئة",
+        "needs_attention": "تحتاج إلى انتباه", "replace": "يجب الاستبدال"
+    }
+}
+
+STATUS_COLORS = {
+    "excellent": "#15803d", "good": "#15803d", "fair": "#ca8a04",
+    "needs_attention": "#ca8a04", "poor": "#b91c1c", "replace": "#b91c1c"
+}
+
+
+class PdfUnavailable(Exception):
+    """PDF rendering is not possible with the installed packages or fonts"""
+
+
+def pdf_language(lang: Optional[str]) -> str:
+    return lang if lang in PDF_LANGUAGES else "en"
+
+
+def inspection_document(inspection, items, vehicle, client_name: str, lang: str, workshop: Optional[str] = None) -> dict:
+    """Everything printed on an inspection PDF, as plain (picklable, hashable) data"""
+    document = {
+        "lang": lang,
+        "inspection_id": inspection.id,
+        "inspection_date": inspection.inspection_date.isoformat(),
+        "overall_condition": inspection.overall_condition,
+        "technician_notes": inspection.technician_notes,
+        "recommendations": inspection.recommendations,
+        "client_name": client_name,
+        "vehicle": {
+            "make": vehicle.make,
+            "model": vehicle.model,
+            "year": vehicle.year,
+            "license_plate": vehicle.license_plate,
+            "vin": vehicle.vin
+        },
+        "items": [
+            {"item_name": item.item_name, "status": item.status, "notes": item.notes}
+            for item in items
+        ]
+    }
+    if workshop and workshop != DEFAULT_WORKSHOP:
+        document["workshop"] = workshop  # Inspection ids repeat across workshop databases
+    return document
+
+
+def document_hash(document: dict) -> str:
+    """Content hash of a document - changes whenever the printed content or layout would"""
+    canonical = json.dumps({"version": PDF_RENDERER_VERSION, "document": document}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def find_font() -> Optional[str]:
+    if PDF_FONT_PATH:
+        return PDF_FONT_PATH
+    for candidate in PDF_FONT_CANDIDATES:
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def check_available(document: dict):
+    """Raise PdfUnavailable when this document cannot be rendered here"""
+    if reportlab is None:
+        raise PdfUnavailable("PDF rendering requires the reportlab package")
+    needs_arabic = document["lang"] == "ar" or ARABIC_TEXT.search(json.dumps(document, ensure_ascii=False))
+    if needs_arabic:
+        if arabic_reshaper is None:
+            raise PdfUnavailable("Arabic PDF rendering requires the arabic-reshaper and python-bidi packages")
+        if find_font() is None:
+            raise PdfUnavailable("Arabic PDF rendering requires a TTF font with Arabic glyphs (PDF_FONT_PATH)")
+
+
+# Rendering - runs in the job executor's process pool
+
+_registered_font = None
+
+
+def _font_name() -> str:
+    """Register the Unicode font once per process; Helvetica when none is installed"""
+    global _registered_font
+    if _registered_font is None:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        path = find_font()
+        if path:
+            pdfmetrics.registerFont(TTFont("ReportFont", path))
+            _registered_font = "ReportFont"
+        else:
+            _registered_font = "Helvetica"
+    return _registered_font
+
+
+def _shape(text) -> str:
+    """Arabic letters joined and reordered for left-to-right drawing; other text unchanged.
+
+    The paragraph direction follows the text itself, so English notes in an Arabic
+    report keep their punctuation where it belongs.
+    """
+    text = "" if text is None else str(text)
+    if get_display is None or not ARABIC_TEXT.search(text):
+        return text
+    return get_display(arabic_reshaper.reshape(text))
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def render_inspection_pdf(document: dict) -> bytes:
+    """Draw an inspection report; Arabic documents are laid out right to left"""
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_LEFT, TA_RIGHT
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    lang = document["lang"]
+    rtl = lang == "ar"
+    labels = LABELS[lang]
+    statuses = STATUS_LABELS[lang]
+    font = _font_name()
+    align = TA_RIGHT if rtl else TA_LEFT
+
+    def style(size, bold=False, color="#111827", space=0):
+        # The Unicode font has a single weight; only the Helvetica fallback gets a bold face
+        font_name = "Helvetica-Bold" if bold and font == "Helvetica" else font
+        return ParagraphStyle(
+            "report", fontName=font_name, fontSize=size, leading=size * 1.35,
+            alignment=align, textColor=colors.HexColor(color), spaceAfter=space
+        )
+
+    def text(value, paragraph_style):
+        return Paragraph(_escape(_shape(value)), paragraph_style)
+
+    def row(*cells):
+        # Columns run right to left in Arabic
+        return list(reversed(cells)) if rtl else list(cells)
+
+    body = style(10)
+    muted = style(9, color="#6b7280")
+    heading = style(12, bold=True, space=4)
+
+    vehicle = document["vehicle"]
+    vehicle_name = f"{vehicle['year']} {vehicle['make']} {vehicle['model']}"
+    condition = document["overall_condition"]
+    date = datetime.fromisoformat(document["inspection_date"]).strftime("%Y-%m-%d")
+
+    story = [
+        text(labels["workshop"], muted),
+        text(labels["title"], style(18, bold=True, space=2)),
+        text(f"{labels['report']} #{document['inspection_id']}", muted),
+        Spacer(1, 6 * mm)
+    ]
+
+    details = [
+        (labels["client"], document["client_name"]),
+        (labels["vehicle"], vehicle_name),
+        (labels["plate"], vehicle["license_plate"]),
+        (labels["vin"], vehicle["vin"] or "-"),
+        (labels["date"], date),
+        (labels["overall"], statuses.get(condition, condition))
+    ]
+    detail_table = Table(
+        [row(text(label, muted), text(value, body)) for label, value in details],
+        colWidths=row(45 * mm, 125 * mm)
+    )
+    detail_table.setStyle(TableStyle([
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("LINEBELOW", (0, 0), (-1, -1), 0.25, colors.HexColor("#e5e7eb"))
+    ]))
+    story += [detail_table, Spacer(1, 6 * mm)]
+
+    if document["items"]:
+        header = style(10, bold=True, color="#ffffff")
+        rows = [row(text(labels["item"], header), text(labels["status"], header), text(labels["notes"], header))]
+        commands = [
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1f2937")),
+            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#d1d5db")),
+            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f9fafb")])
+        ]
+        for item in document["items"]:
+            color = STATUS_COLORS.get(item["status"], "#111827")
+            rows.append(row(
+                text(item["item_name"], body),
+                text(statuses.get(item["status"], item["status"]), style(10, color=color)),
+                text(item["notes"] or "", body)
+            ))
+        items_table = Table(rows, colWidths=row(60 * mm, 35 * mm, 75 * mm), repeatRows=1)
+        items_table.setStyle(TableStyle(commands))
+        story.append(items_table)
+    else:
+        story.append(text(labels["no_items"], body))
+
+    for key in ("technician_notes", "recommendations"):
+        if document[key]:
+            story += [Spacer(1, 5 * mm), text(labels[key], heading), text(document[key], body)]
+
+    buffer = io.BytesIO()
+    pdf = SimpleDocTemplate(
+        buffer, pagesize=A4, leftMargin=20 * mm, rightMargin=20 * mm, topMargin=18 * mm, bottomMargin=18 * mm,
+        title=f"{LABELS['en']['title']} #{document['inspection_id']}", author=LABELS["en"]["workshop"],
+        invariant=1  # Fixed metadata dates and ids: the same content always gives the same bytes
+    )
+    pdf.build(story)
+    return buffer.getvalue()
+
+
+class PdfCache:
+    """Rendered inspection PDFs on disk, named by inspection id, language and content hash.
+
+    A document whose content is unchanged is served from its file; a change to
+    the inspection (or to the renderer version) produces a new hash, so the new
+    file is rendered once and the outdated one for the same report is removed.
+    Concurrent requests for the same document within a worker render it once.
+    """
+
+    def __init__(self, directory: str = PDF_CACHE_DIR):
+        self.directory = directory
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.hits = 0
+        self.renders = 0
+
+    def _prefix(self, document: dict) -> str:
+        workshop = f"{document['workshop']}-" if document.get("workshop") else ""
+        return f"{workshop}inspection-{document['inspection_id']}-{document['lang']}-"
+
+    def path(self, document: dict, digest: str) -> str:
+        return os.path.join(self.directory, f"{self._prefix(document)}{digest[:32]}.pdf")
+
+    def _lock_for(self, path: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def get_or_render(self, document: dict) -> str:
+        """Path of the cached PDF for an inspection document, rendering it on a miss"""
+        digest = document_hash(document)
+        path = self.path(document, digest)
+        if os.path.exists(path):
+            self.hits += 1
+            return path
+
+        with self._lock_for(path):
+            if os.path.exists(path):
+                self.hits += 1
+                return path
+            check_available(document)
+            content = job_executor.run_in_process(render_inspection_pdf, document)
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(content)
+            os.replace(temporary, path)  # Atomic, so readers never see a partial file
+            self.renders += 1
+            self._remove_outdated(document, path)
+        with self._locks_guard:
+            self._locks.pop(path, None)
+        return path
+
+    async def response(self, request: Request, document: dict) -> Response:
+        """The document's PDF served from the cache; 304 when the client already has this version"""
+        etag = '"' + document_hash(document)[:32] + '"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        try:
+            path = await run_in_threadpool(self.get_or_render, document)
+        except PdfUnavailable as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+        return FileResponse(
+            path, media_type="application/pdf", headers=headers, content_disposition_type="inline",
+            filename=f"inspection-{document['inspection_id']}-{document['lang']}.pdf"
+        )
+
+    def _remove_outdated(self, document: dict, current: str):
+        prefix = self._prefix(document)
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.startswith(prefix) and name.endswith(".pdf") and os.path.join(self.directory, name) != current:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass  # Removed by another worker
+
+    def stats(self) -> dict:
+        try:
+            files = [name for name in os.listdir(self.directory) if name.endswith(".pdf")]
+        except FileNotFoundError:
+            files = []
+        return {
+            "directory": self.directory,
+            "files": len(files),
+            "bytes": sum(os.path.getsize(os.path.join(self.directory, name)) for name in files),
+            "hits": self.hits,
+            "renders": self.renders
+        }
+
+
+# Shared cache for inspection report PDFs
+pdf_cache = PdfCache()
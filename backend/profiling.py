@@ -0,0 +1,255 @@
+"""Opt-in per-request profiling.
+
+A request is profiled when it carries the admin profiling header
+    X-Profile: <PROFILING_TOKEN>
+or is picked by PROFILE_SAMPLE_RATE. While it runs, a background thread
+samples the stacks of the event loop thread and the threadpool threads that
+run sync endpoints and dependencies every PROFILE_INTERVAL_MS. The samples
+are written to PROFILES_DIR as collapsed stacks ("frame;frame;frame count"),
+the input format of flamegraph.pl, speedscope and most flame graph viewers,
+with a JSON metadata file next to them. GET /admin/profiles lists them.
+
+Requests that are not profiled only pay for one header lookup and, with
+sampling enabled, one random() call. One request is profiled at a time per
+worker; concurrent requests on the same worker can show up in its samples.
+"""
+from starlette.datastructures import MutableHeaders
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+# Profiling settings
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")                       # empty disables the header trigger
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))       # fraction of requests, 0 = header only
+PROFILE_MIN_DURATION_MS = float(os.getenv("PROFILE_MIN_DURATION_MS", "100"))  # sampled requests faster than this are dropped
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))      # sampling stops after this (e.g. event streams)
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))                     # newest profiles kept on disk
+PROFILES_DIR = os.getenv("PROFILES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+
+PROFILE_HEADER = "x-profile"
+PROFILE_ID = re.compile(r"^\d{8}T\d{6}-[0-9a-f]{8}$")
+
+# Threads that run request code: the event loop (recorded per request) and the AnyIO threadpool
+WORKER_THREAD_PREFIX = "AnyIO worker thread"
+
+# Innermost frames of a thread that is waiting rather than working
+IDLE_FUNCTIONS = {"wait", "select", "poll", "get", "accept", "_worker", "_wait_for_tstate_lock"}
+STDLIB_DIR = os.path.dirname(os.__file__)
+
+
+def _frame_name(code) -> str:
+    """function (package/module.py:line) - never contains the ';' stack separator"""
+    path = code.co_filename
+    short = "/".join(path.replace("\\", "/").split("/")[-2:])
+    return f"{code.co_name} ({short}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _is_idle(frame) -> bool:
+    return frame.f_code.co_name in IDLE_FUNCTIONS and frame.f_code.co_filename.startswith(STDLIB_DIR)
+
+
+class StackSampler:
+    """Samples the stacks of the request threads into folded-stack counts"""
+
+    def __init__(self, loop_thread_id: int, interval: float, max_seconds: float):
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _sampled_threads(self) -> set:
+        ids = {self.loop_thread_id}
+        for thread in threading.enumerate():
+            if thread.name.startswith(WORKER_THREAD_PREFIX):
+                ids.add(thread.ident)
+        return ids
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stopped.wait(self.interval) and time.monotonic() < deadline:
+            thread_ids = self._sampled_threads()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in thread_ids or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+class ProfileStore:
+    """Profiles on disk: <id>.folded with the stacks and <id>.json with the metadata"""
+
+    def __init__(self, directory: str = PROFILES_DIR, keep: int = PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+
+    def new_id(self) -> str:
+        return f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    def _write(self, path: str, content: bytes):
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(content)
+        os.replace(temporary, path)  # Atomic, so the listing never sees a partial file
+
+    def save(self, profile_id: str, root: str, counts: Counter, metadata: dict) -> dict:
+        os.makedirs(self.directory, exist_ok=True)
+        # Each stack is rooted at the route, so profiles of one route merge into one flame graph
+        lines = [f"{root};{stack} {count}" for stack, count in counts.most_common()]
+        self._write(os.path.join(self.directory, f"{profile_id}.folded"), ("\n".join(lines) + "\n").encode("utf-8"))
+
+        own_time = Counter()
+        for stack, count in counts.items():
+            own_time[stack.rsplit(";", 1)[-1]] += count
+        total = sum(counts.values())
+        metadata = dict(metadata, id=profile_id, top_frames=[
+            {"frame": frame, "samples": count, "share": round(count / total, 3)}
+            for frame, count in own_time.most_common(10)
+        ])
+        self._write(os.path.join(self.directory, f"{profile_id}.json"),
+                    json.dumps(metadata, indent=2, ensure_ascii=False).encode("utf-8"))
+        self._prune()
+        return metadata
+
+    def _prune(self):
+        ids = self._ids()
+        for profile_id in ids[self.keep:]:
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + suffix))
+                except FileNotFoundError:
+                    pass  # Removed by another worker
+
+    def _ids(self) -> List[str]:
+        """Profile ids, newest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((name[:-5] for name in names if name.endswith(".json")), reverse=True)
+
+    def list(self, route: Optional[str] = None, limit: int = 50) -> List[dict]:
+        profiles = []
+        for profile_id in self._ids():
+            metadata = self.metadata(profile_id)
+            if metadata is None or (route and metadata.get("route") != route):
+                continue
+            profiles.append(metadata)
+            if len(profiles) >= limit:
+                break
+        return profiles
+
+    def metadata(self, profile_id: str) -> Optional[dict]:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def folded_path(self, profile_id: str) -> Optional[str]:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.folded")
+        return path if os.path.exists(path) else None
+
+
+class ProfilingMiddleware:
+    """Runs opted-in requests under the stack sampler and stores the result.
+
+    Responses to header-triggered requests carry an X-Profile-Id header naming
+    the stored profile.
+    """
+
+    def __init__(self, app, store: Optional[ProfileStore] = None, token: str = PROFILING_TOKEN,
+                 sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.store = store or profile_store
+        self.token = token.encode()
+        self.sample_rate = sample_rate
+        self._busy = threading.Lock()
+
+    def _trigger(self, scope) -> Optional[str]:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER.encode():
+                    return "header" if hmac.compare_digest(value, self.token) else None
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = self._trigger(scope)
+        if trigger is None or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = self.store.new_id()
+        response_status = None
+
+        async def send_with_id(message):
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+                if trigger == "header":
+                    MutableHeaders(scope=message).append("X-Profile-Id", profile_id)
+            await send(message)
+
+        sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000, PROFILE_MAX_SECONDS)
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            self._busy.release()
+            duration_ms = (time.perf_counter() - started) * 1000
+            route = getattr(scope.get("route"), "path", None) or scope["path"]
+            if trigger == "header" or duration_ms >= PROFILE_MIN_DURATION_MS:
+                try:
+                    self.store.save(profile_id, f"{scope['method']} {route}", sampler.counts, {
+                        "method": scope["method"],
+                        "route": route,
+                        "path": scope["path"],
+                        "query": scope.get("query_string", b"").decode("latin-1"),
+                        "status": response_status,
+                        "trigger": trigger,
+                        "started_at": started_at.isoformat(),
+                        "duration_ms": round(duration_ms, 1),
+                        "samples": sampler.samples,
+                        "interval_ms": PROFILE_INTERVAL_MS
+                    })
+                except OSError as e:
+                    print(f"⚠️ Failed to store profile {profile_id}: {e}")
+
+
+# Shared profile storage for this deployment
+profile_store = ProfileStore()
@@ -0,0 +1,97 @@
+from sqlalchemy import func, lambda_stmt, select
+from sqlalchemy.orm import Session
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from models import Vehicle, ServiceRecord, ServiceItem, InspectionReport, InspectionItem
+from inspectiondocs import INSPECTION_ITEMS_JSON, decode_items
+
+# Read models for the client portal.
+#
+# These return plain row tuples from lambda statements executed on the
+# session's connection: SQLAlchemy caches the compiled SQL per lambda, and rows
+# skip the identity map and attribute instrumentation that ORM entities pay for.
+# Using the session's connection keeps them inside the request's transaction
+# (and the /batch snapshot).
+
+
+def _rows(db: Session, stmt):
+    return db.connection().execute(stmt).all()
+
+
+def client_vehicles(db: Session, client_id: int):
+    """(id, make, model, year, license_plate, vin, color) for every vehicle of a client"""
+    return _rows(db, lambda_stmt(lambda: select(
+        Vehicle.id, Vehicle.make, Vehicle.model, Vehicle.year, Vehicle.license_plate, Vehicle.vin, Vehicle.color
+    ).where(Vehicle.client_id == client_id).order_by(Vehicle.id)))
+
+
+def client_vehicle(db: Session, client_id: int, vehicle_id: int):
+    """The client's vehicle as a row, or None when it belongs to someone else"""
+    rows = _rows(db, lambda_stmt(lambda: select(
+        Vehicle.id, Vehicle.make, Vehicle.model, Vehicle.year, Vehicle.license_plate, Vehicle.vin, Vehicle.color
+    ).where(Vehicle.id == vehicle_id, Vehicle.client_id == client_id)))
+    return rows[0] if rows else None
+
+
+def vehicle_stats(db: Session, vehicle_id: int):
+    """(total_services, last_service_date, total_inspections, last_inspection_date) in one statement"""
+    return _rows(db, lambda_stmt(lambda: select(
+        select(func.count(ServiceRecord.id)).where(ServiceRecord.vehicle_id == vehicle_id).scalar_subquery(),
+        select(func.max(ServiceRecord.service_date)).where(ServiceRecord.vehicle_id == vehicle_id).scalar_subquery(),
+        select(func.count(InspectionReport.id)).where(InspectionReport.vehicle_id == vehicle_id).scalar_subquery(),
+        select(func.max(InspectionReport.inspection_date)).where(InspectionReport.vehicle_id == vehicle_id).scalar_subquery()
+    )))[0]
+
+
+def vehicle_services(db: Session, vehicle_id: int):
+    """(id, vehicle_id, service_date, status, technician_notes, total_cost), newest first"""
+    return _rows(db, lambda_stmt(lambda: select(
+        ServiceRecord.id, ServiceRecord.vehicle_id, ServiceRecord.service_date, ServiceRecord.status,
+        ServiceRecord.technician_notes, ServiceRecord.total_cost
+    ).where(ServiceRecord.vehicle_id == vehicle_id).order_by(ServiceRecord.service_date.desc())))
+
+
+def vehicle_service_items(db: Session, vehicle_id: int) -> Dict[int, list]:
+    """(service_type, service_name, description, price) rows of all the vehicle's services, by record id"""
+    rows = _rows(db, lambda_stmt(lambda: select(
+        ServiceItem.service_record_id, ServiceItem.service_type, ServiceItem.service_name,
+        ServiceItem.description, ServiceItem.price
+    ).join(ServiceRecord, ServiceItem.service_record_id == ServiceRecord.id).where(
+        ServiceRecord.vehicle_id == vehicle_id
+    ).order_by(ServiceItem.id)))
+    items = defaultdict(list)
+    for row in rows:
+        items[row.service_record_id].append(row)
+    return items
+
+
+def vehicle_inspections(db: Session, vehicle_id: int):
+    """(id, inspection_date, overall_condition, technician_notes), newest first"""
+    return _rows(db, lambda_stmt(lambda: select(
+        InspectionReport.id, InspectionReport.inspection_date, InspectionReport.overall_condition,
+        InspectionReport.technician_notes
+    ).where(InspectionReport.vehicle_id == vehicle_id).order_by(InspectionReport.inspection_date.desc())))
+
+
+def latest_inspection(db: Session, vehicle_id: int):
+    """The newest inspection of a vehicle and its (item_name, status, notes) rows, or (None, [])"""
+    rows = _rows(db, lambda_stmt(lambda: select(
+        InspectionReport.id, InspectionReport.vehicle_id, InspectionReport.inspection_date,
+        InspectionReport.overall_condition, InspectionReport.technician_notes, InspectionReport.recommendations,
+        InspectionReport.items_json
+    ).where(InspectionReport.vehicle_id == vehicle_id).order_by(InspectionReport.inspection_date.desc()).limit(1)))
+    if not rows:
+        return None, []
+    inspection_id = rows[0].id
+    if INSPECTION_ITEMS_JSON and rows[0].items_json is not None:
+        return rows[0], decode_items(inspection_id, rows[0].items_json)
+    items = _rows(db, lambda_stmt(lambda: select(
+        InspectionItem.item_name, InspectionItem.status, InspectionItem.notes
+    ).where(InspectionItem.inspection_id == inspection_id).order_by(InspectionItem.id)))
+    return rows[0], items
+
+
+def service_summary(items: List) -> str:
+    service_types = [item.service_name for item in items]
+    return ", ".join(service_types) if service_types else "General Service"
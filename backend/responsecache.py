@@ -0,0 +1,285 @@
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Set
+import hashlib
+import json
+import os
+import threading
+import time
+
+from events import event_bus
+
+# Per-client response cache settings
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))  # all entries together
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(512 * 1024)))  # larger bodies are not cached
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))  # seconds, safety net for writes without events; 0 = none
+
+# Change events of these entities can alter the cached client-portal responses
+INVALIDATING_ENTITIES = ("client", "vehicle", "service_record", "inspection")
+
+# Bookkeeping per entry (key, tags, dict slots) counted on top of the body
+ENTRY_OVERHEAD_BYTES = 256
+
+
+def client_tag(client_id) -> str:
+    return f"client:{client_id}"
+
+
+def vehicle_tag(vehicle_id) -> str:
+    return f"vehicle:{vehicle_id}"
+
+
+def record_tag(entity: str, record_id) -> str:
+    """Tag of one service record or inspection, e.g. service_record:12"""
+    return f"{entity}:{record_id}"
+
+
+def event_tags(event: dict) -> Set[str]:
+    """Tags touched by a change event, from the ids it carries.
+
+    Client and vehicle changes reach the client's car list and visit details;
+    service record and inspection changes reach their vehicle's pages and the
+    record's own detail page.
+    """
+    entity = event["type"].split(".", 1)[0]
+    if entity not in INVALIDATING_ENTITIES:
+        return set()
+    data = event.get("data") or {}
+    tags = set()
+    if entity in ("client", "vehicle") and data.get("client_id") is not None:
+        tags.add(client_tag(data["client_id"]))
+    for key in ("vehicle_id", "previous_vehicle_id"):
+        if data.get(key) is not None:
+            tags.add(vehicle_tag(data[key]))
+    if entity in ("service_record", "inspection") and data.get("id") is not None:
+        tags.add(record_tag(entity, data["id"]))
+    return tags
+
+
+class CacheStats:
+    """Counters for the response cache"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.not_modified = 0   # hits answered with 304
+        self.evictions = 0      # entries dropped to stay within the memory caps
+        self.invalidations = 0  # entries dropped by change events
+        self.expirations = 0
+        self.rejected = 0       # bodies larger than the entry cap, or stale before they were stored
+
+    def to_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "expirations": self.expirations,
+            "rejected": self.rejected
+        }
+
+
+class Tagged:
+    """A build() result with tags that are only known once it is built,
+    e.g. the inspection linked to a service record"""
+
+    def __init__(self, content, tags: Iterable[str]):
+        self.content = content
+        self.tags = set(tags)
+
+
+class _Entry:
+    __slots__ = ("body", "etag", "tags", "size", "expires_at")
+
+    def __init__(self, body: bytes, tags: Set[str], expires_at: Optional[float]):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.tags = tags
+        self.size = len(body) + ENTRY_OVERHEAD_BYTES
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """Bounded in-memory cache of serialized client-portal responses.
+
+    Entries are keyed by workshop, client, path and query string and tagged
+    with the client, vehicle and record ids they were built from. Write paths
+    publish change events; the event bus listener drops every entry sharing a
+    tag with the event (events from other workers arrive through the
+    invalidation bus). A response computed while one of its tags was
+    invalidated is served but not stored, so a read racing a write never
+    caches the old data. Invalidations are stamped with a cache-wide
+    generation, so this also covers tags that build() adds through Tagged.
+    Only invalidations newer than the oldest build still in flight are
+    remembered.
+
+    Memory is capped by total body bytes and entry count; the least recently
+    used entries are evicted first.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 max_entry_bytes: int = RESPONSE_CACHE_MAX_ENTRY_BYTES, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_tag: Dict[str, Set[str]] = {}
+        self._generation = 0                       # bumped on every invalidation
+        self._invalidated_at: Dict[str, int] = {}  # generation of each tag's latest invalidation
+        self._building: Dict[int, int] = {}        # builds in flight per starting generation
+        self._prune_at = 1024
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = CacheStats()
+
+    @staticmethod
+    def key(request: Request, workshop: str, client_id: int) -> str:
+        query = "&".join(sorted(request.url.query.split("&"))) if request.url.query else ""
+        return f"{workshop}:{client_id}:{request.url.path}?{query}"
+
+    def _get(self, key: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters.misses += 1
+                return None
+            if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.counters.expirations += 1
+                self.counters.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters.hits += 1
+            return entry
+
+    def _start_build(self) -> int:
+        with self._lock:
+            self._building[self._generation] = self._building.get(self._generation, 0) + 1
+            return self._generation
+
+    def _finish_build(self, generation: int):
+        with self._lock:
+            self._building[generation] -= 1
+            if not self._building[generation]:
+                del self._building[generation]
+            self._prune()
+
+    def _prune(self):
+        """Forget the invalidations no build in flight can be stale against; caller holds the lock"""
+        if not self._building:
+            self._invalidated_at.clear()
+        elif len(self._invalidated_at) >= self._prune_at:
+            oldest = min(self._building)
+            self._invalidated_at = {tag: at for tag, at in self._invalidated_at.items() if at > oldest}
+            self._prune_at = max(1024, 2 * len(self._invalidated_at))
+
+    def _put(self, key: str, body: bytes, tags: Set[str], generation: int) -> _Entry:
+        entry = _Entry(body, tags, time.monotonic() + self.ttl if self.ttl > 0 else None)
+        with self._lock:
+            stale = any(self._invalidated_at.get(tag, 0) > generation for tag in tags)
+            if stale or len(body) > self.max_entry_bytes:
+                self.counters.rejected += 1
+                return entry
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            self.counters.stores += 1
+            while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                self._remove(next(iter(self._entries)))
+                self.counters.evictions += 1
+        return entry
+
+    def _remove(self, key: str):
+        """Drop an entry and its tag index references; caller holds the lock"""
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Drop every entry carrying one of the tags, returns how many were dropped"""
+        dropped = 0
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                self._invalidated_at[tag] = self._generation
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+                    dropped += 1
+            self._prune()
+            self.counters.invalidations += dropped
+        return dropped
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+            self._bytes = 0
+
+    def on_change(self, event: dict):
+        """Event bus listener - called from any thread"""
+        tags = event_tags(event)
+        if tags:
+            self.invalidate_tags(tags)
+
+    def response(self, request: Request, key: str, tags: Iterable[str], build: Callable[[], object]) -> Response:
+        """The cached response for key, building and storing it on a miss.
+
+        build() returns the endpoint's usual result, or a Tagged one to add
+        tags; exceptions (e.g. 404) propagate and are never cached.
+        """
+        entry = self._get(key)
+        if entry is None:
+            generation = self._start_build()
+            try:
+                tags = set(tags)
+                result = build()
+                if isinstance(result, Tagged):
+                    tags |= result.tags
+                    result = result.content
+                content = jsonable_encoder(result)
+                body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+                entry = self._put(key, body, tags, generation)
+            finally:
+                self._finish_build(generation)
+
+        headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+        if request.headers.get("if-none-match") == entry.etag:
+            self.counters.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self.counters.to_dict(),
+                entries=len(self._entries),
+                bytes=self._bytes,
+                tags=len(self._by_tag),
+                invalidated_tags=len(self._invalidated_at),
+                max_bytes=self.max_bytes,
+                max_entries=self.max_entries,
+                max_entry_bytes=self.max_entry_bytes,
+                ttl_seconds=self.ttl
+            )
+
+
+# Shared cache for the client-portal read endpoints of this worker process
+client_cache = ResponseCache()
+event_bus.add_listener(client_cache.on_change)
@@ -0,0 +1,149 @@
+"""Per-workshop database shards.
+
+Every workshop (branch) keeps its clients, vehicles, service history and
+bookings in its own database: separate SQLite files locally, separate
+PostgreSQL databases in production. The default workshop uses DATABASE_URL,
+further workshops are configured with WORKSHOP_SHARDS, e.g.
+    WORKSHOP_SHARDS="north=sqlite:///./evmaster_north.db,south=postgresql://evmaster@db/evmaster_south"
+
+Client requests are routed by the workshop claim in the access token
+("token_{workshop}_{client_code}_{client_id}"; the code may itself contain
+underscores); tokens issued before sharding carry no claim and belong to the
+default workshop. Admin requests choose a
+workshop with the X-Workshop header. Every session is tagged with its workshop
+in session.info, see workshop_of().
+"""
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+import os
+import re
+
+from engines import engines
+from sync import track_changes
+from inspectiondocs import track_inspection_items
+
+# Sharding settings
+DEFAULT_WORKSHOP = os.getenv("DEFAULT_WORKSHOP", "main")
+WORKSHOP_SHARDS = os.getenv("WORKSHOP_SHARDS", "")  # comma-separated name=url pairs besides the default workshop
+
+# Admin requests select their workshop with this header
+WORKSHOP_HEADER = "x-workshop"
+
+# Names end up in tokens, engine names and file names
+WORKSHOP_NAME = re.compile(r"^[a-z0-9-]+$")
+
+T = TypeVar("T")
+
+
+class UnknownWorkshop(Exception):
+    """A request or token names a workshop without a configured shard"""
+
+
+def parse_shards(value: str, default_url: str, default: str = DEFAULT_WORKSHOP) -> Dict[str, str]:
+    """Database URL per workshop from a WORKSHOP_SHARDS value, default workshop first"""
+    shards = {default: default_url}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        name, separator, url = entry.partition("=")
+        name = name.strip().lower()
+        if not separator or not url.strip() or not WORKSHOP_NAME.match(name):
+            raise ValueError(f"Invalid WORKSHOP_SHARDS entry {entry.strip()!r}, expected name=url")
+        shards[name] = url.strip()
+    return shards
+
+
+def issue_token(workshop: str, client_code: str, client_id: int) -> str:
+    """Access token of a client, carrying the workshop claim"""
+    return f"token_{workshop}_{client_code}_{client_id}"
+
+
+def parse_token(token: str) -> Tuple[Optional[str], Optional[int]]:
+    """(workshop, client id) claimed by an access token, (None, None) when malformed"""
+    parts = token.split("_")
+    if len(parts) < 3 or parts[0] != "token":
+        return None, None
+    try:
+        client_id = int(parts[-1])
+    except ValueError:
+        return None, None
+    if len(parts) >= 4 and WORKSHOP_NAME.match(parts[1]):
+        return parts[1], client_id
+    return DEFAULT_WORKSHOP, client_id  # Issued before sharding
+
+
+def workshop_of(db: Session) -> str:
+    """The workshop whose database a session is bound to"""
+    return db.info.get("workshop", DEFAULT_WORKSHOP)
+
+
+class ShardRouter:
+    """Maps each workshop to its engine and session factory.
+
+    The default workshop's engine is registered as "default", the others as
+    "shard:<name>", so pool statistics and maintenance see all of them. Each
+    session factory stamps sync change sequences and keeps the denormalized
+    inspection items up to date.
+    """
+
+    def __init__(self, urls: Dict[str, str], default: str = DEFAULT_WORKSHOP):
+        if default not in urls:
+            raise ValueError(f"No database configured for the default workshop {default!r}")
+        self.default = default
+        self._engines: Dict[str, Engine] = {}
+        self._session_factories: Dict[str, sessionmaker] = {}
+        for name in [default] + [name for name in urls if name != default]:
+            engine = engines.create("default" if name == default else f"shard:{name}", urls[name])
+            factory = sessionmaker(autocommit=False, autoflush=False, bind=engine, info={"workshop": name})
+            track_changes(factory)
+            track_inspection_items(factory)
+            self._engines[name] = engine
+            self._session_factories[name] = factory
+
+    def workshops(self) -> List[str]:
+        """Configured workshops, default first"""
+        return list(self._engines)
+
+    def resolve(self, workshop: Optional[str]) -> str:
+        """Validated workshop name; None means the default workshop"""
+        if workshop is None:
+            return self.default
+        if workshop not in self._engines:
+            raise UnknownWorkshop(f"Unknown workshop: {workshop}")
+        return workshop
+
+    def engine(self, workshop: Optional[str] = None) -> Engine:
+        return self._engines[self.resolve(workshop)]
+
+    def session_factory(self, workshop: Optional[str] = None) -> sessionmaker:
+        return self._session_factories[self.resolve(workshop)]
+
+    def session(self, workshop: Optional[str] = None) -> Session:
+        return self.session_factory(workshop)()
+
+    def workshop_for(self, request) -> str:
+        """The workshop a request belongs to: the token claim, else the X-Workshop header, else the default"""
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            workshop, _ = parse_token(token.strip())
+            if workshop is not None:
+                return self.resolve(workshop)
+        header = request.headers.get(WORKSHOP_HEADER, "").strip().lower()
+        return self.resolve(header or None)
+
+    def for_each(self, func: Callable[[Session], T]) -> Dict[str, T]:
+        """Run func(db) on every shard in parallel, each with its own session; results by workshop"""
+        def run(workshop: str) -> T:
+            db = self.session(workshop)
+            try:
+                return func(db)
+            finally:
+                db.close()
+
+        names = self.workshops()
+        if len(names) == 1:
+            return {names[0]: run(names[0])}
+        with ThreadPoolExecutor(max_workers=len(names), thread_name_prefix="shard") as pool:
+            return dict(zip(names, pool.map(run, names)))
@@ -0,0 +1,306 @@
+"""Month-end client statements.
+
+Generates one statement per active client summarizing the client's service
+records and costs over a period, written as JSON files to a run directory
+together with a manifest.json describing the run.
+
+Each workshop has its own runs: the run id and directory start with the
+workshop name, and the clients are read from that workshop's database.
+
+Clients are split into partitions that run in parallel on the job executor's
+process pool; each client's records, vehicles and items come from a single
+ordered query that is streamed rather than loaded per vehicle.
+
+Runs as the "generate_statements" background job (POST /admin/statements) or
+from the command line, e.g. for a month-end cron entry:
+    python statements.py --month 2024-01 [--workshop north]
+"""
+from sqlalchemy import select
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from typing import List, Optional
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+from database import shard_router
+from jobs import job_executor
+from shards import workshop_of
+from models import Client, Vehicle, ServiceRecord, ServiceItem
+
+# Statement settings
+STATEMENTS_DIR = os.getenv("STATEMENTS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "statements"))
+STATEMENT_PARTITION_SIZE = int(os.getenv("STATEMENT_PARTITION_SIZE", "25"))  # clients per process pool task
+STATEMENT_FETCH_SIZE = int(os.getenv("STATEMENT_FETCH_SIZE", "500"))          # rows buffered while streaming
+
+MANIFEST_NAME = "manifest.json"
+
+
+def previous_month(today: Optional[date] = None):
+    """(first day, last day) of the month before today"""
+    first_of_this_month = (today or date.today()).replace(day=1)
+    last_day = first_of_this_month - timedelta(days=1)
+    return last_day.replace(day=1), last_day
+
+
+def run_id(date_from: date, date_to: date, workshop: Optional[str] = None) -> str:
+    return f"{shard_router.resolve(workshop)}_{date_from.isoformat()}_{date_to.isoformat()}"
+
+
+def run_directory(date_from: date, date_to: date, output_dir: Optional[str] = None, workshop: Optional[str] = None) -> str:
+    return os.path.join(output_dir or STATEMENTS_DIR, run_id(date_from, date_to, workshop))
+
+
+def _write_json(path: str, data) -> bytes:
+    """Write atomically, so readers never see a half-written file; returns the bytes written"""
+    content = json.dumps(data, indent=2, ensure_ascii=False, default=str).encode("utf-8")
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(content)
+    os.replace(temporary, path)
+    return content
+
+
+def _statement_rows(db, client_id: int, start: datetime, end: datetime):
+    """Every service item of the client's services in [start, end), ordered by service"""
+    stmt = select(
+        ServiceRecord.id, ServiceRecord.service_date, ServiceRecord.status, ServiceRecord.total_cost,
+        ServiceRecord.technician_notes, Vehicle.id.label("vehicle_id"), Vehicle.make, Vehicle.model,
+        Vehicle.year, Vehicle.license_plate, ServiceItem.service_type, ServiceItem.service_name,
+        ServiceItem.price
+    ).join(
+        Vehicle, ServiceRecord.vehicle_id == Vehicle.id
+    ).outerjoin(
+        ServiceItem, ServiceItem.service_record_id == ServiceRecord.id
+    ).where(
+        Vehicle.client_id == client_id,
+        ServiceRecord.service_date >= start,
+        ServiceRecord.service_date < end
+    ).order_by(ServiceRecord.service_date, ServiceRecord.id, ServiceItem.id)
+    return db.execute(stmt.execution_options(yield_per=STATEMENT_FETCH_SIZE))
+
+
+def build_statement(db, client, date_from: date, date_to: date) -> dict:
+    """The statement of one client for the period, from one streamed query"""
+    start = datetime.combine(date_from, datetime.min.time())
+    end = datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+
+    services = []
+    vehicles = {}
+    by_status = {}
+    for record_id, rows in groupby(_statement_rows(db, client.id, start, end), key=lambda row: row.id):
+        rows = list(rows)
+        record = rows[0]
+        cost = float(record.total_cost or 0)
+        vehicle = vehicles.setdefault(record.vehicle_id, {
+            "vehicle_id": record.vehicle_id,
+            "vehicle": f"{record.year} {record.make} {record.model}",
+            "license_plate": record.license_plate,
+            "services": 0,
+            "total_cost": 0.0
+        })
+        vehicle["services"] += 1
+        vehicle["total_cost"] += cost
+        by_status[record.status] = by_status.get(record.status, 0.0) + cost
+        services.append({
+            "service_id": record_id,
+            "date": record.service_date.isoformat(),
+            "vehicle_id": record.vehicle_id,
+            "license_plate": record.license_plate,
+            "status": record.status,
+            "technician_notes": record.technician_notes,
+            "items": [
+                {"service_type": row.service_type, "service_name": row.service_name, "price": float(row.price)}
+                for row in rows if row.service_name is not None
+            ],
+            "total_cost": cost
+        })
+
+    return {
+        "client": {
+            "id": client.id,
+            "name": client.name,
+            "phone": client.phone,
+            "email": client.email,
+            "address": client.address
+        },
+        "period": {"from": date_from.isoformat(), "to": date_to.isoformat()},
+        "services": services,
+        "vehicles": [dict(v, total_cost=round(v["total_cost"], 2)) for v in vehicles.values()],
+        "totals": {
+            "services": len(services),
+            "total_cost": round(sum(s["total_cost"] for s in services), 2),
+            "by_status": {status: round(cost, 2) for status, cost in sorted(by_status.items())}
+        }
+    }
+
+
+_engine_pid = os.getpid()
+
+
+def generate_partition(client_ids: List[int], date_from: date, date_to: date, directory: str,
+                       workshop: str) -> List[dict]:
+    """Write the statements of a group of clients; runs in a pool process. Returns manifest entries."""
+    global _engine_pid
+    if os.getpid() != _engine_pid:
+        # A forked process must not reuse the parent's pooled connections
+        for name in shard_router.workshops():
+            shard_router.engine(name).dispose(close=False)
+        _engine_pid = os.getpid()
+
+    entries = []
+    db = shard_router.session(workshop)
+    try:
+        clients = db.query(Client).filter(Client.id.in_(client_ids)).order_by(Client.id).all()
+        for client in clients:
+            statement = build_statement(db, client, date_from, date_to)
+            statement["generated_at"] = datetime.utcnow().isoformat()
+            filename = f"statement-{client.id}.json"
+            content = _write_json(os.path.join(directory, filename), statement)
+            entries.append({
+                "client_id": client.id,
+                "client_name": client.name,
+                "file": filename,
+                "services": statement["totals"]["services"],
+                "total_cost": statement["totals"]["total_cost"],
+                "sha256": hashlib.sha256(content).hexdigest()
+            })
+    finally:
+        db.close()
+    return entries
+
+
+def generate_statements(date_from: date, date_to: date, output_dir: Optional[str] = None, progress=None,
+                        workshop: Optional[str] = None, db=None) -> dict:
+    """Generate the statements of every active client of a workshop for the period; returns the manifest.
+
+    The workshop is the one db is bound to when a session is given, else
+    workshop (default: the default workshop). progress(done, total) is called
+    after each partition. The manifest is rewritten as partitions finish, so
+    an interrupted run shows how far it got.
+    """
+    if date_to < date_from:
+        raise ValueError("date_to must not be before date_from")
+
+    workshop = workshop_of(db) if db is not None else shard_router.resolve(workshop)
+    directory = run_directory(date_from, date_to, output_dir, workshop)
+    os.makedirs(directory, exist_ok=True)
+
+    session = db if db is not None else shard_router.session(workshop)
+    try:
+        client_ids = [row.id for row in session.query(Client.id).filter(Client.is_active == True).order_by(Client.id)]
+    finally:
+        if session is not db:
+            session.close()
+
+    partitions = [client_ids[i:i + STATEMENT_PARTITION_SIZE] for i in range(0, len(client_ids), STATEMENT_PARTITION_SIZE)]
+    manifest = {
+        "run_id": run_id(date_from, date_to, workshop),
+        "workshop": workshop,
+        "period": {"from": date_from.isoformat(), "to": date_to.isoformat()},
+        "status": "running",
+        "started_at": datetime.utcnow().isoformat(),
+        "finished_at": None,
+        "clients": len(client_ids),
+        "completed": 0,
+        "total_cost": 0.0,
+        "statements": []
+    }
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    _write_json(manifest_path, manifest)
+    if progress:
+        progress(0, len(client_ids))
+
+    count = len(partitions)
+    results = job_executor.map_in_process(
+        generate_partition, partitions, [date_from] * count, [date_to] * count, [directory] * count, [workshop] * count
+    )
+    try:
+        for entries in results:
+            manifest["statements"].extend(entries)
+            manifest["completed"] += len(entries)
+            _write_json(manifest_path, manifest)
+            if progress:
+                progress(manifest["completed"], len(client_ids))
+    except Exception:
+        manifest["status"] = "failed"
+        _write_json(manifest_path, manifest)
+        raise
+
+    manifest["statements"].sort(key=lambda entry: entry["client_id"])
+    manifest["total_cost"] = round(sum(entry["total_cost"] for entry in manifest["statements"]), 2)
+    manifest["status"] = "complete"
+    manifest["finished_at"] = datetime.utcnow().isoformat()
+    _write_json(manifest_path, manifest)
+    return manifest
+
+
+def read_manifest(directory: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def list_runs(output_dir: Optional[str] = None) -> List[dict]:
+    """Manifest summaries of the generated runs, newest period first"""
+    root = output_dir or STATEMENTS_DIR
+    try:
+        names = sorted(os.listdir(root), reverse=True)
+    except FileNotFoundError:
+        return []
+    runs = []
+    for name in names:
+        manifest = read_manifest(os.path.join(root, name))
+        if manifest is not None:
+            runs.append({key: value for key, value in manifest.items() if key != "statements"})
+    return runs
+
+
+@job_executor.register("generate_statements")
+def generate_statements_job(db, payload: dict):
+    """Background job: generate the statements of a period (default: the previous month) for the job's workshop"""
+    default_from, default_to = previous_month()
+    date_from = date.fromisoformat(payload["date_from"]) if payload.get("date_from") else default_from
+    date_to = date.fromisoformat(payload["date_to"]) if payload.get("date_to") else default_to
+    manifest = generate_statements(
+        date_from, date_to,
+        progress=lambda done, total: job_executor.report_progress(done, total, f"{done}/{total} clients"),
+        db=db
+    )
+    return {key: value for key, value in manifest.items() if key != "statements"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--month", help="YYYY-MM (default: the previous month)")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="first day, YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="last day, YYYY-MM-DD")
+    parser.add_argument("--output", help=f"output directory (default: {STATEMENTS_DIR})")
+    parser.add_argument("--workshop", help=f"workshop whose clients get statements (default: {shard_router.default})")
+    args = parser.parse_args()
+
+    if args.month:
+        date_from, date_to = previous_month(date.fromisoformat(f"{args.month}-01") + timedelta(days=31))
+    else:
+        date_from, date_to = previous_month()
+    date_from = args.date_from or date_from
+    date_to = args.date_to or date_to
+
+    def progress(done, total):
+        print(f"\r📄 {done}/{total} clients", end="", flush=True)
+
+    try:
+        manifest = generate_statements(date_from, date_to, args.output, progress=progress, workshop=args.workshop)
+    finally:
+        job_executor.stop()
+    print(f"\n✅ {manifest['completed']} statements, total {manifest['total_cost']:.2f}, "
+          f"in {run_directory(date_from, date_to, args.output, manifest['workshop'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
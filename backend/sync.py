@@ -0,0 +1,195 @@
+from sqlalchemy import event, insert, update
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session, selectinload
+from datetime import datetime
+from typing import Optional
+
+from models import Vehicle, ServiceRecord, ServiceItem, InspectionReport, InspectionItem, SyncCounter, SyncTombstone
+
+# Entities that carry updated_at/change_seq, and the ones that leave tombstones when deleted
+TRACKED_TYPES = (Vehicle, ServiceRecord, ServiceItem, InspectionReport, InspectionItem)
+TOMBSTONE_ENTITIES = {Vehicle: "vehicle", ServiceRecord: "service_record", InspectionReport: "inspection"}
+
+
+def allocate_change_seqs(connection, count: int) -> int:
+    """Reserve count consecutive change sequence numbers, returning the first"""
+    counter = SyncCounter.__table__
+    last = connection.execute(
+        update(counter).where(counter.c.id == 1).values(value=counter.c.value + count).returning(counter.c.value)
+    ).scalar()
+    if last is None:
+        connection.execute(insert(counter).values(id=1, value=count))
+        last = count
+    return last - count + 1
+
+
+def _parent_of(session: Session, obj):
+    """The report an item belongs to - items are synced as part of their parent"""
+    if isinstance(obj, ServiceItem):
+        return obj.service_record or session.get(ServiceRecord, obj.service_record_id)
+    if isinstance(obj, InspectionItem):
+        return obj.report or session.get(InspectionReport, obj.inspection_id)
+    return None
+
+
+def _owner_client_id(session: Session, obj, vehicle_id: Optional[int] = None) -> Optional[int]:
+    if isinstance(obj, Vehicle):
+        return obj.client_id
+    vehicle = session.get(Vehicle, vehicle_id or obj.vehicle_id)
+    return vehicle.client_id if vehicle else None
+
+
+def _assign_change_seqs(session: Session, flush_context, instances):
+    changed = {}
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, TRACKED_TYPES):
+            changed[id(obj)] = obj
+
+    # A changed or deleted item re-sends its parent with the complete item list
+    for obj in list(changed.values()) + list(session.deleted):
+        parent = _parent_of(session, obj)
+        if parent is not None and parent not in session.deleted:
+            changed[id(parent)] = parent
+
+    tombstones = []
+    for obj in session.deleted:
+        entity = TOMBSTONE_ENTITIES.get(type(obj))
+        if entity:
+            tombstones.append((entity, obj.id, _owner_client_id(session, obj)))
+
+    # A record moved to another owner's vehicle disappears for the previous owner
+    for obj in changed.values():
+        if isinstance(obj, (ServiceRecord, InspectionReport)) and obj in session.dirty:
+            history = sa_inspect(obj).attrs.vehicle_id.history
+            for previous_vehicle_id in history.deleted or ():
+                previous_client_id = _owner_client_id(session, obj, previous_vehicle_id)
+                if previous_client_id != _owner_client_id(session, obj):
+                    tombstones.append((TOMBSTONE_ENTITIES[type(obj)], obj.id, previous_client_id))
+
+    count = len(changed) + len(tombstones)
+    if not count:
+        return
+
+    seq = allocate_change_seqs(session.connection(), count)
+    now = datetime.utcnow()
+    for obj in changed.values():
+        obj.change_seq = seq
+        obj.updated_at = now
+        seq += 1
+    for entity, entity_id, client_id in tombstones:
+        session.add(SyncTombstone(entity=entity, entity_id=entity_id, client_id=client_id, change_seq=seq, deleted_at=now))
+        seq += 1
+
+
+def track_changes(session_factory):
+    """Stamp tracked entities with updated_at/change_seq and record tombstones on every flush"""
+    event.listen(session_factory, "before_flush", _assign_change_seqs)
+
+
+def build_sync_payload(db: Session, client_id: int, since: Optional[int] = None) -> dict:
+    """Entities created, updated or deleted for a client after the since cursor.
+
+    Without a cursor the full data set is returned. Service records and
+    inspections always carry their complete item lists, so removed items are
+    covered by the parent being re-sent. The returned cursor is the highest
+    change sequence included in the response.
+    """
+    vehicles = db.query(Vehicle).filter(Vehicle.client_id == client_id)
+    services = db.query(ServiceRecord).join(Vehicle, ServiceRecord.vehicle_id == Vehicle.id).filter(
+        Vehicle.client_id == client_id
+    ).options(selectinload(ServiceRecord.service_items))
+    inspections = db.query(InspectionReport).join(Vehicle, InspectionReport.vehicle_id == Vehicle.id).filter(
+        Vehicle.client_id == client_id
+    ).options(selectinload(InspectionReport.items))
+    tombstones = []
+
+    if since is not None:
+        vehicles = vehicles.filter(Vehicle.change_seq > since)
+        services = services.filter(ServiceRecord.change_seq > since)
+        inspections = inspections.filter(InspectionReport.change_seq > since)
+        tombstones = db.query(SyncTombstone).filter(
+            SyncTombstone.client_id == client_id,
+            SyncTombstone.change_seq > since
+        ).order_by(SyncTombstone.change_seq).all()
+
+    vehicles = vehicles.all()
+    services = services.order_by(ServiceRecord.service_date.desc()).all()
+    inspections = inspections.order_by(InspectionReport.inspection_date.desc()).all()
+
+    cursor = max(
+        [since or 0]
+        + [v.change_seq or 0 for v in vehicles]
+        + [s.change_seq or 0 for s in services]
+        + [i.change_seq or 0 for i in inspections]
+        + [t.change_seq for t in tombstones]
+    )
+
+    # SQLite can reuse ids - drop tombstones superseded by a newer row with the same id
+    live = {("vehicle", v.id): v.change_seq or 0 for v in vehicles}
+    live.update({("service_record", s.id): s.change_seq or 0 for s in services})
+    live.update({("inspection", i.id): i.change_seq or 0 for i in inspections})
+    tombstones = [t for t in tombstones if live.get((t.entity, t.entity_id), -1) < t.change_seq]
+
+    return {
+        "cursor": str(cursor),
+        "full": since is None,
+        "cars": [
+            {
+                "car_id": str(vehicle.id),
+                "make": vehicle.make,
+                "model": vehicle.model,
+                "year": vehicle.year,
+                "license_plate": vehicle.license_plate,
+                "vin": vehicle.vin,
+                "color": vehicle.color,
+                "updated_at": vehicle.updated_at.isoformat() if vehicle.updated_at else None
+            }
+            for vehicle in vehicles
+        ],
+        "services": [
+            {
+                "service_id": str(record.id),
+                "car_id": str(record.vehicle_id),
+                "date": record.service_date.isoformat(),
+                "cost": float(record.total_cost),
+                "status": record.status,
+                "technician_notes": record.technician_notes,
+                "linked_inspection_id": str(record.linked_inspection_id) if record.linked_inspection_id else None,
+                "updated_at": record.updated_at.isoformat() if record.updated_at else None,
+                "service_items": [
+                    {
+                        "service_type": item.service_type,
+                        "service_name": item.service_name,
+                        "description": item.description,
+                        "price": float(item.price)
+                    }
+                    for item in record.service_items
+                ]
+            }
+            for record in services
+        ],
+        "inspections": [
+            {
+                "inspection_id": str(inspection.id),
+                "car_id": str(inspection.vehicle_id),
+                "inspection_date": inspection.inspection_date.isoformat(),
+                "overall_condition": inspection.overall_condition,
+                "technician_notes": inspection.technician_notes,
+                "recommendations": inspection.recommendations,
+                "updated_at": inspection.updated_at.isoformat() if inspection.updated_at else None,
+                "items": [
+                    {
+                        "item_name": item.item_name,
+                        "status": item.status,
+                        "notes": item.notes
+                    }
+                    for item in inspection.items
+                ]
+            }
+            for inspection in inspections
+        ],
+        "deleted": [
+            {"entity": tombstone.entity, "id": str(tombstone.entity_id)}
+            for tombstone in tombstones
+        ]
+    }
@@ -0,0 +1,115 @@
+from sqlalchemy import bindparam, update
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import os
+import threading
+
+from database import shard_router
+from models import ClientCode
+
+# Write-behind settings for client code usage timestamps
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "5"))     # seconds between flushes
+USAGE_FLUSH_THRESHOLD = int(os.getenv("USAGE_FLUSH_THRESHOLD", "100"))   # pending codes that force a flush
+
+
+class UsageTracker:
+    """Buffers ClientCode.used_at updates in memory and writes them in batches.
+
+    Logins only record the timestamp here, so the login path stays read-only.
+    Pending timestamps are flushed in a single executemany UPDATE when the
+    interval elapses, when the threshold is reached, or at shutdown. Only the
+    latest timestamp per code is kept, so repeated logins collapse into one row
+    update. Codes live in their workshop's database, so each flush writes one
+    batch per workshop.
+    """
+
+    def __init__(self, interval: float = USAGE_FLUSH_INTERVAL, threshold: int = USAGE_FLUSH_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self._pending: Dict[Tuple[str, int], datetime] = {}  # (workshop, code id) -> used_at
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.flushed_total = 0
+
+    def record(self, code_id: int, used_at: datetime = None, workshop: Optional[str] = None):
+        """Remember that a code was used; never touches the database"""
+        with self._lock:
+            self._pending[(shard_router.resolve(workshop), code_id)] = used_at or datetime.utcnow()
+            pending = len(self._pending)
+        if pending >= self.threshold:
+            if self._thread is not None:
+                self._wakeup.set()
+            else:
+                self.flush()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Write all pending timestamps in one transaction per workshop, returns rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            statement = (
+                update(ClientCode.__table__)
+                .where(ClientCode.__table__.c.id == bindparam("code_id"))
+                .values(used_at=bindparam("used_at"))
+            )
+            by_workshop: Dict[str, list] = {}
+            for (workshop, code_id), used_at in batch.items():
+                by_workshop.setdefault(workshop, []).append({"code_id": code_id, "used_at": used_at})
+
+            written = 0
+            for workshop, params in list(by_workshop.items()):
+                try:
+                    with shard_router.engine(workshop).begin() as connection:
+                        connection.execute(statement, params)
+                except Exception:
+                    # Put the unwritten batches back (keeping any newer timestamps) so they are retried next time
+                    with self._lock:
+                        for key, used_at in batch.items():
+                            if key[0] in by_workshop:
+                                self._pending.setdefault(key, used_at)
+                    raise
+                del by_workshop[workshop]
+                written += len(params)
+
+            self.flushed_total += written
+            return written
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Failed to flush client code usage: {e}")
+
+    def start(self):
+        """Start the background flush thread"""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="usage-tracker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and flush whatever is still pending"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+            self._thread = None
+        self.flush()
+
+
+# Shared tracker used by the login endpoint
+usage_tracker = UsageTracker()